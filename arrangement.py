@@ -0,0 +1,239 @@
+"""多段落、多声部的编曲
+
+Arrangement 把多个节奏型按段落首尾相接、按声部叠加，组装为一个乐谱/MIDI文件：
+- 每个段落可以改变速度和拍号，只在发生变化的段落开头写出速度/拍号事件
+- 叠加的节奏型按声部名称写入各自的音轨（同名声部合并为一条音轨）
+- 每个 (段落, 声部) 先生成按时间排序的消息流，同一音轨的各消息流用 heapq.merge
+  做k路归并，跨段落延续的音符关闭事件也能正确排序；组装数百个段落的耗时与事件数成线性
+
+与 SongBuilder 不同，Arrangement 面向速度/拍号变化和多声部叠加，结果一次性生成。
+"""
+import heapq
+import itertools
+import os
+import random
+from collections import namedtuple
+
+import midi_writer
+from beat_grid import bar_ticks, ticks_to_quarters
+from pattern_grid import PatternGrid
+from random_drumsheet import DrumSheetGenerator
+
+# 默认声部（音轨）名称，与单声部输出一致
+DEFAULT_TRACK = 'Percussion'
+
+ArrangementSection = namedtuple('ArrangementSection', [
+    'layers',        # [(声部名称, 节奏型), ...]，第一个为主节奏型
+    'bars',          # 段落小节数
+    'bpm',           # 段落速度
+    'numerator',     # 拍号分子
+    'denominator',   # 拍号分母
+    'variant_type',  # 每小节对主节奏型应用的变体类型（None表示原样重复）
+])
+
+
+class Arrangement:
+    """按段落拼接、按声部叠加节奏型的编曲"""
+
+    def __init__(self, generator=None, seed=None):
+        """初始化编曲
+
+        Args:
+            generator: 用于计算小节事件的DrumSheetGenerator，默认新建一个；
+                       第一个段落的默认速度和拍号取自它的配置
+            seed: 随机种子，给出时变体序列可复现
+        """
+        self.generator = generator or DrumSheetGenerator(engine='direct')
+        self.seed = seed
+        self.sections = []
+
+    def add_section(self, pattern, bars=1, bpm=None, time_signature=None, variant_type=None,
+                    layers=None, track=DEFAULT_TRACK):
+        """添加一个段落
+
+        Args:
+            pattern: 主节奏型（或PatternGrid）
+            bars: 小节数
+            bpm: 速度，默认沿用上一段落
+            time_signature: 拍号，如 '3/4'，默认沿用上一段落
+            variant_type: 每小节对主节奏型应用的变体类型 ('snare', 'bass', 'random', 'all')
+            layers: 叠加的节奏型，{声部名称: 节奏型} 或 [(声部名称, 节奏型), ...]
+            track: 主节奏型所在的声部名称
+
+        Returns:
+            Arrangement: 自身，便于链式调用
+        """
+        if self.sections:
+            previous = self.sections[-1]
+            default_bpm, numerator, denominator = previous.bpm, previous.numerator, previous.denominator
+        else:
+            generator = self.generator
+            default_bpm, numerator, denominator = generator.bpm, generator.numerator, generator.denominator
+
+        if time_signature is not None:
+            numerator, denominator = (int(part) for part in str(time_signature).split('/'))
+        if isinstance(layers, dict):
+            layers = layers.items()
+
+        self.sections.append(ArrangementSection(
+            layers=[(track, pattern)] + list(layers or ()),
+            bars=bars,
+            bpm=bpm if bpm is not None else default_bpm,
+            numerator=numerator,
+            denominator=denominator,
+            variant_type=variant_type,
+        ))
+        return self
+
+    def __len__(self):
+        """总小节数"""
+        return sum(section.bars for section in self.sections)
+
+    def tracks(self):
+        """按首次出现顺序返回所有声部名称"""
+        names = {}
+        for section in self.sections:
+            for track, _ in section.layers:
+                names.setdefault(track, None)
+        return list(names)
+
+    def timeline(self):
+        """各段落的起点和小节长度
+
+        Returns:
+            list: (起始tick, 小节tick数, 段落) 列表
+        """
+        timeline = []
+        start = 0
+        for section in self.sections:
+            length = bar_ticks(section.numerator, section.denominator)
+            timeline.append((start, length, section))
+            start += section.bars * length
+        return timeline
+
+    def tempo_map(self):
+        """速度和拍号变化: [(tick, bpm, numerator, denominator), ...]"""
+        return [(start, section.bpm, section.numerator, section.denominator)
+                for start, _, section in self.timeline()]
+
+    def iter_bars(self):
+        """逐小节生成各声部的节奏型
+
+        Yields:
+            tuple: (段落序号, 小节起始tick, [(声部名称, 节奏型), ...])
+        """
+        if self.seed is not None:
+            random.seed(self.seed)
+
+        generator = self.generator
+        for index, (start, length, section) in enumerate(self.timeline()):
+            (main_track, main_pattern), *layers = [
+                (track, pattern.to_dicts() if isinstance(pattern, PatternGrid) else pattern)
+                for track, pattern in section.layers
+            ]
+            for bar in range(section.bars):
+                pattern = main_pattern
+                if section.variant_type:
+                    pattern = generator.create_pattern_variant(main_pattern, section.variant_type)
+                    if isinstance(pattern, PatternGrid):
+                        pattern = pattern.to_dicts()
+                yield index, start + bar * length, [(main_track, pattern)] + layers
+
+    def track_streams(self):
+        """生成各声部的消息流
+
+        Returns:
+            dict: 声部名称 -> [按时间排序的 (tick, 消息字节) 列表, ...]，每个 (段落, 声部) 一个列表
+        """
+        generator = self.generator
+        channel = generator.midi_channel - 1
+        streams = {track: [] for track in self.tracks()}
+        timeline = self.timeline()
+
+        for index, bars in itertools.groupby(self.iter_bars(), key=lambda bar: bar[0]):
+            # 按段落自己的拍号计算小节事件和人性化的小节位置
+            start, length, section = timeline[index]
+            section_notes = {}
+            for _, bar_start, layers in bars:
+                for track, pattern in layers:
+                    events = generator.bar_events(pattern, section.numerator, section.denominator)
+                    notes = generator.events_to_midi_notes(events, bar_start, start, length)
+                    section_notes.setdefault(track, []).extend(notes)
+            for track, notes in section_notes.items():
+                streams[track].append(midi_writer.note_messages(notes, channel))
+
+        return streams
+
+    def to_midi_bytes(self):
+        """不经过music21，把编曲直接编码为MIDI文件字节（每个声部一条音轨）"""
+        channel = self.generator.midi_channel - 1
+        streams = self.track_streams()
+
+        chunks = [midi_writer.tempo_map_track(self.tempo_map())]
+        for track, track_streams in streams.items():
+            merged = heapq.merge(*track_streams, key=midi_writer.message_order)
+            chunks.append(midi_writer.message_track(merged, channel, track_name=track))
+        return midi_writer.header_chunk(len(chunks)) + b''.join(chunks)
+
+    def build_score(self):
+        """构建music21乐谱：每个声部一个Part，段落开头插入速度和拍号"""
+        from music21 import stream, instrument, meter, tempo
+
+        generator = self.generator
+        parts = {}
+        for track in self.tracks():
+            part = stream.Part()
+            part.partName = track
+            part.insert(0, instrument.Percussion())
+            parts[track] = part
+
+        # 与 tempo_map_track 一致，只在变化时插入速度和拍号（拍号写入每个声部，速度写入第一个声部）
+        first_part = next(iter(parts.values()))
+        bpm = signature = None
+        for start, _, section in self.timeline():
+            offset = ticks_to_quarters(start)
+            if (section.numerator, section.denominator) != signature:
+                signature = (section.numerator, section.denominator)
+                for part in parts.values():
+                    part.insert(offset, meter.TimeSignature(f'{section.numerator}/{section.denominator}'))
+            if section.bpm != bpm:
+                bpm = section.bpm
+                first_part.insert(offset, tempo.MetronomeMark(number=bpm))
+
+        sections = self.sections
+        for index, bar_start, layers in self.iter_bars():
+            section = sections[index]
+            for track, pattern in layers:
+                for offset, note_names, duration, is_accent in generator.bar_events(
+                        pattern, section.numerator, section.denominator):
+                    generator._insert_note(parts[track], note_names, duration, bar_start + offset, is_accent)
+
+        score = stream.Score()
+        for part in parts.values():
+            score.insert(0, part)
+        return score
+
+    def to_bytes(self):
+        """按生成器的渲染引擎序列化为MIDI文件字节"""
+        if self.generator.engine == 'direct':
+            return self.to_midi_bytes()
+
+        from music21 import midi
+        return midi.translate.streamToMidiFile(self.build_score()).writestr()
+
+    def write(self, file):
+        """写入MIDI文件
+
+        Args:
+            file: 文件路径，或以二进制模式打开的文件对象
+
+        Returns:
+            int: 写入的字节数
+        """
+        data = self.to_bytes()
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as fileobj:
+                fileobj.write(data)
+        else:
+            file.write(data)
+        return len(data)
@@ -0,0 +1,260 @@
+"""批量生成节奏型变体
+
+把 (节奏型 × 变体类型 × 序号) 的任务分块派发到进程池中执行：
+- 配置文件只在主进程解析一次，通过进程池初始化函数共享给各工作进程
+- 每个任务的随机种子由基础种子和任务标识确定，结果与调度顺序无关、可复现
+  （启用人性化时，人性化种子也由任务种子确定）
+- 结果以迭代器形式流式返回，任务窗口有上限，内存占用不随任务总数增长
+- 可选的去重：与原节奏型过于接近的变体在工作进程中重新抽样，
+  与已生成变体过于接近的变体在主进程中用相似度索引剔除
+"""
+import hashlib
+import os
+import random
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from random_drumsheet import DrumSheetGenerator
+from humanizer import Humanizer
+from similarity_index import Fingerprinter, SimilarityIndex, distance
+
+BatchResult = namedtuple('BatchResult', [
+    'pattern_name',  # 节奏型名称
+    'variant_type',  # 变体类型
+    'index',         # 同一节奏型/变体类型下的序号
+    'seed',          # 该任务使用的随机种子
+    'pattern',       # 生成的变体节奏型
+    'path',          # 写入的文件路径（未指定输出目录时为None）
+    'midi_bytes',    # MIDI字节（指定输出目录时为None）
+])
+
+# 工作进程内共享的生成器，由 _init_worker 创建
+_worker_generator = None
+
+# 去重设置: (最小距离, 距离度量, 最大抽样次数)，为None时不去重
+_worker_dedup = None
+_worker_fingerprinter = None
+
+
+def task_seed(base_seed, pattern_name, variant_type, index):
+    """根据基础种子和任务标识计算确定性的随机种子"""
+    key = f"{base_seed}:{pattern_name}:{variant_type}:{index}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+
+def _init_worker(midi_config, run_config, dedup=None):
+    """工作进程初始化：用主进程解析好的配置创建生成器"""
+    global _worker_generator, _worker_dedup, _worker_fingerprinter
+    _worker_generator = DrumSheetGenerator(engine='direct', midi_config=midi_config, run_config=run_config)
+    _worker_dedup = dedup
+    _worker_fingerprinter = _fingerprinter(_worker_generator)
+
+
+def _fingerprinter(generator):
+    """按生成器的拍号创建指纹编码"""
+    return Fingerprinter(quarters=generator.numerator * 4 / generator.denominator)
+
+
+def _sample_variant(generator, pattern, variant_type):
+    """生成变体；启用去重时重新抽样与原节奏型过于接近的变体，都不满足时返回None"""
+    if _worker_dedup is None:
+        return generator.create_pattern_variant(pattern, variant_type)
+
+    min_distance, metric, max_attempts = _worker_dedup
+    original = _worker_fingerprinter.fingerprint(pattern)
+    for _ in range(max_attempts):
+        variant = generator.create_pattern_variant(pattern, variant_type)
+        value = _worker_fingerprinter.fingerprint(variant)
+        if value != original and distance(original, value, metric) >= min_distance:
+            return variant
+    return None
+
+
+def _run_tasks(tasks, bars, output_dir):
+    """在工作进程中执行一组任务"""
+    generator = _worker_generator
+    results = []
+
+    for pattern_name, pattern, variant_type, index, seed in tasks:
+        random.seed(seed)
+        if generator.humanizer is not None:
+            generator.humanizer = Humanizer.from_generator(generator, seed=seed)
+        variant = _sample_variant(generator, pattern, variant_type)
+        if variant is None:
+            continue
+        generator.generate_from_pattern(variant, bars=bars)
+        midi_bytes = generator.to_bytes()
+
+        path = None
+        if output_dir is not None:
+            path = os.path.join(output_dir, f"{pattern_name}_{variant_type}_{index:05d}.mid")
+            with open(path, 'wb') as file:
+                file.write(midi_bytes)
+            midi_bytes = None
+
+        results.append(BatchResult(pattern_name, variant_type, index, seed, variant, path, midi_bytes))
+
+    return results
+
+
+def iter_tasks(patterns, variant_types, count, seeds):
+    """按节奏型、变体类型、序号的顺序枚举任务
+
+    Args:
+        patterns: 节奏型字典 {名称: 节奏型}
+        variant_types: 变体类型列表
+        count: 每个节奏型、每种变体类型的数量
+        seeds: 基础随机种子（整数），或长度为count的种子列表
+
+    Yields:
+        tuple: (节奏型名称, 节奏型, 变体类型, 序号, 种子)，可直接交给 execute_chunks 执行
+    """
+    for pattern_name, pattern in patterns.items():
+        for variant_type in variant_types:
+            for index in range(count):
+                if isinstance(seeds, (list, tuple)):
+                    seed = seeds[index]
+                else:
+                    seed = task_seed(seeds, pattern_name, variant_type, index)
+                yield pattern_name, pattern, variant_type, index, seed
+
+
+def iter_chunks(tasks, chunk_size):
+    """把任务迭代器切分为固定大小的块（最后一块可能较小）
+
+    Args:
+        tasks: 任意任务迭代器
+        chunk_size: 每块的任务数
+
+    Yields:
+        list: 任务块
+    """
+    chunk = []
+    for task in tasks:
+        chunk.append(task)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _unique_results(results, min_distance, metric, fingerprinter):
+    """剔除与同一节奏型已生成的变体距离小于min_distance的结果"""
+    indexes = {}
+    for result in results:
+        index = indexes.get(result.pattern_name)
+        if index is None:
+            index = indexes[result.pattern_name] = SimilarityIndex(fingerprinter, metric)
+        if index.add_if_distinct(result.pattern, min_distance):
+            yield result
+        elif result.path is not None:
+            os.remove(result.path)
+
+
+def generate_batch(patterns, variant_types, count=1, seeds=0, bars=4, output_dir=None,
+                   max_workers=None, chunk_size=64, min_distance=None, metric='hamming', max_attempts=8,
+                   midi_config_path="./configs/midi_config.yaml", run_config_path="./configs/run_configs.yaml"):
+    """批量生成节奏型变体
+
+    Args:
+        patterns: 节奏型字典 {名称: 节奏型}
+        variant_types: 变体类型列表 ('snare', 'bass', 'random', 'all')
+        count: 每个节奏型、每种变体类型生成的数量
+        seeds: 基础随机种子（整数），或长度为count的种子列表（按序号使用）
+        bars: 每个文件的小节数
+        output_dir: 输出目录，给出时写入MIDI文件，否则在结果中返回MIDI字节
+        max_workers: 工作进程数，为1时在当前进程中顺序执行
+        chunk_size: 每次派发给工作进程的任务数
+        min_distance: 启用去重时的最小距离：与原节奏型更接近的变体重新抽样（最多max_attempts次，
+                      仍不满足时放弃该任务），与同一节奏型已生成的变体更接近的结果被剔除；
+                      为0时只剔除完全相同的变体，为None时不去重
+        metric: 距离度量，'hamming'（不同的音符数）或 'jaccard'（0~1）
+        max_attempts: 每个任务的最大抽样次数
+
+    Returns:
+        iterator: 逐个产生 BatchResult（按完成顺序；启用去重时按任务顺序，保证结果可复现）
+
+    Raises:
+        ValueError: 种子列表长度与count不一致（调用时立即检查，不等到开始迭代）
+    """
+    if isinstance(seeds, (list, tuple)) and len(seeds) != count:
+        raise ValueError(f"种子数量 {len(seeds)} 与生成数量 {count} 不一致")
+
+    return _generate_batch(patterns, variant_types, count, seeds, bars, output_dir, max_workers, chunk_size,
+                           min_distance, metric, max_attempts, midi_config_path, run_config_path)
+
+
+def _generate_batch(patterns, variant_types, count, seeds, bars, output_dir, max_workers, chunk_size,
+                    min_distance, metric, max_attempts, midi_config_path, run_config_path):
+    """generate_batch 的生成器部分（参数已检查）"""
+    # 配置只解析一次
+    midi_config = DrumSheetGenerator.load_yaml(midi_config_path)
+    run_config = DrumSheetGenerator.load_yaml(run_config_path)
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    chunks = iter_chunks(iter_tasks(patterns, variant_types, count, seeds), chunk_size)
+    dedup = None if min_distance is None else (min_distance, metric, max_attempts)
+    results = execute_chunks(chunks, bars, output_dir, max_workers, (midi_config, run_config, dedup),
+                             ordered=dedup is not None)
+
+    if dedup is None:
+        yield from results
+    else:
+        generator = DrumSheetGenerator(engine='direct', midi_config=midi_config, run_config=run_config)
+        yield from _unique_results(results, min_distance, metric, _fingerprinter(generator))
+
+
+def execute_chunks(chunks, bars, output_dir, max_workers, initargs, ordered=False):
+    """在进程池（max_workers为1时在当前进程）中执行 iter_tasks 产生的任务块
+
+    Args:
+        chunks: 任务块迭代器（iter_chunks 的结果），按需读取，同时在途的块数有上限
+        bars: 每个文件的小节数
+        output_dir: 输出目录，为None时在结果中返回MIDI字节
+        max_workers: 工作进程数
+        initargs: 工作进程初始化参数 (midi_config, run_config, 去重设置)
+        ordered: 为True时按任务顺序返回结果，否则按完成顺序
+
+    Yields:
+        BatchResult: 每个任务的生成结果
+    """
+    if max_workers == 1:
+        # 在当前进程中执行，结束后恢复调用方的随机数状态
+        random_state = random.getstate()
+        try:
+            _init_worker(*initargs)
+            for chunk in chunks:
+                yield from _run_tasks(chunk, bars, output_dir)
+        finally:
+            random.setstate(random_state)
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs) as executor:
+        # 限制同时在途的任务块数量，保持内存占用稳定
+        max_pending = workers * 2
+
+        if ordered:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_run_tasks, chunk, bars, output_dir))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+            return
+
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(_run_tasks, chunk, bars, output_dir))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+        for future in pending:
+            yield from future.result()
@@ -0,0 +1,59 @@
+"""精确的整数tick节拍网格
+
+节奏型中的拍位置是浮点数（如三连音写作1.67、1.33），加载时一次性换算为
+最接近的有理数（fractions.Fraction），再量化为整数tick。之后计算时值、
+偏移和导出都只做整数运算，不再用浮点容差判断三连音，任意连音
+（三连音、五连音、六连音、七连音……）都能精确落在网格上。
+
+网格分辨率与 midi_writer / music21 一致（每四分音符10080 tick），
+10080可被1~10、12、14、15、16整除，常见连音都没有取整误差。
+"""
+import functools
+from fractions import Fraction
+
+from midi_writer import TICKS_PER_QUARTER
+
+# 拍内连音的最大细分数：拍位置按分母不超过该值的最接近分数解释
+MAX_SUBDIVISION = 16
+
+# 浮点拍位置与解释得到的分数之间允许的最大误差（节奏型中的拍位置通常保留两位小数）
+BEAT_TOLERANCE = 0.01
+
+
+@functools.lru_cache(maxsize=None)
+def beat_to_fraction(beat):
+    """把浮点拍位置解释为精确的有理数
+
+    能精确表示的二进制小数（1.5、1.25、1.0625等）保持不变；
+    其余按分母不超过 MAX_SUBDIVISION 的最接近分数解释（1.67 -> 5/3，1.2 -> 6/5），
+    误差超过 BEAT_TOLERANCE 时保留原值。
+
+    Args:
+        beat: 拍位置（四分音符为单位）
+
+    Returns:
+        Fraction: 精确的拍位置
+    """
+    exact = Fraction(beat)
+    if exact.denominator <= TICKS_PER_QUARTER:
+        return exact
+
+    approximation = exact.limit_denominator(MAX_SUBDIVISION)
+    if abs(approximation - exact) <= BEAT_TOLERANCE:
+        return approximation
+    return exact
+
+
+def beat_to_ticks(beat, ticks_per_quarter=TICKS_PER_QUARTER):
+    """把拍位置（或时长）量化为整数tick"""
+    return round(beat_to_fraction(beat) * ticks_per_quarter)
+
+
+def ticks_to_quarters(ticks, ticks_per_quarter=TICKS_PER_QUARTER):
+    """把tick换算回以四分音符为单位的精确时长（Fraction）"""
+    return Fraction(ticks, ticks_per_quarter)
+
+
+def bar_ticks(numerator, denominator, ticks_per_quarter=TICKS_PER_QUARTER):
+    """一个小节的tick数（6/8拍为3个四分音符）"""
+    return numerator * ticks_per_quarter * 4 // denominator
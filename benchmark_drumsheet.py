@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试脚本
+覆盖启动导入、配置加载、预定义节奏型、变体生成、MIDI渲染和保存，报告吞吐量（文件/秒、音符/秒）
+和峰值内存，并可保存基准结果JSON、与之前的基准比较以发现性能回退
+
+用法:
+    python benchmark_drumsheet.py                          # 运行并打印结果
+    python benchmark_drumsheet.py --save benchmark_baseline.json
+    python benchmark_drumsheet.py --compare benchmark_baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+import random_drumsheet
+from beat_grid import beat_to_ticks
+from midi_writer import quarters_to_ticks
+from groove_sampler import GrooveSampler
+from humanizer import Humanizer
+from markov_groove import MarkovGrooveModel
+from pattern_grid import PatternGrid
+from random_drumsheet import DrumSheetGenerator, _durations_for_ticks
+from rhythm_patterns import RhythmPatterns
+from similarity_index import Fingerprinter, SimilarityIndex
+from variant_engine import VariantEngine
+
+PRESETS = ['standard_rock', 'disco_pattern', 'shuffle_pattern', 'funk_pattern', 'ballad_pattern', 'reggae_pattern']
+VARIANT_TYPES = ['snare', 'bass', 'random', 'all']
+RENDER_BARS = [1, 16, 256]
+ENGINES = ['music21', 'direct']
+
+
+def dense_pattern(steps_per_beat=8, numerator=4):
+    """生成密集节奏型（steps_per_beat=8 即32分音符）"""
+    pattern = []
+    for step in range(steps_per_beat * numerator):
+        beat = 1 + step / steps_per_beat
+        drums = ['bass', 'closed_hihat'] if step % steps_per_beat == 0 else ['closed_hihat']
+        pattern.append({'beat': beat, 'drums': drums, 'accent': step % steps_per_beat == 0})
+    return pattern
+
+
+def dense_triplet_pattern(numerator=4):
+    """生成密集三连音节奏型（走三连音渲染路径）"""
+    pattern = []
+    for beat in range(1, numerator + 1):
+        for fraction in (0.0, 0.33, 0.67):
+            pattern.append({'beat': round(beat + fraction, 2), 'drums': ['closed_hihat'], 'accent': fraction == 0.0})
+    return pattern
+
+
+def legacy_note_duration(current_note, pattern, current_index=None):
+    """旧实现：每个音符单独计算，三连音路径需线性查找索引，最后一个音符重算全部间隔"""
+    if current_index is None:
+        current_index = next((i for i, note in enumerate(pattern) if note == current_note), 0)
+
+    if current_index < len(pattern) - 1:
+        return pattern[current_index + 1]['beat'] - current_note['beat']
+
+    beat_intervals = [pattern[i + 1]['beat'] - pattern[i]['beat'] for i in range(len(pattern) - 1)]
+    if beat_intervals:
+        return sum(beat_intervals) / len(beat_intervals)
+    return 0.5
+
+
+def legacy_durations(pattern, with_index=True):
+    """旧实现下一个小节所有音符的时长"""
+    if with_index:
+        return [legacy_note_duration(note, pattern, i) for i, note in enumerate(pattern)]
+    return [legacy_note_duration(note, pattern) for note in pattern]
+
+
+def one_pass_durations(pattern):
+    """新实现：量化到整数tick后一次遍历（绕过缓存，只计算本身的耗时）"""
+    return _durations_for_ticks.__wrapped__(tuple(beat_to_ticks(note['beat']) for note in pattern))
+
+
+def bench_note_durations(bars=64, repeat=5):
+    """比较两种实现渲染bars个小节时的时长计算耗时"""
+    print(f"音符时长计算（{bars} 小节）")
+    print("=" * 60)
+    print(f"{'节奏型':<24}{'音符数':>6}{'旧实现(ms)':>12}{'新实现(ms)':>12}{'加速':>8}")
+
+    cases = [
+        ('32分音符 4/4', dense_pattern(8), True),
+        ('64分音符 4/4', dense_pattern(16), True),
+        ('32分音符 16/4', dense_pattern(8, 16), True),
+        ('三连音 4/4', dense_triplet_pattern(4), False),
+        ('三连音 16/4', dense_triplet_pattern(16), False),
+    ]
+
+    for name, pattern, with_index in cases:
+        # 三连音的旧实现按浮点拍位置计算（0.33拍），与精确网格不同，只比较耗时
+        if with_index:
+            legacy_ticks = [quarters_to_ticks(d) for d in legacy_durations(pattern, with_index)]
+            assert legacy_ticks == list(one_pass_durations(pattern))
+
+        # 旧实现每个小节都重新计算；新实现每个节奏型只计算一次，之后各小节复用
+        legacy = min(timeit.repeat(lambda: [legacy_durations(pattern, with_index) for _ in range(bars)],
+                                   number=1, repeat=repeat))
+        one_pass = min(timeit.repeat(lambda: one_pass_durations(pattern), number=1, repeat=repeat))
+
+        print(f"{name:<24}{len(pattern):>6}{legacy * 1000:>12.3f}{one_pass * 1000:>12.3f}"
+              f"{legacy / one_pass:>7.0f}x")
+
+
+def measure(func, repeat=5, notes=0, files=0, min_time=0.05):
+    """测量函数耗时和峰值内存
+
+    Args:
+        func: 被测函数
+        repeat: 轮数（取最快一轮）
+        notes: 每次调用产生的音符数
+        files: 每次调用产生的文件数
+        min_time: 每轮最短耗时（秒），据此确定每轮调用次数以减小计时噪声
+
+    Returns:
+        dict: 每次调用耗时、吞吐量和峰值内存
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        timer = timeit.Timer(func)
+
+        # 预热并确定每轮调用次数
+        number = 1
+        while timer.timeit(number) < min_time:
+            number *= 2
+
+        seconds = min(timer.repeat(number=number, repeat=repeat)) / number
+
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {'seconds': seconds, 'ops_per_sec': 1 / seconds, 'peak_kb': peak / 1024}
+    if notes:
+        result['notes_per_sec'] = notes / seconds
+    if files:
+        result['files_per_sec'] = files / seconds
+    return result
+
+
+def clear_caches():
+    """清空配置和小节缓存，测量冷启动耗时"""
+    random_drumsheet._config_cache.clear()
+    random_drumsheet.clear_bar_cache()
+
+
+def run_suite(repeat=5):
+    """运行完整基准测试
+
+    Returns:
+        dict: 测试名称 -> 测量结果
+    """
+    results = {}
+
+    # 启动：在新进程中导入 random_drumsheet（包含解释器自身的启动）
+    root = os.path.dirname(os.path.abspath(__file__))
+    results['startup/import'] = measure(
+        lambda: subprocess.run([sys.executable, '-c', 'import random_drumsheet'], cwd=root, check=True), repeat)
+
+    # 配置加载
+    def load_cold():
+        clear_caches()
+        DrumSheetGenerator()
+
+    results['config/load_cold'] = measure(load_cold, repeat)
+    results['config/load_cached'] = measure(DrumSheetGenerator, repeat)
+
+    # 预定义节奏型
+    for name in PRESETS:
+        results[f'preset/{name}'] = measure(getattr(RhythmPatterns, name), repeat)
+
+    # 变体生成
+    generator = DrumSheetGenerator(engine='direct')
+    pattern = RhythmPatterns.standard_rock()
+    for variant_type in VARIANT_TYPES:
+        results[f'variant/{variant_type}'] = measure(
+            lambda: generator.create_pattern_variant(pattern, variant_type), repeat)
+
+    engine = VariantEngine(seed=0)
+    for variant_type in VARIANT_TYPES:
+        timing = measure(lambda: engine.create_variants(pattern, variant_type, count=10000), repeat)
+        timing['variants_per_sec'] = timing['ops_per_sec'] * 10000
+        results[f'variant_engine/{variant_type}'] = timing
+
+    # 按配置概率从零生成随机小节
+    sampler = GrooveSampler(DrumSheetGenerator(), seed=0)
+    results['sampler/bar'] = measure(sampler.sample_bar, repeat)
+
+    # 马尔可夫律动模型按风格采样小节
+    groove_model = MarkovGrooveModel.builtin(seed=0)
+    results['markov/bar'] = measure(lambda: groove_model.sample_bar('funk'), repeat)
+
+    # 力度与时间人性化（整首歌的音符一次处理）
+    generator.generate_from_pattern(pattern, 64)
+    midi_notes = generator.midi_notes()
+    humanizer = Humanizer(generator.midi_config, seed=0, ghost_probability=0.1)
+    results['humanize/64bars'] = measure(lambda: humanizer.apply(midi_notes), repeat, notes=len(midi_notes))
+
+    # 变体指纹与相似度查询
+    fingerprinter = Fingerprinter()
+    grid = PatternGrid.from_dicts(pattern)
+    hits, accents = engine.create_variants(grid, 'all', count=10000)
+    timing = measure(lambda: fingerprinter.fingerprint_arrays(grid.beats, hits, accents, grid.voices), repeat)
+    timing['variants_per_sec'] = timing['ops_per_sec'] * 10000
+    results['similarity/fingerprint'] = timing
+
+    index = SimilarityIndex(fingerprinter)
+    for words in fingerprinter.fingerprint_arrays(grid.beats, hits, accents, grid.voices):
+        index.add(fingerprinter.from_words(words))
+    query = fingerprinter.fingerprint(pattern)
+    timing = measure(lambda: index.distances(query), repeat)
+    timing['variants_per_sec'] = timing['ops_per_sec'] * len(index)
+    results['similarity/distances'] = timing
+
+    # MIDI渲染
+    for engine_name in ENGINES:
+        generator = DrumSheetGenerator(engine=engine_name)
+        for bars in RENDER_BARS:
+            generator.generate_from_pattern(pattern, bars)
+            notes = len(generator.midi_notes())
+            results[f'render/{engine_name}/{bars}bars'] = measure(
+                lambda: generator.generate_from_pattern(pattern, bars), repeat, notes=notes)
+
+    # 保存MIDI文件
+    with tempfile.TemporaryDirectory() as output_path:
+        for engine_name in ENGINES:
+            generator = DrumSheetGenerator(engine=engine_name)
+            generator.run_config['output_path'] = output_path
+            generator.generate_from_pattern(pattern, 16)
+            notes = len(generator.midi_notes())
+            results[f'save_midi/{engine_name}'] = measure(
+                lambda: generator.save_midi('benchmark.mid'), repeat, notes=notes, files=1)
+
+    return results
+
+
+def print_results(results):
+    """打印测量结果"""
+    print(f"{'测试':<32}{'耗时(ms)':>12}{'次/秒':>12}{'音符/秒':>14}{'峰值内存(KB)':>14}")
+    print("-" * 84)
+    for name, result in results.items():
+        notes = result.get('notes_per_sec', result.get('variants_per_sec'))
+        notes_text = f"{notes:,.0f}" if notes else '-'
+        print(f"{name:<32}{result['seconds'] * 1000:>12.3f}{result['ops_per_sec']:>12,.0f}"
+              f"{notes_text:>14}{result['peak_kb']:>14.1f}")
+
+
+def compare_results(results, baseline, tolerance):
+    """与基准比较，返回耗时超过容差的测试列表（基准中没有的测试由 unmatched_results 报告）"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['seconds'] / baseline[name]['seconds']
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def unmatched_results(results, baseline):
+    """基准中没有的新测试，以及基准中有但本次没有运行的测试
+
+    Returns:
+        tuple: (新测试名称列表, 缺失的测试名称列表)
+    """
+    return [name for name in results if name not in baseline], [name for name in baseline if name not in results]
+
+
+def main():
+    """运行所有基准测试"""
+    parser = argparse.ArgumentParser(description="架子鼓生成器性能基准测试")
+    parser.add_argument('--save', metavar='PATH', help="把结果保存为基准JSON")
+    parser.add_argument('--compare', metavar='PATH', help="与基准JSON比较，发现回退时返回非零退出码")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="允许的耗时增长比例（默认0.5即50%%）")
+    parser.add_argument('--repeat', type=int, default=5, help="每项测试的重复轮数")
+    parser.add_argument('--durations', action='store_true', help="同时比较新旧音符时长计算")
+    args = parser.parse_args()
+
+    if args.durations:
+        bench_note_durations()
+        print()
+
+    results = run_suite(args.repeat)
+    print_results(results)
+
+    if args.save:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"\n基准结果已保存到: {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = compare_results(results, baseline, args.tolerance)
+        new, missing = unmatched_results(results, baseline)
+        if new:
+            print(f"\n基准中没有以下测试，未做比较（请用 --save 更新基准）: {', '.join(new)}")
+        if missing:
+            print(f"\n基准中的以下测试本次没有运行: {', '.join(missing)}")
+        if regressions:
+            print("\n性能回退:")
+            for name, ratio in regressions:
+                print(f"  {name}: 耗时为基准的 {ratio:.2f} 倍")
+            sys.exit(1)
+        print(f"\n与基准 {args.compare} 相比没有性能回退")
+
+
+if __name__ == "__main__":
+    main()
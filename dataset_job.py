@@ -0,0 +1,338 @@
+"""可断点续跑、可分片的变体数据集生成任务
+
+把 (节奏型 × 变体类型 × 序号) 的全部任务按任务标识的哈希分配到固定数量的分片中，
+每个分片可以在不同的进程或机器上独立运行：
+- 任务描述（节奏型来源、变体类型、数量、种子、小节数、分片数）和两份配置在第一次运行时
+  写入输出目录的 job.json，之后的运行和其他机器都使用同一份描述，结果逐字节可复现
+- MIDI文件按文件名哈希写入两级子目录（如 3f/a2/standard_rock_all_00042.mid），先写临时文件再原子替换
+- 每个分片有自己的清单文件 manifest/shard-00003-of-00008.jsonl，每完成一个文件追加一行，
+  记录节奏型、变体类型、序号、种子、变体内容、文件路径和内容哈希
+- 重新运行时读取清单跳过已完成的任务，从中断处继续；清单末尾写了一半的行只在运行该分片时截掉，
+  查看进度只读取清单，不修改文件（其他机器可能正在追加）
+
+命令行用法：
+    python dataset_job.py outputs/dataset --variants all snare --count 10000 --shards 16 --shard 0 --shard 1
+    python dataset_job.py outputs/dataset            # 续跑所有分片
+    python dataset_job.py outputs/dataset --status   # 查看进度（只读）
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from collections import namedtuple
+
+from batch_generator import execute_chunks, iter_chunks, iter_tasks
+from pattern_library import PatternLibrary
+from random_drumsheet import DrumSheetGenerator
+
+JOB_FILE = 'job.json'
+MANIFEST_DIR = 'manifest'
+
+JobSpec = namedtuple('JobSpec', [
+    'patterns',       # 节奏型名称列表，None表示节奏型库中的全部
+    'variant_types',  # 变体类型列表
+    'count',          # 每个节奏型、每种变体类型生成的数量
+    'seed',           # 基础随机种子
+    'bars',           # 每个文件的小节数
+    'shards',         # 分片数
+    'library',        # 节奏型库文件路径，None表示内置节奏型
+])
+
+
+def task_id(pattern_name, variant_type, index):
+    """任务的唯一标识"""
+    return f"{pattern_name}/{variant_type}/{index}"
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def shard_of(identifier, shards):
+    """按任务标识的哈希确定分片（与运行顺序和机器无关）"""
+    return int(_digest(identifier), 16) % shards
+
+
+def relative_path(pattern_name, variant_type, index):
+    """文件相对输出目录的路径：按文件名哈希分到两级子目录，避免单个目录中文件过多"""
+    filename = f"{pattern_name.replace('/', '__')}_{variant_type}_{index:05d}.mid"
+    digest = _digest(filename)
+    return os.path.join(digest[:2], digest[2:4], filename)
+
+
+def manifest_path(output_dir, shard, shards):
+    """分片清单文件路径"""
+    return os.path.join(output_dir, MANIFEST_DIR, f"shard-{shard:05d}-of-{shards:05d}.jsonl")
+
+
+def _scan_manifest(path):
+    """读取清单中完整的记录
+
+    Returns:
+        tuple: (记录列表, 完整记录的字节数)
+    """
+    if not os.path.exists(path):
+        return [], 0
+
+    records = []
+    valid_length = 0
+    with open(path, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid_length += len(line)
+    return records, valid_length
+
+
+def read_manifest(path):
+    """读取清单，忽略末尾不完整的行（只读，不修改文件）
+
+    Returns:
+        list: 清单记录（字典）
+    """
+    return _scan_manifest(path)[0]
+
+
+def _repair_manifest(path):
+    """读取清单并截掉末尾不完整的部分，只由运行该分片的进程在追加前调用
+
+    Returns:
+        list: 清单记录（字典）
+    """
+    records, valid_length = _scan_manifest(path)
+    if os.path.exists(path) and valid_length != os.path.getsize(path):
+        # 上次运行在写入过程中中断，丢弃不完整的部分（对应的文件会重新生成）
+        with open(path, 'r+b') as file:
+            file.truncate(valid_length)
+    return records
+
+
+def _write_atomic(path, data):
+    """先写临时文件再替换，中断时不会留下写了一半的MIDI文件"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class DatasetJob:
+    """分片数据集生成任务"""
+
+    def __init__(self, output_dir, spec=None, midi_config_path="./configs/midi_config.yaml",
+                 run_config_path="./configs/run_configs.yaml"):
+        """创建或打开任务
+
+        输出目录中已有 job.json 时使用其中的任务描述和配置（给出的spec必须与之一致）；
+        否则用spec和当前配置文件创建新任务。
+
+        Args:
+            output_dir: 输出目录
+            spec: 任务描述（JobSpec），续跑已有任务时可以省略
+            midi_config_path: 新任务使用的MIDI音符映射配置路径
+            run_config_path: 新任务使用的运行参数配置路径
+        """
+        self.output_dir = output_dir
+        job_path = os.path.join(output_dir, JOB_FILE)
+
+        if os.path.exists(job_path):
+            with open(job_path, 'r', encoding='utf-8') as file:
+                job = json.load(file)
+            stored = JobSpec(**job['spec'])
+            if spec is not None and _normalize(spec) != stored:
+                raise ValueError(f"任务描述与 {job_path} 中的不一致，请使用新的输出目录")
+            self.spec = stored
+            self.midi_config = job['midi_config']
+            self.run_config = job['run_config']
+        else:
+            if spec is None:
+                raise ValueError(f"{output_dir} 中没有任务描述，需要给出spec")
+            self.spec = _normalize(spec)
+            self.midi_config = DrumSheetGenerator.load_yaml(midi_config_path)
+            self.run_config = DrumSheetGenerator.load_yaml(run_config_path)
+            os.makedirs(output_dir, exist_ok=True)
+            _write_atomic(job_path, json.dumps({
+                'spec': self.spec._asdict(),
+                'midi_config': self.midi_config,
+                'run_config': self.run_config,
+            }, indent=2, ensure_ascii=False).encode('utf-8'))
+
+    def load_patterns(self):
+        """加载任务使用的节奏型 {名称: 节奏型}"""
+        spec = self.spec
+        library = PatternLibrary.load(spec.library) if spec.library else PatternLibrary.builtin()
+        return library.as_dict(spec.patterns)
+
+    def iter_tasks(self, shards=None):
+        """枚举任务
+
+        Args:
+            shards: 分片编号集合，None表示全部分片
+
+        Yields:
+            tuple: (分片, (节奏型名称, 节奏型, 变体类型, 序号, 种子))
+        """
+        spec = self.spec
+        for task in iter_tasks(self.load_patterns(), spec.variant_types, spec.count, spec.seed):
+            shard = shard_of(task_id(task[0], task[2], task[3]), spec.shards)
+            if shards is None or shard in shards:
+                yield shard, task
+
+    def completed(self, shard):
+        """分片中已完成的任务标识集合"""
+        return {record['id'] for record in read_manifest(manifest_path(self.output_dir, shard, self.spec.shards))}
+
+    def run(self, shards=None, max_workers=None, chunk_size=64, limit=None):
+        """运行（或续跑）指定分片中未完成的任务
+
+        Args:
+            shards: 分片编号列表，None表示全部分片
+            max_workers: 工作进程数，为1时在当前进程中顺序执行
+            chunk_size: 每次派发给工作进程的任务数
+            limit: 本次最多生成的文件数（用于分批运行），None表示不限制
+
+        Returns:
+            int: 本次生成的文件数
+        """
+        spec = self.spec
+        shards = set(range(spec.shards) if shards is None else shards)
+        # 本次运行负责这些分片：追加前截掉上次中断留下的不完整行
+        done = {shard: {record['id'] for record in _repair_manifest(manifest_path(self.output_dir, shard, spec.shards))}
+                for shard in shards}
+
+        remaining = (task for shard, task in self.iter_tasks(shards)
+                     if task_id(task[0], task[2], task[3]) not in done[shard])
+        if limit is not None:
+            remaining = (task for _, task in zip(range(limit), remaining))
+
+        manifests = {}
+        written = 0
+        try:
+            results = execute_chunks(iter_chunks(remaining, chunk_size), spec.bars, None, max_workers,
+                                     (self.midi_config, self.run_config, None))
+            for result in results:
+                identifier = task_id(result.pattern_name, result.variant_type, result.index)
+                shard = shard_of(identifier, spec.shards)
+                path = relative_path(result.pattern_name, result.variant_type, result.index)
+                _write_atomic(os.path.join(self.output_dir, path), result.midi_bytes)
+
+                manifest = manifests.get(shard)
+                if manifest is None:
+                    manifest_file = manifest_path(self.output_dir, shard, spec.shards)
+                    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+                    manifest = manifests[shard] = open(manifest_file, 'a', encoding='utf-8')
+
+                # 文件写完后才记录到清单，中断时未记录的任务在续跑时重新生成
+                manifest.write(json.dumps({
+                    'id': identifier,
+                    'pattern_name': result.pattern_name,
+                    'variant_type': result.variant_type,
+                    'index': result.index,
+                    'seed': result.seed,
+                    'bars': spec.bars,
+                    'path': path.replace(os.sep, '/'),
+                    'bytes': len(result.midi_bytes),
+                    'digest': hashlib.blake2b(result.midi_bytes, digest_size=16).hexdigest(),
+                    'pattern': result.pattern,
+                }, ensure_ascii=False) + '\n')
+                manifest.flush()
+                written += 1
+        finally:
+            for manifest in manifests.values():
+                manifest.close()
+
+        return written
+
+    def status(self):
+        """各分片的进度
+
+        Returns:
+            dict: 分片编号 -> (已完成数, 任务总数)
+        """
+        totals = dict.fromkeys(range(self.spec.shards), 0)
+        for shard, _ in self.iter_tasks():
+            totals[shard] += 1
+        return {shard: (len(self.completed(shard)), total) for shard, total in totals.items()}
+
+
+def _normalize(spec):
+    """把任务描述转换为可与JSON往返比较的形式"""
+    return spec._replace(
+        patterns=None if spec.patterns is None else list(spec.patterns),
+        variant_types=list(spec.variant_types),
+    )
+
+
+def read_spec(output_dir):
+    """读取输出目录中已有任务的描述
+
+    Returns:
+        JobSpec: 任务描述，目录中没有 job.json 时返回None
+    """
+    job_path = os.path.join(output_dir, JOB_FILE)
+    if not os.path.exists(job_path):
+        return None
+    with open(job_path, 'r', encoding='utf-8') as file:
+        return JobSpec(**json.load(file)['spec'])
+
+
+# 命令行未给出时新任务使用的任务描述
+DEFAULT_SPEC = JobSpec(patterns=None, variant_types=['all'], count=100, seed=0, bars=4, shards=1, library=None)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="生成可断点续跑的分片变体数据集")
+    parser.add_argument('output_dir', help="输出目录（已有任务时直接续跑）")
+    parser.add_argument('--patterns', nargs='+', help="节奏型名称，默认使用节奏型库中的全部")
+    parser.add_argument('--library', help="节奏型库文件（PatternLibrary.save 的结果），默认使用内置节奏型")
+    parser.add_argument('--variants', nargs='+', help="变体类型（默认 all）")
+    parser.add_argument('--count', type=int, help="每个节奏型、每种变体类型生成的数量（默认100）")
+    parser.add_argument('--seed', type=int, help="基础随机种子（默认0）")
+    parser.add_argument('--bars', type=int, help="每个文件的小节数（默认4）")
+    parser.add_argument('--shards', type=int, help="分片数（默认1）")
+    parser.add_argument('--shard', type=int, action='append', help="本次运行的分片编号（可重复），默认全部")
+    parser.add_argument('--workers', type=int, help="工作进程数")
+    parser.add_argument('--status', action='store_true', help="只显示进度（不创建任务、不修改文件）")
+    args = parser.parse_args()
+
+    # 只包含命令行中给出的任务参数；已有任务时与 job.json 中的描述比较，不一致时报错
+    given = {field: value for field, value in {
+        'patterns': args.patterns, 'library': args.library, 'variant_types': args.variants, 'count': args.count,
+        'seed': args.seed, 'bars': args.bars, 'shards': args.shards,
+    }.items() if value is not None}
+
+    stored = read_spec(args.output_dir)
+    if stored is not None:
+        spec = stored._replace(**given) if given else None
+    elif args.status:
+        parser.error(f"{args.output_dir} 中没有任务（{JOB_FILE}）")
+    else:
+        spec = DEFAULT_SPEC._replace(**given)
+
+    try:
+        job = DatasetJob(args.output_dir, spec)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if not args.status:
+        written = job.run(shards=args.shard, max_workers=args.workers)
+        print(f"本次生成 {written} 个文件")
+
+    for shard, (done, total) in job.status().items():
+        print(f"分片 {shard}: {done}/{total}")
+
+
+if __name__ == "__main__":
+    main()
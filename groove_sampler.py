@@ -0,0 +1,172 @@
+"""按运行配置的概率参数从零随机生成节奏型
+
+GrooveSampler 使用 run_configs.yaml 中的参数逐拍生成完整小节：
+- base_note_length: 基本步长（四分音符为单位，0.5即8分音符）
+- triplet_probability: 一拍改为三连音的概率
+- subdivision_probability: 一个基本步长再细分为两个音符的概率
+- rest_probability: 一个位置为休止的概率（每小节第一个位置总会发声）
+- double_note_probability / triple_note_probability: 同时演奏两个/三个鼓的概率
+- accent_probability: 重音概率
+- drum_probabilities: 各个鼓的相对权重
+
+鼓的加权抽样使用预先构建的别名表（Vose alias method），每次抽取为O(1)；
+同一位置不会出现互斥的鼓（如闭镲和开镲），生成一个小节只需几十微秒。
+"""
+import random
+
+from pattern_grid import DRUM_VOICES
+
+# 同一位置互斥的鼓
+EXCLUSIVE_GROUPS = (
+    ('closed_hihat', 'open_hihat'),
+    ('ride', 'ride_bell'),
+)
+
+
+class AliasTable:
+    """Vose别名表：按权重O(1)抽取"""
+
+    def __init__(self, items, weights):
+        """构建别名表
+
+        Args:
+            items: 候选项
+            weights: 非负权重，至少一个大于0
+        """
+        total = float(sum(weights))
+        if not items or total <= 0:
+            raise ValueError("别名表至少需要一个正权重")
+
+        count = len(items)
+        scaled = [weight * count / total for weight in weights]
+        self.items = list(items)
+        self.probability = [1.0] * count
+        self.alias = list(range(count))
+
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+
+    def draw(self, rng=random):
+        """抽取一项（一个均匀随机数的整数部分选列，小数部分决定取本列还是别名）"""
+        scaled = rng.random() * len(self.items)
+        column = int(scaled)
+        if scaled - column < self.probability[column]:
+            return self.items[column]
+        return self.items[self.alias[column]]
+
+
+class GrooveSampler:
+    """基于配置概率的随机节奏型生成器"""
+
+    def __init__(self, generator, seed=None):
+        """初始化生成器
+
+        Args:
+            generator: 提供概率参数、拍号和MIDI映射的DrumSheetGenerator
+            seed: 随机种子，给出时使用独立的随机数生成器，否则使用random模块（受random.seed控制）
+        """
+        self.rng = random if seed is None else random.Random(seed)
+        self.quarters = generator.numerator * 4 / generator.denominator
+        self.base_note_length = generator.base_note_length
+        self.subdivision_prob = generator.subdivision_prob
+        self.triplet_prob = generator.triplet_prob
+        self.rest_prob = generator.rest_prob
+        self.double_note_prob = generator.double_note_prob
+        self.triple_note_prob = generator.triple_note_prob
+        self.accent_prob = generator.accent_prob
+
+        # 只抽取MIDI映射中存在的鼓，未配置权重的鼓默认为1.0
+        drums = [name for name in generator.midi_config if name != 'rest']
+        weights = [generator.drum_probabilities.get(name, 1.0) for name in drums]
+        drums, weights = zip(*[(d, w) for d, w in zip(drums, weights) if w > 0])
+        self.drums = AliasTable(drums, weights)
+        # 同一位置的鼓按默认声部顺序排列，与预定义节奏型和PatternGrid一致
+        voices = list(DRUM_VOICES) + [drum for drum in drums if drum not in DRUM_VOICES]
+        self._order = {drum: i for i, drum in enumerate(voices)}
+
+        self._conflicts = {}
+        for group in EXCLUSIVE_GROUPS:
+            for drum in group:
+                self._conflicts.setdefault(drum, set()).update(d for d in group if d != drum)
+
+    def sample_bar(self):
+        """生成一个小节的节奏型
+
+        Returns:
+            list: 节奏型列表，每个元素包含beat, drums, accent
+        """
+        rng = self.rng
+        pattern = []
+
+        for offset in self._onsets():
+            if pattern and rng.random() < self.rest_prob:
+                continue
+            pattern.append({
+                'beat': _beat_value(1 + offset),
+                'drums': self._sample_drums(),
+                'accent': rng.random() < self.accent_prob,
+            })
+        return pattern
+
+    def sample_bars(self, bars):
+        """生成多个小节的节奏型"""
+        return [self.sample_bar() for _ in range(bars)]
+
+    def _onsets(self):
+        """生成一个小节内的起始位置（四分音符为单位，相对小节开头）"""
+        rng = self.rng
+        step = self.base_note_length
+        offsets = []
+        beat = 0
+
+        while beat < self.quarters:
+            beat_length = min(1, self.quarters - beat)
+            if beat_length == 1 and rng.random() < self.triplet_prob:
+                # 整拍改为三连音
+                offsets.extend(beat + i / 3 for i in range(3))
+            else:
+                position = beat
+                while position < beat + beat_length:
+                    offsets.append(position)
+                    if rng.random() < self.subdivision_prob:
+                        offsets.append(position + step / 2)
+                    position += step
+            beat += beat_length
+
+        return offsets
+
+    def _sample_drums(self):
+        """抽取同时演奏的鼓（按权重，不重复且不互斥）"""
+        rng = self.rng
+        u = rng.random()
+        if u < self.triple_note_prob:
+            count = 3
+        elif u < self.triple_note_prob + self.double_note_prob:
+            count = 2
+        else:
+            count = 1
+
+        chosen = []
+        blocked = set()
+        # 重复或互斥时重新抽取，次数有上限，避免权重集中时陷入循环
+        for _ in range(count * 8):
+            drum = self.drums.draw(rng)
+            if drum in blocked:
+                continue
+            chosen.append(drum)
+            blocked.add(drum)
+            blocked.update(self._conflicts.get(drum, ()))
+            if len(chosen) == count:
+                break
+        return sorted(chosen, key=self._order.get)
+
+
+def _beat_value(beat):
+    """拍位置保留两位小数（三连音写作1.33、1.67，与预定义节奏型一致）"""
+    return round(float(beat), 2)
@@ -0,0 +1,201 @@
+"""力度与时间人性化
+
+Humanizer 把音符列表（tick, midi_note, duration, velocity）整体转换为NumPy数组，
+一次性计算：
+- 力度曲线：按鼓声部缩放基础力度，按小节内的节拍位置加强或减弱，再加入随机波动
+- 微小时间偏移：各鼓声部的固定偏移（如军鼓略微拖后）加随机偏移，音符不会被移到所属小节之前
+- 鬼音：在空闲的16分音符位置以低力度加入军鼓（或其他声部）
+
+随机数由 (种子, 音符tick, 音符编号) 经哈希得到，与调用顺序和分批方式无关：
+整首歌一次处理与 SongBuilder / LivePlayer 逐小节处理的结果完全相同，相同种子可复现。
+"""
+import random
+from itertools import chain
+
+import numpy as np
+
+from beat_grid import TICKS_PER_QUARTER
+
+# 各随机量使用的独立流编号
+_VELOCITY, _VELOCITY_PHASE, _TIMING, _TIMING_PHASE, _GHOST, _GHOST_VELOCITY = range(6)
+
+# 哈希常数（splitmix64）
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(values):
+    """splitmix64终混：把uint64数组映射为均匀分布的伪随机uint64"""
+    with np.errstate(over='ignore'):
+        z = values + _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * _MIX1
+        z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+
+class Humanizer:
+    """批量计算力度曲线、时间偏移和鬼音"""
+
+    def __init__(self, midi_config, bpm=120, bar_ticks=4 * TICKS_PER_QUARTER, seed=None,
+                 velocity_spread=6.0, beat_emphasis=8.0, timing_ms=4.0, voice_scale=None,
+                 voice_offset_ms=None, ghost_probability=0.0, ghost_voice='snare', ghost_velocity=(20, 40)):
+        """初始化人性化参数
+
+        Args:
+            midi_config: 鼓名称 -> MIDI音符编号映射
+            bpm: 节拍速度，用于把毫秒换算为tick
+            bar_ticks: 一个小节的tick数
+            seed: 随机种子，默认从random模块抽取（受random.seed控制）
+            velocity_spread: 力度随机波动的标准差
+            beat_emphasis: 拍点增加的力度（小节第一拍加倍，8分音符位置不变，更细的位置减去一半）
+            timing_ms: 时间随机偏移的标准差（毫秒）
+            voice_scale: 鼓名称 -> 力度倍数
+            voice_offset_ms: 鼓名称 -> 固定时间偏移（毫秒，正值为拖后）
+            ghost_probability: 空闲16分音符位置加入鬼音的概率
+            ghost_voice: 鬼音使用的鼓
+            ghost_velocity: 鬼音力度范围 (最小, 最大)
+        """
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.bar_ticks = bar_ticks
+        self.velocity_spread = velocity_spread
+        self.beat_emphasis = beat_emphasis
+        self.ghost_probability = ghost_probability
+        self.ghost_velocity = tuple(ghost_velocity)
+
+        ticks_per_ms = bpm * TICKS_PER_QUARTER / 60_000
+        self.timing_ticks = timing_ms * ticks_per_ms
+
+        # 按MIDI音符编号索引的查找表，处理时直接用数组索引
+        self._scale = np.ones(128)
+        for name, scale in (voice_scale or {}).items():
+            if name in midi_config:
+                self._scale[midi_config[name]] = scale
+        self._offset = np.zeros(128)
+        for name, offset in (voice_offset_ms or {}).items():
+            if name in midi_config:
+                self._offset[midi_config[name]] = offset * ticks_per_ms
+
+        self.ghost_note = midi_config.get(ghost_voice) if ghost_probability > 0 else None
+        self._stream_keys = _mix(np.uint64(seed & 0xFFFFFFFFFFFFFFFF) + np.arange(6, dtype=np.uint64))
+
+    @classmethod
+    def from_generator(cls, generator, seed=None):
+        """按生成器的 run_configs.yaml 中 humanize 一节创建（seed给出时覆盖配置中的种子）"""
+        options = dict(generator.run_config.get('humanize') or {})
+        options.pop('enabled', None)
+        config_seed = options.pop('seed', None)
+        return cls(generator.midi_config, bpm=generator.bpm, bar_ticks=generator.bar_ticks,
+                   seed=seed if seed is not None else config_seed, **options)
+
+    def _random(self, ticks, pitches, streams):
+        """由 (流, tick, 音符编号) 哈希得到 [0, 1) 均匀随机数
+
+        Returns:
+            np.ndarray: 形状 (n, len(streams))，第j列对应streams[j]
+        """
+        keys = (ticks.astype(np.uint64) << np.uint64(7)) | pitches.astype(np.uint64)
+        values = _mix(keys[:, None] ^ self._stream_keys[list(streams)])
+        return (values >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    @staticmethod
+    def _normal(uniform, column):
+        """Box-Muller变换：用第column列及下一列得到标准正态随机数"""
+        radius = np.sqrt(-2.0 * np.log1p(-uniform[:, column]))
+        return radius * np.cos(2 * np.pi * uniform[:, column + 1])
+
+    @staticmethod
+    def _strength(ticks, bar_ticks):
+        """小节内位置的节拍强度：小节第一拍2，其他拍1，8分音符0，更细的位置-0.5"""
+        position = ticks % bar_ticks
+        return ((position == 0) + (position % TICKS_PER_QUARTER == 0)
+                - 0.5 * (position % (TICKS_PER_QUARTER // 2) != 0))
+
+    def apply_arrays(self, ticks, pitches, durations, velocities, bar_origin=0, bar_length=None):
+        """对音符数组做人性化处理
+
+        Args:
+            ticks: 起始tick（相对乐曲开头），形状 (n,)
+            pitches: MIDI音符编号
+            durations: 时长（tick）
+            velocities: 基础力度
+            bar_origin: 小节网格的起点tick（拍号变化的段落从段落起点开始划分小节）
+            bar_length: 小节tick数，默认为 self.bar_ticks
+
+        Returns:
+            tuple: 新的 (ticks, pitches, durations, velocities) int64数组，鬼音追加在末尾
+        """
+        ticks = np.asarray(ticks, dtype=np.int64)
+        pitches = np.asarray(pitches, dtype=np.int64)
+        durations = np.asarray(durations, dtype=np.int64)
+        velocities = np.asarray(velocities, dtype=np.float64)
+        bar_length = bar_length or self.bar_ticks
+        relative = ticks - bar_origin
+
+        uniform = self._random(ticks, pitches, (_VELOCITY, _VELOCITY_PHASE, _TIMING, _TIMING_PHASE))
+        velocities = (velocities * self._scale[pitches]
+                      + self.beat_emphasis * self._strength(relative, bar_length)
+                      + self.velocity_spread * self._normal(uniform, 0))
+        timing = self._normal(uniform, 2)
+
+        if self.ghost_note is not None and len(ticks):
+            ghost_ticks = self._ghost_ticks(relative, pitches, bar_length, bar_origin) + bar_origin
+            ghost_pitches = np.full(len(ghost_ticks), self.ghost_note, dtype=np.int64)
+            ghost_uniform = self._random(ghost_ticks, ghost_pitches, (_TIMING, _TIMING_PHASE, _GHOST_VELOCITY))
+            low, high = self.ghost_velocity
+            ghost_velocities = low + np.floor(ghost_uniform[:, 2] * (high - low + 1))
+
+            ticks = np.concatenate([ticks, ghost_ticks])
+            relative = ticks - bar_origin
+            pitches = np.concatenate([pitches, ghost_pitches])
+            durations = np.concatenate([durations, np.full(len(ghost_ticks), TICKS_PER_QUARTER // 4)])
+            velocities = np.concatenate([velocities, ghost_velocities])
+            timing = np.concatenate([timing, self._normal(ghost_uniform, 0)])
+
+        # 时间偏移不把音符移到所属小节之前，逐小节流式写入时顺序保持有效
+        shift = self._offset[pitches] + self.timing_ticks * timing
+        bar_start = ticks - relative % bar_length
+        shifted = np.maximum(ticks + np.rint(shift).astype(np.int64), bar_start)
+
+        velocities = np.clip(np.rint(velocities), 1, 127).astype(np.int64)
+        return shifted, pitches, durations, velocities
+
+    def _ghost_ticks(self, ticks, pitches, bar_length, bar_origin=0):
+        """在音符所在小节的空闲16分音符位置（不含拍点）抽取鬼音位置（ticks相对 bar_origin）"""
+        step = TICKS_PER_QUARTER // 4
+        steps_per_bar = bar_length // step
+        bars = ticks // bar_length
+        first_bar = bars.min()
+
+        # 小节 × 16分音符位置 的占用表：只在有音符的小节、未被鬼音声部占用的弱位置加入鬼音
+        free = np.zeros((bars.max() - first_bar + 1, steps_per_bar), dtype=bool)
+        free[bars - first_bar] = True
+        free[:, ::4] = False
+        own = ticks[(pitches == self.ghost_note) & (ticks % step == 0)]
+        free[own // bar_length - first_bar, own % bar_length // step] = False
+
+        rows, columns = np.nonzero(free)
+        candidates = (rows + first_bar) * bar_length + columns * step
+        ghost_pitches = np.full(len(candidates), self.ghost_note, dtype=np.int64)
+        chosen = self._random(candidates + bar_origin, ghost_pitches, (_GHOST,))[:, 0] < self.ghost_probability
+        return candidates[chosen]
+
+    def apply(self, notes, bar_origin=0, bar_length=None):
+        """对 (offset, midi_note, duration, velocity) 音符列表做人性化处理
+
+        Args:
+            notes: 音符列表
+            bar_origin: 小节网格的起点tick
+            bar_length: 小节tick数，默认为 self.bar_ticks
+
+        Returns:
+            list: 新的音符列表（tick），鬼音追加在末尾
+        """
+        if not notes:
+            return []
+        flat = np.fromiter(chain.from_iterable(notes), dtype=np.int64, count=4 * len(notes))
+        ticks, pitches, durations, velocities = flat.reshape(-1, 4).T
+        columns = self.apply_arrays(ticks, pitches, durations, velocities, bar_origin, bar_length)
+        return list(zip(*(column.tolist() for column in columns)))
@@ -0,0 +1,191 @@
+"""生成流程的计时与计数
+
+enable() 时把 DrumSheetGenerator 的关键方法替换为计时包装，disable() 时恢复原方法，
+因此关闭时没有任何额外开销（不在热路径中判断开关）。记录的内容：
+- 各阶段（配置加载、变体生成、节奏渲染、序列化、保存文件）的调用次数、总耗时、
+  最小/最大耗时和按2的幂分桶的耗时直方图（微秒）
+- 计数器：生成的音符数、写出的字节数、保存的文件数
+
+统计只在当前进程内累计（批量生成请使用 max_workers=1）；
+snapshot() 返回可直接序列化为JSON的字典，write_json() 写入文件，
+profile() 用cProfile记录一段代码并保存为 .prof 文件（可用 pstats 或 snakeviz 查看）。
+"""
+import cProfile
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+from random_drumsheet import DrumSheetGenerator
+
+
+def _created_notes(self, args, result):
+    """generate_from_pattern 的计数：生成的音符数（同一位置的多个鼓分别计数，不含休止符）"""
+    notes = sum(len(note_names.split('|')) for _, note_names, _, _ in self.events if note_names != 'rest')
+    return {'notes_created': notes}
+
+
+def _saved_file(self, args, result):
+    """save_midi 的计数：保存的文件数和文件大小"""
+    counts = {'files_saved': 1}
+    with contextlib.suppress(OSError):
+        counts['bytes_written'] = os.path.getsize(result)
+    return counts
+
+
+# 被计时的方法: 阶段名称 -> (类, 方法名, 计数函数)
+# 计数函数 counter(self, args, result) 返回 {计数器名称: 增量}
+STAGES = {
+    'load_yaml': (DrumSheetGenerator, 'load_yaml', None),
+    'create_pattern_variant': (DrumSheetGenerator, 'create_pattern_variant', None),
+    'generate_from_pattern': (DrumSheetGenerator, 'generate_from_pattern', _created_notes),
+    'to_bytes': (DrumSheetGenerator, 'to_bytes',
+                 lambda self, args, result: {'bytes_serialized': len(result)}),
+    'save_midi': (DrumSheetGenerator, 'save_midi', _saved_file),
+}
+
+_lock = threading.Lock()
+_originals = {}  # 阶段名称 -> 类字典中的原始属性（可能是staticmethod）
+_stages = {}     # 阶段名称 -> 统计字典
+_counters = {}   # 计数器名称 -> 数值
+
+
+def is_enabled():
+    """是否正在记录"""
+    return bool(_originals)
+
+
+def enable(stages=None):
+    """开始记录（替换方法为计时包装）
+
+    Args:
+        stages: 要计时的阶段名称，默认为 STAGES 中的全部阶段
+    """
+    with _lock:
+        for name in stages or STAGES:
+            if name in _originals:
+                continue
+            cls, attribute, counter = STAGES[name]
+            original = cls.__dict__[attribute]
+            _originals[name] = original
+
+            if isinstance(original, staticmethod):
+                setattr(cls, attribute, staticmethod(_timed(name, original.__func__, None)))
+            else:
+                setattr(cls, attribute, _timed(name, original, counter))
+
+
+def disable():
+    """停止记录并恢复原方法（已记录的统计保留，直到 reset()）"""
+    with _lock:
+        for name, original in _originals.items():
+            cls, attribute, _ = STAGES[name]
+            setattr(cls, attribute, original)
+        _originals.clear()
+
+
+def reset():
+    """清空已记录的统计"""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+@contextlib.contextmanager
+def recording(stages=None):
+    """在with块内记录，结束后恢复原方法"""
+    enable(stages)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def count(name, value=1):
+    """累加计数器"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def _record(stage, seconds):
+    """记录一次阶段耗时"""
+    microseconds = seconds * 1_000_000
+    bucket = 1 << max(0, int(microseconds).bit_length())  # 耗时小于bucket微秒
+    with _lock:
+        stats = _stages.get(stage)
+        if stats is None:
+            stats = _stages[stage] = {'calls': 0, 'total': 0.0, 'min': seconds, 'max': seconds, 'histogram': {}}
+        stats['calls'] += 1
+        stats['total'] += seconds
+        stats['min'] = min(stats['min'], seconds)
+        stats['max'] = max(stats['max'], seconds)
+        stats['histogram'][bucket] = stats['histogram'].get(bucket, 0) + 1
+
+
+def _timed(stage, func, counter):
+    """生成计时包装，调用后按计数函数累加计数器"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        _record(stage, time.perf_counter() - start)
+
+        if counter is not None:
+            for name, value in counter(args[0], args[1:], result).items():
+                count(name, value)
+        return result
+
+    return wrapper
+
+
+def snapshot():
+    """返回当前统计（毫秒），可直接序列化为JSON
+
+    Returns:
+        dict: {'stages': {阶段: {calls, total_ms, mean_ms, min_ms, max_ms, histogram_us}}, 'counters': {...}}
+    """
+    with _lock:
+        stages = {}
+        for name, stats in _stages.items():
+            stages[name] = {
+                'calls': stats['calls'],
+                'total_ms': stats['total'] * 1000,
+                'mean_ms': stats['total'] / stats['calls'] * 1000,
+                'min_ms': stats['min'] * 1000,
+                'max_ms': stats['max'] * 1000,
+                # 键为桶的上界："<N" 表示耗时小于N微秒
+                'histogram_us': {f"<{bucket}": calls for bucket, calls in sorted(stats['histogram'].items())},
+            }
+        return {'stages': stages, 'counters': dict(_counters)}
+
+
+def write_json(path):
+    """把统计写入JSON文件"""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(snapshot(), file, indent=2, ensure_ascii=False)
+
+
+def format_report():
+    """格式化为文本表格"""
+    report = snapshot()
+    lines = [f"{'阶段':<26}{'次数':>8}{'总耗时(ms)':>14}{'平均(ms)':>12}{'最大(ms)':>12}", "-" * 72]
+    for name, stats in report['stages'].items():
+        lines.append(f"{name:<26}{stats['calls']:>8}{stats['total_ms']:>14.3f}"
+                     f"{stats['mean_ms']:>12.3f}{stats['max_ms']:>12.3f}")
+    for name, value in report['counters'].items():
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profile(path):
+    """用cProfile记录with块内的执行过程，结束后保存到path"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,282 @@
+"""低延迟实时播放
+
+LivePlayer 基于asyncio按 run_configs.yaml 中的 bpm 和拍号逐小节实时发送MIDI消息：
+- 每小节的音符事件来自 DrumSheetGenerator 的单小节缓存，在当前小节的第一个事件发出后
+  立即预先计算下一小节，小节线处不需要再做任何计算
+- 等待时先用 asyncio.sleep 睡到目标时刻前 spin 秒，最后一段忙等，发送误差通常在亚毫秒级
+- 每个消息的实际发送时刻与计划时刻之差都会记录，jitter_stats() 给出平均、p99和最大值
+  （平均和最大值累计整个会话，p99取最近 LATENCY_WINDOW 个消息，长时间播放时内存占用不增长）
+- switch() 切换节奏型或变体类型，从下一小节开始生效，不打断当前小节
+
+消息发送到sink对象（任何提供 send(message, timestamp) 方法的对象）：
+RecordingSink 记录在内存中并可导出为MIDI文件，MidoSink 发送到MIDI端口（需要安装mido）。
+"""
+import asyncio
+import heapq
+import random
+import time
+from collections import deque, namedtuple
+
+import midi_writer
+from beat_grid import TICKS_PER_QUARTER
+from pattern_grid import PatternGrid
+from random_drumsheet import DrumSheetGenerator
+
+# 默认在目标时刻前多少秒开始忙等
+SPIN_SECONDS = 0.002
+
+# 开始播放前的预备时间（秒），第一小节的事件在此之后发出
+LEAD_IN_SECONDS = 0.01
+
+# 计算p99延迟时保留的最近消息数
+LATENCY_WINDOW = 10000
+
+JitterStats = namedtuple('JitterStats', [
+    'events',   # 已发送的消息数
+    'mean_ms',  # 平均延迟（毫秒，实际发送时刻 - 计划时刻）
+    'p99_ms',   # 99百分位延迟（最近 LATENCY_WINDOW 个消息）
+    'max_ms',   # 最大延迟
+])
+
+
+class RecordingSink:
+    """把实时消息记录在内存中"""
+
+    def __init__(self):
+        # (相对播放开始的秒数, 消息字节) 列表
+        self.messages = []
+
+    def send(self, message, timestamp):
+        """记录一条消息
+
+        Args:
+            message: MIDI消息字节
+            timestamp: 实际发送时刻（相对播放开始的秒数）
+        """
+        self.messages.append((timestamp, message))
+
+    def to_midi_bytes(self, bpm=120, numerator=4, denominator=4, ticks_per_quarter=TICKS_PER_QUARTER,
+                      track_name='Percussion'):
+        """按实际发送时刻把记录的消息编码为MIDI文件（可用于检查实时演奏的时间偏差）"""
+        seconds_per_tick = 60 / (bpm * ticks_per_quarter)
+
+        body = bytearray()
+        body += b'\x00' + midi_writer.meta_event(midi_writer.META_TRACK_NAME, track_name.encode('utf-8'))
+        last_tick = 0
+        for timestamp, message in self.messages:
+            tick = max(last_tick, round(timestamp / seconds_per_tick))
+            body += midi_writer.encode_varlen(tick - last_tick) + message
+            last_tick = tick
+        body += midi_writer.encode_varlen(ticks_per_quarter) + midi_writer.meta_event(midi_writer.META_END_OF_TRACK, b'')
+
+        return (midi_writer.header_chunk(2, ticks_per_quarter)
+                + midi_writer.conductor_track(bpm, numerator, denominator, ticks_per_quarter)
+                + midi_writer.track_chunk(bytes(body)))
+
+
+class MidoSink:
+    """把消息发送到MIDI输出端口（需要安装mido及其后端，如python-rtmidi）"""
+
+    def __init__(self, port_name=None, virtual=False):
+        """打开输出端口
+
+        Args:
+            port_name: 端口名称，默认使用系统默认端口
+            virtual: 为True时创建虚拟端口，其他程序可以连接到该端口
+        """
+        try:
+            import mido
+        except ImportError:
+            raise ImportError("MidoSink需要安装mido: pip install mido python-rtmidi") from None
+
+        self._message = mido.Message
+        self.port = mido.open_output(port_name, virtual=virtual)
+
+    def send(self, message, timestamp):
+        """立即发送一条消息（timestamp仅用于接口一致）"""
+        self.port.send(self._message.from_bytes(message))
+
+    def close(self):
+        """关闭端口"""
+        self.port.close()
+
+
+class LivePlayer:
+    """逐小节实时播放节奏型"""
+
+    def __init__(self, pattern, generator=None, sink=None, variant_type=None, seed=None,
+                 spin=SPIN_SECONDS, clock=time.perf_counter):
+        """初始化播放器
+
+        Args:
+            pattern: 节奏型列表（或PatternGrid）
+            generator: 提供速度、拍号和小节事件的DrumSheetGenerator，默认新建一个
+            sink: 接收消息的对象，需提供 send(message, timestamp)，默认 RecordingSink
+            variant_type: 每小节应用的变体类型 ('snare', 'bass', 'random', 'all')，None表示原样重复
+            seed: 随机种子，给出时变体序列可复现
+            spin: 在目标时刻前多少秒改为忙等（0表示只用asyncio.sleep）
+            clock: 返回秒数的单调时钟
+        """
+        self.generator = generator or DrumSheetGenerator(engine='direct')
+        self.sink = sink if sink is not None else RecordingSink()
+        self.seed = seed
+        self.spin = spin
+        self.clock = clock
+
+        self.seconds_per_tick = 60 / (self.generator.bpm * TICKS_PER_QUARTER)
+        self.bar_seconds = self.generator.bar_ticks * self.seconds_per_tick
+
+        self._pattern = pattern
+        self._variant_type = variant_type
+        self._bar = 0
+        self._next = None  # 预先计算的下一小节: (节奏型, [(tick, 消息字节), ...])
+        self._stopping = False
+        self.reset_stats()
+
+    def switch(self, pattern=None, variant_type=None):
+        """切换节奏型或变体类型，从下一小节开始生效
+
+        播放中调用时会立即重新计算下一小节（单小节事件有缓存，只需几十微秒）。
+        从其他线程调用时请使用 loop.call_soon_threadsafe(player.switch, ...)。
+
+        Args:
+            pattern: 新的节奏型，None表示保持不变
+            variant_type: 新的变体类型，None表示原样重复
+        """
+        if pattern is not None:
+            self._pattern = pattern
+        self._variant_type = variant_type
+        if self._next is not None:
+            self._next = self._prepare(self._bar + 1)
+
+    def stop(self):
+        """在当前小节结束后停止播放"""
+        self._stopping = True
+
+    def _prepare(self, bar):
+        """计算第bar小节（0基础）要发送的消息，tick为相对播放开始的绝对位置"""
+        generator = self.generator
+        if self._variant_type:
+            pattern = generator.create_pattern_variant(self._pattern, self._variant_type)
+        else:
+            pattern = self._pattern
+        if isinstance(pattern, PatternGrid):
+            pattern = pattern.to_dicts()
+
+        notes = generator.events_to_midi_notes(generator.bar_events(pattern), bar * generator.bar_ticks)
+        return pattern, midi_writer.note_messages(notes, generator.midi_channel - 1)
+
+    async def _wait_until(self, target):
+        """等待到target时刻：先睡眠，最后spin秒忙等"""
+        clock = self.clock
+        remaining = target - clock()
+        if remaining > self.spin:
+            await asyncio.sleep(remaining - self.spin)
+        else:
+            await asyncio.sleep(0)  # 让出一次事件循环，使switch等回调有机会执行
+        while clock() < target:
+            pass
+
+    async def play(self, bars=None, on_bar=None):
+        """实时播放
+
+        Args:
+            bars: 播放的小节数，None表示一直播放到调用 stop()
+            on_bar: 每小节开始时调用的回调 on_bar(小节序号, 节奏型)
+
+        Returns:
+            int: 播放的小节数
+        """
+        if self.seed is not None:
+            random.seed(self.seed)
+
+        clock = self.clock
+        seconds_per_tick = self.seconds_per_tick
+        bar_ticks = self.generator.bar_ticks
+
+        # 待发送的消息堆: (tick, 序号, 消息字节)，跨小节的音符关闭事件留在堆中
+        pending = []
+        sequence = 0
+        self._bar = 0
+        self._stopping = False
+        self._next = self._prepare(0)
+        start = clock() + LEAD_IN_SECONDS
+
+        try:
+            while (bars is None or self._bar < bars) and not self._stopping:
+                pattern, messages = self._next
+                self._next = None
+                for tick, message in messages:
+                    heapq.heappush(pending, (tick, sequence, message))
+                    sequence += 1
+                if on_bar is not None:
+                    on_bar(self._bar, pattern)
+
+                bar_end = (self._bar + 1) * bar_ticks
+                while pending and pending[0][0] < bar_end:
+                    await self._emit_tick(pending, start)
+                    if self._next is None:
+                        # 当前小节已开始发声，预先计算下一小节
+                        self._next = self._prepare(self._bar + 1)
+
+                if self._next is None:
+                    self._next = self._prepare(self._bar + 1)
+                self._bar += 1
+
+            # 发送剩余的音符关闭事件，并等到最后一个小节结束
+            while pending:
+                await self._emit_tick(pending, start)
+            await self._wait_until(start + self._bar * bar_ticks * seconds_per_tick)
+        finally:
+            # 被取消时立即关闭仍在发声的音符
+            for _, _, message in sorted(pending):
+                if message[0] & 0xF0 == midi_writer.NOTE_OFF:
+                    self.sink.send(message, clock() - start)
+            self._next = None
+
+        return self._bar
+
+    async def _emit_tick(self, pending, start):
+        """在计划时刻发送堆顶tick上的所有消息并记录延迟（同一时刻的消息之间不做其他计算）"""
+        tick = pending[0][0]
+        target = start + tick * self.seconds_per_tick
+        await self._wait_until(target)
+
+        clock = self.clock
+        send = self.sink.send
+        while pending and pending[0][0] == tick:
+            message = heapq.heappop(pending)[2]
+            now = clock()
+            send(message, now - start)
+            self._record_latency(now - target)
+
+    def _record_latency(self, latency):
+        """累计延迟统计：总数、总和与最大值覆盖整个会话，最近的延迟保留在定长窗口中"""
+        self._latencies.append(latency)
+        self._latency_count += 1
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+
+    def run(self, bars=None, on_bar=None):
+        """在新的事件循环中同步播放，参数见 play"""
+        return asyncio.run(self.play(bars, on_bar))
+
+    def jitter_stats(self):
+        """发送时刻误差的统计
+
+        Returns:
+            JitterStats: 消息数及平均、p99、最大延迟（毫秒），尚未发送消息时均为0
+        """
+        if not self._latency_count:
+            return JitterStats(0, 0.0, 0.0, 0.0)
+        latencies = sorted(self._latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return JitterStats(self._latency_count, self._latency_total / self._latency_count * 1000,
+                           p99 * 1000, self._latency_max * 1000)
+
+    def reset_stats(self):
+        """清除已记录的延迟"""
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._latency_count = 0
+        self._latency_total = 0.0
+        self._latency_max = float('-inf')
@@ -0,0 +1,394 @@
+"""按风格训练的马尔可夫律动模型
+
+MarkovGrooveModel 把训练语料（预定义节奏型、节奏型库或导入的MIDI语料）中的每个小节
+量化到步进网格上，每个步进的状态为 (同时演奏的鼓, 是否重音)，按风格和拍号统计：
+- 第k阶转移表：(k, 步进位置, 前k个步进的状态) -> 下一个状态的计数，k = 0..order
+- 网格分辨率按语料自动确定（8分音符为2步/拍，16分音符为4步/拍，三连音为3步/拍，混合时取最小公倍数，
+  超过上限时取能精确表示最多音符的约数）
+
+采样时逐步进使用已出现过的最高阶上下文，每个分布预先构建为别名表，每次抽取为O(1)，
+生成一个小节只需几十微秒；以 variation 的概率改为从同一拍号下所有风格在该位置的
+合并分布中抽取，在保持位置习惯的同时产生原语料中没有的组合。
+
+模型可以用 save()/load() 保存为紧凑的 .npz 文件（只保存计数表，别名表在加载时重建）。
+"""
+import json
+import math
+import random
+from collections import Counter
+from fractions import Fraction
+
+import numpy as np
+
+from beat_grid import TICKS_PER_QUARTER, beat_to_ticks, bar_ticks
+from groove_sampler import AliasTable, _beat_value
+from pattern_grid import DRUM_VOICES, PatternGrid
+from pattern_library import PatternLibrary
+
+# 每四分音符最多的步进数，更细的位置量化到该网格
+MAX_RESOLUTION = 24
+
+# 判断风格时未出现状态的加一平滑系数
+LIKELIHOOD_SMOOTHING = 0.5
+
+# 风格判断结果缓存的最大条目数
+STYLE_CACHE_SIZE = 1024
+
+
+class MarkovGrooveModel:
+    """按风格学习步进转移统计并采样新小节"""
+
+    def __init__(self, order=2, variation=0.15, seed=None):
+        """初始化空模型（一般通过 train / from_library / builtin / load 创建）
+
+        Args:
+            order: 马尔可夫阶数（上下文中前几个步进的状态）
+            variation: 每个步进改为从所有风格的合并分布中抽取的概率
+            seed: 随机种子，给出时使用独立的随机数生成器，否则使用random模块（受random.seed控制）
+        """
+        self.order = order
+        self.variation = variation
+        self.rng = random if seed is None else random.Random(seed)
+
+        self.voices = list(DRUM_VOICES)
+        self.states = [(0, False)]  # 状态编号 -> (鼓声部位掩码, 是否重音)，0为空步进
+        self._state_index = {(0, False): 0}
+
+        self.resolutions = {}  # (风格, 拍号) -> 每四分音符的步进数
+        self._counts = {}      # (风格, 拍号) -> {(k, 位置, 上下文): Counter(状态)}
+        self._tables = {}      # (风格, 拍号) -> {(k, 位置, 上下文): AliasTable}
+        self._pooled = {}      # 拍号 -> (分辨率, {位置: AliasTable})
+        self._bar_beats = {}   # (风格, 拍号) -> 各步进的拍位置
+        self._state_drums = []
+        self._likelihoods = {}  # 拍号 -> [(风格, 公共网格各位置的对数概率表), ...]
+        self._style_cache = {}  # (拍号, 节奏型) -> 风格
+
+    @classmethod
+    def train(cls, entries, order=2, variation=0.15, seed=None):
+        """由节奏型条目训练模型
+
+        Args:
+            entries: 可迭代的字典，每个包含 pattern，可选 style（默认'unknown'）、
+                     time_signature（默认'4/4'），与 PatternLibrary.from_entries 相同
+            order: 马尔可夫阶数
+            variation: 从合并分布中抽取的概率
+            seed: 随机种子
+
+        Returns:
+            MarkovGrooveModel: 训练好的模型
+        """
+        model = cls(order, variation, seed)
+        bars = {}
+        for entry in entries:
+            pattern = entry['pattern']
+            if isinstance(pattern, PatternGrid):
+                pattern = pattern.to_dicts()
+            key = (entry.get('style', 'unknown'), str(entry.get('time_signature', '4/4')))
+            bars.setdefault(key, []).append(pattern)
+
+        for key, patterns in bars.items():
+            numerator, denominator = _parse_signature(key[1])
+            length = bar_ticks(numerator, denominator)
+            subdivisions = Counter(
+                Fraction(beat_to_ticks(note_info['beat']) - TICKS_PER_QUARTER, TICKS_PER_QUARTER).denominator
+                for pattern in patterns for note_info in pattern)
+            resolution = model.resolutions[key] = _grid_resolution(subdivisions)
+
+            counts = model._counts[key] = {}
+            for pattern in patterns:
+                sequence = model._quantize(pattern, resolution, length)
+                for position, state in enumerate(sequence):
+                    for k in range(min(order, position) + 1):
+                        context = (k, position, tuple(sequence[position - k:position]))
+                        counts.setdefault(context, Counter())[state] += 1
+
+        model._compile()
+        return model
+
+    @classmethod
+    def from_library(cls, library, names=None, **kwargs):
+        """由节奏型库训练（风格和拍号取自库的索引信息）"""
+        entries = []
+        for name in (library.names if names is None else names):
+            info = library.info(name)
+            entries.append({'pattern': library.get(name), 'style': info.style,
+                            'time_signature': f"{info.numerator}/{info.denominator}"})
+        return cls.train(entries, **kwargs)
+
+    @classmethod
+    def builtin(cls, **kwargs):
+        """由 RhythmPatterns 的预定义节奏型训练"""
+        return cls.from_library(PatternLibrary.builtin(), **kwargs)
+
+    def _state(self, mask, accent):
+        """状态编号（新状态追加到词表）"""
+        key = (mask, accent)
+        index = self._state_index.get(key)
+        if index is None:
+            index = self._state_index[key] = len(self.states)
+            self.states.append(key)
+        return index
+
+    def _step_states(self, pattern, resolution, length, add_voices=False):
+        """把一个小节量化为各步进的 (鼓声部位掩码, 是否重音)，同一步进上的音符合并
+
+        Args:
+            add_voices: 为True时把未知的鼓追加到声部列表，否则忽略
+        """
+        steps = length * resolution // TICKS_PER_QUARTER
+        masks = [0] * steps
+        accents = [False] * steps
+        for note_info in pattern:
+            step = round((beat_to_ticks(note_info['beat']) - TICKS_PER_QUARTER) * resolution / TICKS_PER_QUARTER)
+            if not 0 <= step < steps:
+                continue
+            for drum in note_info['drums']:
+                if drum == 'rest':
+                    continue
+                if drum not in self.voices:
+                    if not add_voices:
+                        continue
+                    self.voices.append(drum)
+                masks[step] |= 1 << self.voices.index(drum)
+            accents[step] = accents[step] or bool(note_info['accent'])
+        return [(mask, accent and mask != 0) for mask, accent in zip(masks, accents)]
+
+    def _quantize(self, pattern, resolution, length):
+        """量化为状态编号序列（新状态追加到词表）"""
+        return [self._state(mask, accent)
+                for mask, accent in self._step_states(pattern, resolution, length, add_voices=True)]
+
+    def _compile(self):
+        """由计数表构建别名表和合并分布"""
+        self._tables = {key: {context: AliasTable(list(counter), list(counter.values()))
+                              for context, counter in counts.items()}
+                        for key, counts in self._counts.items()}
+
+        # 同一拍号下所有风格的0阶分布，按各风格分辨率的最小公倍数对齐位置
+        common = {}
+        for (_, signature), resolution in self.resolutions.items():
+            common[signature] = math.lcm(common.get(signature, 1), resolution)
+        pooled = {signature: {} for signature in common}
+        for (style, signature), counts in self._counts.items():
+            scale = common[signature] // self.resolutions[(style, signature)]
+            for (k, position, _), counter in counts.items():
+                if k == 0:
+                    pooled[signature].setdefault(position * scale, Counter()).update(counter)
+        self._pooled = {signature: (common[signature], {position: AliasTable(list(counter), list(counter.values()))
+                                                        for position, counter in merged.items()})
+                        for signature, merged in pooled.items()}
+
+        # 判断风格用的对数似然表：在同一拍号的公共网格上，每个位置为 ({状态: 对数概率}, 未出现状态的对数概率)，
+        # 风格网格之外的步进按“应为空”计分，避免粗网格的风格因量化丢失差异而得分偏高
+        vocabulary = len(self.states)
+        self._likelihoods = {signature: [] for signature in common}
+        for (style, signature), counts in self._counts.items():
+            scale = common[signature] // self.resolutions[(style, signature)]
+            numerator, denominator = _parse_signature(signature)
+            positions = []
+            for position in range(bar_ticks(numerator, denominator) * common[signature] // TICKS_PER_QUARTER):
+                counter = counts[(0, position // scale, ())] if position % scale == 0 else {0: 1}
+                normalizer = math.log(sum(counter.values()) + LIKELIHOOD_SMOOTHING * vocabulary)
+                positions.append(({state: math.log(count + LIKELIHOOD_SMOOTHING) - normalizer
+                                   for state, count in counter.items()},
+                                  math.log(LIKELIHOOD_SMOOTHING) - normalizer))
+            self._likelihoods[signature].append((style, positions))
+        self._style_cache = {}
+
+        self._state_drums = [[self.voices[i] for i in range(len(self.voices)) if mask >> i & 1]
+                             for mask, _ in self.states]
+        self._bar_beats = {}
+        for (style, signature), resolution in self.resolutions.items():
+            numerator, denominator = _parse_signature(signature)
+            steps = bar_ticks(numerator, denominator) * resolution // TICKS_PER_QUARTER
+            self._bar_beats[(style, signature)] = [_beat_value(1 + Fraction(step, resolution))
+                                                   for step in range(steps)]
+
+    def styles(self, time_signature=None):
+        """已训练的风格（按训练顺序）"""
+        return [style for style, signature in self.resolutions
+                if time_signature is None or signature == time_signature]
+
+    def _key(self, style, time_signature):
+        if time_signature is not None:
+            key = (style, str(time_signature))
+            if key in self.resolutions:
+                return key
+        else:
+            for key in self.resolutions:
+                if key[0] == style:
+                    return key
+        raise KeyError(f"模型中没有风格: {style} ({time_signature or '任意拍号'})")
+
+    def sample_bar(self, style, time_signature=None):
+        """按风格生成一个小节的节奏型
+
+        Args:
+            style: 风格
+            time_signature: 拍号，如 '4/4'，默认为该风格第一个训练过的拍号
+
+        Returns:
+            list: 节奏型列表，每个元素包含beat, drums, accent
+        """
+        key = self._key(style, time_signature)
+        tables = self._tables[key]
+        pooled_resolution, pooled = self._pooled[key[1]]
+        scale = pooled_resolution // self.resolutions[key]
+        rng = self.rng
+        order = self.order
+        variation = self.variation
+
+        sequence = []
+        for position in range(len(self._bar_beats[key])):
+            if variation and rng.random() < variation:
+                table = pooled[position * scale]
+            else:
+                # 使用出现过的最高阶上下文（0阶分布在每个位置都存在）
+                for k in range(min(order, position), -1, -1):
+                    table = tables.get((k, position, tuple(sequence[position - k:])))
+                    if table is not None:
+                        break
+            sequence.append(table.draw(rng))
+        return self._to_pattern(key, sequence)
+
+    def sample_bars(self, style, bars, time_signature=None):
+        """按风格生成多个小节的节奏型"""
+        return [self.sample_bar(style, time_signature) for _ in range(bars)]
+
+    def _to_pattern(self, key, sequence):
+        states = self.states
+        drums = self._state_drums
+        return [{'beat': beat, 'drums': list(drums[state]), 'accent': states[state][1]}
+                for beat, state in zip(self._bar_beats[key], sequence) if state]
+
+    def style_of(self, pattern, time_signature='4/4'):
+        """按0阶分布的对数似然判断节奏型最接近的风格（结果按节奏型缓存）
+
+        Returns:
+            str: 风格，模型中没有该拍号的风格时返回None
+        """
+        if isinstance(pattern, PatternGrid):
+            pattern = pattern.to_dicts()
+        signature = str(time_signature)
+        cache_key = (signature, tuple((note_info['beat'], tuple(note_info['drums']), bool(note_info['accent']))
+                                      for note_info in pattern))
+        style = self._style_cache.get(cache_key)
+        if style is not None or signature not in self._likelihoods:
+            return style
+
+        numerator, denominator = _parse_signature(signature)
+        common = self._pooled[signature][0]
+        sequence = self._lookup_sequence(pattern, common, bar_ticks(numerator, denominator))
+
+        best_score = -math.inf
+        for candidate, positions in self._likelihoods[signature]:
+            score = sum(log_probs.get(state, unseen) for (log_probs, unseen), state in zip(positions, sequence))
+            if score > best_score:
+                style, best_score = candidate, score
+
+        if len(self._style_cache) >= STYLE_CACHE_SIZE:
+            self._style_cache.clear()
+        self._style_cache[cache_key] = style
+        return style
+
+    def _lookup_sequence(self, pattern, resolution, length):
+        """量化为状态编号序列但不修改模型，未出现过的状态编号为-1"""
+        return [self._state_index.get(state, -1) for state in self._step_states(pattern, resolution, length)]
+
+    def sample_like(self, pattern, time_signature='4/4'):
+        """生成与给定节奏型风格相同的新小节（用于 create_pattern_variant 的 'markov' 变体）"""
+        style = self.style_of(pattern, time_signature)
+        if style is None:
+            raise KeyError(f"模型中没有 {time_signature} 拍号的风格")
+        return self.sample_bar(style, time_signature)
+
+    def save(self, file_path):
+        """保存为 .npz 文件（计数表以CSR数组保存）"""
+        keys = list(self.resolutions)
+        rows, starts, entry_states, entry_counts = [], [0], [], []
+        for model_index, key in enumerate(keys):
+            for (k, position, context), counter in self._counts[key].items():
+                rows.append([model_index, k, position] + list(context) + [-1] * (self.order - k))
+                entry_states.extend(counter)
+                entry_counts.extend(counter.values())
+                starts.append(len(entry_states))
+
+        header = {
+            'order': self.order,
+            'variation': self.variation,
+            'voices': self.voices,
+            'models': [[style, signature, self.resolutions[(style, signature)]] for style, signature in keys],
+        }
+        # 文件对象可以直接传入；路径不以.npz结尾时numpy会自动追加扩展名
+        np.savez_compressed(
+            file_path,
+            header=np.array(json.dumps(header, ensure_ascii=False)),
+            state_masks=np.array([mask for mask, _ in self.states], dtype=np.uint64),
+            state_accents=np.array([accent for _, accent in self.states], dtype=np.uint8),
+            table_keys=np.array(rows, dtype=np.int32).reshape(-1, self.order + 3),
+            table_starts=np.array(starts, dtype=np.int64),
+            entry_states=np.array(entry_states, dtype=np.uint32),
+            entry_counts=np.array(entry_counts, dtype=np.uint32),
+        )
+
+    @classmethod
+    def load(cls, file_path, seed=None, variation=None):
+        """加载 save() 保存的模型
+
+        Args:
+            file_path: 模型文件路径
+            seed: 随机种子
+            variation: 覆盖保存时的variation
+
+        Returns:
+            MarkovGrooveModel: 模型
+        """
+        with np.load(file_path, allow_pickle=False) as data:
+            header = json.loads(str(data['header']))
+            model = cls(header['order'], header['variation'] if variation is None else variation, seed)
+            model.voices = header['voices']
+            model.states = [(int(mask), bool(accent))
+                            for mask, accent in zip(data['state_masks'], data['state_accents'])]
+            model._state_index = {state: index for index, state in enumerate(model.states)}
+
+            keys = [(style, signature) for style, signature, _ in header['models']]
+            for style, signature, resolution in header['models']:
+                model.resolutions[(style, signature)] = resolution
+                model._counts[(style, signature)] = {}
+
+            starts = data['table_starts']
+            states = data['entry_states'].tolist()
+            counts = data['entry_counts'].tolist()
+            for row, (start, stop) in enumerate(zip(starts[:-1].tolist(), starts[1:].tolist())):
+                model_index, k, position, *context = data['table_keys'][row].tolist()
+                model._counts[keys[model_index]][(k, position, tuple(context[:k]))] = Counter(
+                    dict(zip(states[start:stop], counts[start:stop])))
+
+        model._compile()
+        return model
+
+
+def _grid_resolution(subdivisions):
+    """语料的网格分辨率（每四分音符步进数）
+
+    取各音符位置分母的最小公倍数。超过 MAX_RESOLUTION 时不能简单截断（如五连音和三连音的
+    最小公倍数60截断为24后两者都不在网格上），而是在最小公倍数不超过上限的约数中，
+    选择能精确表示最多音符的一个（相同时取较大者）。
+
+    Args:
+        subdivisions: Counter，位置分母 -> 音符数
+
+    Returns:
+        int: 网格分辨率
+    """
+    resolution = math.lcm(*subdivisions) if subdivisions else 1
+    if resolution <= MAX_RESOLUTION:
+        return resolution
+    candidates = [value for value in range(1, MAX_RESOLUTION + 1) if resolution % value == 0]
+    return max(candidates, key=lambda value: (
+        sum(count for subdivision, count in subdivisions.items() if value % subdivision == 0), value))
+
+
+def _parse_signature(time_signature):
+    numerator, denominator = (int(part) for part in str(time_signature).split('/'))
+    return numerator, denominator
@@ -0,0 +1,341 @@
+"""把已有的鼓MIDI文件导入为节奏型
+
+不经过music21的 converter.parse，直接解析Standard MIDI File的音符事件：
+- 读取音符开启事件（默认读取所有通道，本仓库输出在通道1，GM打击乐在通道10；也可只读取指定通道）
+- 通过 midi_config.yaml 把音符编号反向映射为鼓名称（未配置的常见GM音符按 GM_ALIASES 归类）
+- 起始位置按 beat_grid 的规则解释为精确拍位置，按小节切分为 RhythmPatterns 格式的节奏型
+
+目录导入把文件分块派发到进程池，适合一次导入数万个文件作为变体的种子，
+结果可以直接交给 PatternLibrary.from_entries 建库。
+"""
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+
+from beat_grid import MAX_SUBDIVISION
+from random_drumsheet import DrumSheetGenerator
+
+# 常见GM打击乐音符到鼓名称的归类（midi_config中已配置的音符优先）
+GM_ALIASES = {
+    35: 'bass',          # Acoustic Bass Drum
+    37: 'snare',         # Side Stick
+    40: 'snare',         # Electric Snare
+    44: 'closed_hihat',  # Pedal Hi-Hat
+    49: 'crash',         # Crash Cymbal 1
+    57: 'crash',         # Crash Cymbal 2
+    59: 'ride',          # Ride Cymbal 2
+    41: 't3',            # Low Floor Tom
+    43: 't3',            # High Floor Tom
+    47: 't2',            # Low-Mid Tom
+}
+
+# 力度不低于该值的音符视为重音
+ACCENT_VELOCITY = 90
+
+# 未精确对齐的音符吸附到的拍内细分（16分音符和8分三连音）
+SUBDIVISIONS = (4, 3)
+
+MidiFileData = namedtuple('MidiFileData', [
+    'ticks_per_quarter',  # 每四分音符tick数
+    'numerator',          # 拍号分子（第一个拍号事件，默认4）
+    'denominator',        # 拍号分母
+    'notes',              # (tick, 通道(0基础), 音符编号, 力度) 列表，按tick排序
+])
+
+
+def _read_varlen(data, position):
+    """读取可变长度数值，返回 (数值, 新位置)"""
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, position
+
+
+def parse_midi(data):
+    """解析MIDI文件字节，只提取音符开启和拍号
+
+    Args:
+        data: Standard MIDI File内容
+
+    Returns:
+        MidiFileData: 解析结果
+    """
+    if data[:4] != b'MThd':
+        raise ValueError("不是MIDI文件（缺少MThd）")
+    header_length, _, num_tracks, division = struct.unpack('>IHHH', data[4:14])
+    if division & 0x8000:
+        raise ValueError("不支持SMPTE时间格式")
+
+    numerator, denominator = None, None
+    notes = []
+    position = 8 + header_length
+
+    for _ in range(num_tracks):
+        if data[position:position + 4] != b'MTrk':
+            raise ValueError(f"位置 {position} 处缺少MTrk")
+        track_length, = struct.unpack('>I', data[position + 4:position + 8])
+        position += 8
+        end = position + track_length
+        tick = 0
+        status = None
+
+        while position < end:
+            delta, position = _read_varlen(data, position)
+            tick += delta
+
+            byte = data[position]
+            if byte & 0x80:
+                status = byte
+                position += 1
+            elif status is None:
+                raise ValueError(f"位置 {position} 处缺少状态字节")
+
+            if status == 0xFF:
+                meta_type = data[position]
+                length, position = _read_varlen(data, position + 1)
+                if meta_type == 0x58 and numerator is None:
+                    numerator, denominator = data[position], 1 << data[position + 1]
+                position += length
+                status = None  # Meta事件不参与running status
+            elif status in (0xF0, 0xF7):
+                length, position = _read_varlen(data, position)
+                position += length
+                status = None
+            else:
+                kind = status & 0xF0
+                if kind in (0xC0, 0xD0):
+                    position += 1
+                else:
+                    if kind == 0x90 and data[position + 1] > 0:
+                        notes.append((tick, status & 0x0F, data[position], data[position + 1]))
+                    position += 2
+
+        position = end
+
+    notes.sort(key=lambda n: n[0])
+    return MidiFileData(division, numerator or 4, denominator or 4, notes)
+
+
+def note_name_map(midi_config, aliases=GM_ALIASES):
+    """构建 音符编号 -> 鼓名称 的反向映射"""
+    names = {number: name for number, name in aliases.items() if name in midi_config}
+
+    # 配置中的音符覆盖归类；多个鼓使用同一音符时取第一个
+    configured = {}
+    for name, number in midi_config.items():
+        if name != 'rest':
+            configured.setdefault(number, name)
+    names.update(configured)
+    return names
+
+
+def quantize(quarters, subdivisions=SUBDIVISIONS):
+    """把起始位置（四分音符为单位）对齐到拍内细分网格
+
+    已精确落在细分上的位置（分母不超过 MAX_SUBDIVISION）保持不变；
+    其他位置（如人工演奏的微小偏差）吸附到subdivisions中最近的网格点。
+
+    Args:
+        quarters: 起始位置（Fraction）
+        subdivisions: 每拍细分数，如 (4, 3) 表示16分音符和8分三连音
+
+    Returns:
+        Fraction: 对齐后的位置
+    """
+    if quarters.denominator <= MAX_SUBDIVISION:
+        return quarters
+    candidates = [Fraction(round(quarters * division), division) for division in subdivisions]
+    return min(candidates, key=lambda candidate: abs(candidate - quarters))
+
+
+def _beat_value(fraction):
+    """把精确拍位置转换为节奏型中使用的浮点数（非二进制小数保留两位，如5/3 -> 1.67）"""
+    denominator = fraction.denominator
+    if denominator & (denominator - 1) == 0:
+        return float(fraction)
+    return round(float(fraction), 2)
+
+
+def midi_to_patterns(data, note_names, channel=None, accent_velocity=ACCENT_VELOCITY, unique=True,
+                     subdivisions=SUBDIVISIONS):
+    """把MIDI文件中的鼓音符按小节切分为节奏型
+
+    Args:
+        data: MIDI文件字节
+        note_names: 音符编号 -> 鼓名称映射
+        channel: 鼓所在的MIDI通道（1-16，GM打击乐为10），默认None读取所有通道
+        accent_velocity: 力度不低于该值的步进为重音
+        unique: 为True时跳过与之前小节相同的小节
+        subdivisions: 量化使用的拍内细分，见 quantize
+
+    Returns:
+        tuple: (拍号字符串, [(小节序号, 节奏型), ...])
+    """
+    midi_file = parse_midi(data)
+    ticks_per_quarter = midi_file.ticks_per_quarter
+    bar_quarters = Fraction(4 * midi_file.numerator, midi_file.denominator)
+    bar_length = bar_quarters * ticks_per_quarter
+    if bar_length.denominator == 1:
+        bar_length = int(bar_length)  # 常见情况下小节长度为整数tick，避免分数运算
+
+    # 小节内tick -> (跨到下一小节的数量, 拍位置)；同一文件中的位置高度重复，只量化一次
+    positions = {}
+
+    # 步进: (小节, 拍位置浮点数) -> [鼓名称列表, 最大力度]
+    steps = {}
+    for tick, note_channel, number, velocity in midi_file.notes:
+        if channel is not None and note_channel != channel - 1:
+            continue
+        drum = note_names.get(number)
+        if drum is None:
+            continue
+
+        bar, tick_in_bar = divmod(tick, bar_length)
+        if tick_in_bar not in positions:
+            # 吸附到小节线上的音符归入下一小节
+            position = quantize(Fraction(tick_in_bar) / ticks_per_quarter, subdivisions)
+            carry = 0
+            if position >= bar_quarters:
+                carry, position = 1, position - bar_quarters
+            positions[tick_in_bar] = (carry, _beat_value(1 + position))
+        carry, beat = positions[tick_in_bar]
+
+        step = steps.setdefault((int(bar) + carry, beat), [[], 0])
+        if drum not in step[0]:
+            step[0].append(drum)
+        step[1] = max(step[1], velocity)
+
+    bars = {}
+    for (bar, beat), (drums, velocity) in sorted(steps.items()):
+        bars.setdefault(bar, []).append({
+            'beat': beat,
+            'drums': drums,
+            'accent': velocity >= accent_velocity,
+        })
+
+    patterns = []
+    seen = set()
+    for bar, pattern in bars.items():
+        if unique:
+            key = tuple((n['beat'], tuple(n['drums']), n['accent']) for n in pattern)
+            if key in seen:
+                continue
+            seen.add(key)
+        patterns.append((bar, pattern))
+
+    return f"{midi_file.numerator}/{midi_file.denominator}", patterns
+
+
+def import_file(path, note_names, channel=None, accent_velocity=ACCENT_VELOCITY, unique=True,
+                subdivisions=SUBDIVISIONS, style=None, name=None):
+    """导入单个MIDI文件
+
+    Args:
+        path: MIDI文件路径
+        note_names: 音符编号 -> 鼓名称映射
+        channel: 鼓所在的MIDI通道（1-16，GM打击乐为10），默认None读取所有通道
+        accent_velocity: 重音力度阈值
+        unique: 是否跳过重复小节
+        subdivisions: 量化使用的拍内细分
+        style: 风格，默认使用文件所在目录名
+        name: 条目名称前缀，默认使用不含扩展名的文件名
+
+    Returns:
+        list: PatternLibrary.from_entries 可用的条目，名称为 "前缀_bar小节序号"
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    time_signature, patterns = midi_to_patterns(data, note_names, channel, accent_velocity, unique, subdivisions)
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    if style is None:
+        style = os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+    return [
+        {'name': f"{name}_bar{bar + 1}", 'style': style, 'time_signature': time_signature, 'pattern': pattern}
+        for bar, pattern in patterns
+    ]
+
+
+# 工作进程内共享的导入参数，由 _init_worker 设置
+_worker_options = None
+
+
+def _init_worker(options):
+    """工作进程初始化：保存音符映射和导入参数"""
+    global _worker_options
+    _worker_options = options
+
+
+def _import_one(task):
+    """在工作进程中导入一个文件，解析失败时返回错误信息"""
+    path, name = task
+    try:
+        return path, import_file(path, name=name, **_worker_options), None
+    except (ValueError, IndexError, struct.error, OSError) as e:
+        return path, [], str(e) or type(e).__name__
+
+
+def iter_midi_files(directory, extensions=('.mid', '.midi')):
+    """递归枚举目录中的MIDI文件（按路径排序）"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(extensions):
+                yield os.path.join(root, filename)
+
+
+def import_directory(directory, channel=None, accent_velocity=ACCENT_VELOCITY, unique=True,
+                     subdivisions=SUBDIVISIONS, max_workers=None, chunk_size=64, midi_config_path="./configs/midi_config.yaml"):
+    """并行导入目录中的所有鼓MIDI文件
+
+    Args:
+        directory: 目录路径（递归查找 .mid/.midi 文件）
+        channel: 鼓所在的MIDI通道（1-16，GM打击乐为10），默认None读取所有通道
+        accent_velocity: 重音力度阈值
+        unique: 是否跳过每个文件中的重复小节
+        subdivisions: 量化使用的拍内细分
+        max_workers: 工作进程数，为1时在当前进程中顺序执行
+        chunk_size: 每次派发给工作进程的文件数
+        midi_config_path: MIDI音符映射配置路径
+
+    Yields:
+        dict: 节奏型条目（按文件路径顺序），格式见 import_file，名称前缀为相对目录的路径；
+              无法解析的文件打印警告后跳过
+    """
+    midi_config = DrumSheetGenerator.load_yaml(midi_config_path)
+    options = {
+        'note_names': note_name_map(midi_config),
+        'channel': channel,
+        'accent_velocity': accent_velocity,
+        'unique': unique,
+        'subdivisions': subdivisions,
+    }
+
+    # 不同子目录中可能有同名文件，用相对路径作为名称前缀
+    tasks = ((path, os.path.splitext(os.path.relpath(path, directory))[0].replace(os.sep, '/'))
+             for path in iter_midi_files(directory))
+
+    if max_workers == 1:
+        _init_worker(options)
+        yield from _collect(map(_import_one, tasks))
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(options,)) as executor:
+        yield from _collect(executor.map(_import_one, tasks, chunksize=chunk_size))
+
+
+def _collect(results):
+    """展开导入结果，报告无法解析的文件"""
+    for path, entries, error in results:
+        if error is not None:
+            print(f"无法导入MIDI文件 {path}: {error}")
+            continue
+        yield from entries
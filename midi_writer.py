@@ -0,0 +1,275 @@
+"""直接生成标准MIDI文件字节的轻量写入器
+
+不依赖music21，把音符事件直接编码为Standard MIDI File（格式1）：
+第0轨为指挥轨（速度、拍号），第1轨为鼓声部。
+事件排序、时值取整和音轨结尾规则与music21的MIDI导出保持一致，
+因此同一节奏型用两种方式渲染得到的文件逐字节相同。
+"""
+import heapq
+import struct
+
+# 每四分音符的tick数，与music21的默认值一致
+TICKS_PER_QUARTER = 10080
+
+# MIDI状态字节
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+PITCH_BEND = 0xE0
+
+# Meta事件类型
+META_TRACK_NAME = 0x03
+META_END_OF_TRACK = 0x2F
+META_SET_TEMPO = 0x51
+META_TIME_SIGNATURE = 0x58
+
+# 同一时刻的事件排序：音符关闭在前，音符开启在后（与music21一致）
+_SORT_NOTE_OFF = -20
+_SORT_NOTE_ON = 0
+
+
+def encode_varlen(value):
+    """把非负整数编码为MIDI可变长度数值"""
+    if value < 0:
+        raise ValueError(f"可变长度数值不能为负: {value}")
+
+    buffer = [value & 0x7F]
+    value >>= 7
+    while value:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(buffer))
+
+
+def meta_event(meta_type, data):
+    """构造Meta事件（不含delta time）"""
+    return bytes((0xFF, meta_type)) + encode_varlen(len(data)) + data
+
+
+def header_chunk(num_tracks, ticks_per_quarter=TICKS_PER_QUARTER, midi_format=1):
+    """构造MThd文件头"""
+    return b'MThd' + struct.pack('>IHHH', 6, midi_format, num_tracks, ticks_per_quarter)
+
+
+def track_chunk(body):
+    """为音轨数据加上MTrk块头"""
+    return b'MTrk' + struct.pack('>I', len(body)) + body
+
+
+def quarters_to_ticks(quarter_length, ticks_per_quarter=TICKS_PER_QUARTER):
+    """把以四分音符为单位的时长/偏移转换为tick"""
+    return int(round(quarter_length * ticks_per_quarter))
+
+
+def conductor_track(bpm, numerator, denominator, ticks_per_quarter=TICKS_PER_QUARTER):
+    """生成指挥轨：速度和拍号事件"""
+    return tempo_map_track([(0, bpm, numerator, denominator)], ticks_per_quarter)
+
+
+def tempo_map_track(changes, ticks_per_quarter=TICKS_PER_QUARTER):
+    """生成带速度/拍号变化的指挥轨
+
+    Args:
+        changes: 按tick排序的 (tick, bpm, numerator, denominator) 列表，
+                 只在速度或拍号与前一项不同时写出对应事件
+
+    Returns:
+        bytes: MTrk块
+    """
+    body = bytearray()
+    last_tick = 0
+    tempo = signature = None
+
+    for tick, bpm, numerator, denominator in changes:
+        events = []
+        if bpm != tempo:
+            microseconds = int(round(60_000_000 / bpm))
+            events.append(meta_event(META_SET_TEMPO, microseconds.to_bytes(3, 'big')))
+            tempo = bpm
+        if (numerator, denominator) != signature:
+            denominator_power = denominator.bit_length() - 1
+            events.append(meta_event(META_TIME_SIGNATURE, bytes((numerator, denominator_power, 24, 8))))
+            signature = (numerator, denominator)
+        for event in events:
+            body += encode_varlen(tick - last_tick) + event
+            last_tick = tick
+
+    body += encode_varlen(ticks_per_quarter) + meta_event(META_END_OF_TRACK, b'')
+    return track_chunk(bytes(body))
+
+
+def note_messages(notes, channel=0):
+    """把音符列表转换为按时间排序的MIDI消息
+
+    Args:
+        notes: 音符列表，每个元素为 (offset, midi_note, duration, velocity)，
+               offset和duration为整数tick，按插入顺序排列
+        channel: MIDI通道（0基础，9即GM打击乐通道10）
+
+    Returns:
+        list: (tick, 消息字节) 列表
+    """
+    # 先按起始偏移稳定排序（同一偏移保持插入顺序），与music21展开音乐流的顺序一致
+    ordered = sorted(notes, key=lambda n: n[0])
+
+    packets = []
+    for start, midi_note, duration, velocity in ordered:
+        packets.append((start, _SORT_NOTE_ON, bytes((NOTE_ON | channel, midi_note, velocity))))
+        packets.append((start + duration, _SORT_NOTE_OFF, bytes((NOTE_OFF | channel, midi_note, 0))))
+
+    packets.sort(key=lambda p: (p[0], p[1]))
+    return [(tick, message) for tick, _, message in packets]
+
+
+def message_order(packet):
+    """(tick, 消息字节) 的排序键：同一时刻音符关闭在前，可用于 heapq.merge 合并多个消息流"""
+    tick, message = packet
+    return tick, _SORT_NOTE_OFF if message[0] & 0xF0 == NOTE_OFF else _SORT_NOTE_ON
+
+
+def drum_track(notes, channel=0, ticks_per_quarter=TICKS_PER_QUARTER, track_name='Percussion'):
+    """生成鼓声部音轨"""
+    return message_track(note_messages(notes, channel), channel, ticks_per_quarter, track_name)
+
+
+def message_track(messages, channel=0, ticks_per_quarter=TICKS_PER_QUARTER, track_name='Percussion'):
+    """由按时间排序的 (tick, 消息字节) 序列生成鼓声部音轨（可以是迭代器）"""
+    body = bytearray()
+    body += b'\x00' + meta_event(META_TRACK_NAME, track_name.encode('utf-8'))
+    body += b'\x00' + bytes((PITCH_BEND | channel, 0x00, 0x40))
+    body += b'\x00' + bytes((PROGRAM_CHANGE | channel, 0))
+
+    last_tick = 0
+    for tick, message in messages:
+        body += encode_varlen(tick - last_tick) + message
+        last_tick = tick
+
+    body += encode_varlen(ticks_per_quarter) + meta_event(META_END_OF_TRACK, b'')
+    return track_chunk(bytes(body))
+
+
+def notes_to_midi_bytes(notes, bpm=120, numerator=4, denominator=4, channel=0,
+                        ticks_per_quarter=TICKS_PER_QUARTER, track_name='Percussion'):
+    """把音符列表编码为完整的MIDI文件字节
+
+    Args:
+        notes: 音符列表，每个元素为 (offset, midi_note, duration, velocity)，offset和duration为tick
+        bpm: 节拍速度
+        numerator: 拍号分子
+        denominator: 拍号分母
+        channel: MIDI通道（0基础）
+        ticks_per_quarter: 每四分音符tick数
+        track_name: 鼓声部音轨名称
+
+    Returns:
+        bytes: Standard MIDI File内容
+    """
+    return (header_chunk(2, ticks_per_quarter)
+            + conductor_track(bpm, numerator, denominator, ticks_per_quarter)
+            + drum_track(notes, channel, ticks_per_quarter, track_name))
+
+
+class MidiStreamWriter:
+    """流式写入MIDI文件
+
+    按时间顺序分批写入音符，已确定顺序的事件立即写入文件，
+    只有跨越批次边界（尚未结束）的音符关闭事件保留在内存中；
+    鼓声部音轨的长度在 close() 时回填，因此文件对象必须支持 seek。
+    对同一组音符，输出与 notes_to_midi_bytes 逐字节相同。
+    """
+
+    def __init__(self, fileobj, bpm=120, numerator=4, denominator=4, channel=0,
+                 ticks_per_quarter=TICKS_PER_QUARTER, track_name='Percussion'):
+        """写入文件头、指挥轨和鼓声部音轨的开头
+
+        Args:
+            fileobj: 以二进制模式打开、可seek的文件对象
+            bpm: 节拍速度
+            numerator: 拍号分子
+            denominator: 拍号分母
+            channel: MIDI通道（0基础）
+            ticks_per_quarter: 每四分音符tick数
+            track_name: 鼓声部音轨名称
+        """
+        self.fileobj = fileobj
+        self.channel = channel
+        self.ticks_per_quarter = ticks_per_quarter
+
+        fileobj.write(header_chunk(2, ticks_per_quarter))
+        fileobj.write(conductor_track(bpm, numerator, denominator, ticks_per_quarter))
+
+        # 音轨长度先写占位，close() 时回填
+        fileobj.write(b'MTrk')
+        self._length_position = fileobj.tell()
+        fileobj.write(b'\x00\x00\x00\x00')
+
+        start = bytearray()
+        start += b'\x00' + meta_event(META_TRACK_NAME, track_name.encode('utf-8'))
+        start += b'\x00' + bytes((PITCH_BEND | channel, 0x00, 0x40))
+        start += b'\x00' + bytes((PROGRAM_CHANGE | channel, 0))
+        fileobj.write(start)
+        self._track_length = len(start)
+
+        # 待写入的事件堆: (tick, 排序优先级, 序号, 消息字节)
+        self._pending = []
+        self._sequence = 0
+        self._last_tick = 0
+        self._closed = False
+
+    def write_notes(self, notes, until=None):
+        """写入一批音符
+
+        Args:
+            notes: 音符列表，每个元素为 (offset, midi_note, duration, velocity)（tick），
+                   偏移不早于之前批次中的音符
+            until: 之后的批次都不会早于该tick，早于它的事件可以安全写出；
+                   为None时只缓存不写出
+        """
+        channel = self.channel
+
+        for start, midi_note, duration, velocity in sorted(notes, key=lambda n: n[0]):
+            end = start + duration
+            heapq.heappush(self._pending, (start, _SORT_NOTE_ON, self._sequence,
+                                           bytes((NOTE_ON | channel, midi_note, velocity))))
+            heapq.heappush(self._pending, (end, _SORT_NOTE_OFF, self._sequence + 1,
+                                           bytes((NOTE_OFF | channel, midi_note, 0))))
+            self._sequence += 2
+
+        if until is not None:
+            self._flush(until)
+
+    def _flush(self, before_tick=None):
+        """写出tick早于before_tick的事件（为None时写出全部）"""
+        body = bytearray()
+        pending = self._pending
+        last_tick = self._last_tick
+
+        while pending and (before_tick is None or pending[0][0] < before_tick):
+            tick, _, _, message = heapq.heappop(pending)
+            body += encode_varlen(tick - last_tick) + message
+            last_tick = tick
+
+        self._last_tick = last_tick
+        self.fileobj.write(body)
+        self._track_length += len(body)
+
+    def close(self):
+        """写出剩余事件和音轨结尾，回填音轨长度"""
+        if self._closed:
+            return
+        self._flush()
+
+        end = encode_varlen(self.ticks_per_quarter) + meta_event(META_END_OF_TRACK, b'')
+        self.fileobj.write(end)
+        self._track_length += len(end)
+
+        self.fileobj.seek(self._length_position)
+        self.fileobj.write(struct.pack('>I', self._track_length))
+        self.fileobj.seek(0, 2)
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,407 @@
+"""不经过music21的MusicXML鼓谱写入器
+
+直接从节奏型生成 MusicXML 3.1（score-partwise）文本，用于批量导出鼓谱：
+- 打击乐谱号，每种鼓按 configs/notation_config.yaml 显示在固定位置（unpitched display-step/octave），
+  镲片类使用x等特殊符头
+- 手（军鼓、镲片、嗵鼓）为声部1、符干朝上，脚（底鼓）为声部2、符干朝下
+- 按拍分组：拍内音符连成符杠，三连音、五连音等不在二进制网格上的细分加连音括号（如shuffle节奏型）
+- 复拍子（6/8、9/8、12/8）按附点四分音符分组
+- 同一节奏型的小节内容只生成一次（LRU缓存），整个乐谱用字符串拼接，不构建中间对象树
+"""
+import os
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from beat_grid import TICKS_PER_QUARTER, bar_ticks, beat_to_ticks
+from pattern_grid import PatternGrid
+from random_drumsheet import DrumSheetGenerator, _pattern_key
+
+# 每四分音符的时值单位数，与MIDI的tick网格一致，常见连音的时值都是整数
+DIVISIONS = TICKS_PER_QUARTER
+
+# 声部编号
+HANDS, FEET = 1, 2
+
+# 拍内细分数的候选（按优先顺序）：所有音符都落在网格上的第一个候选即为该拍的细分
+SIMPLE_SUBDIVISIONS = (1, 2, 4, 8, 16, 3, 6, 12, 5, 10, 7, 14, 9)
+COMPOUND_SUBDIVISIONS = (3, 6, 12)
+
+# 时值(tick) -> (音符类型, 符杠数)
+NOTE_TYPES = {
+    TICKS_PER_QUARTER * 4: ('whole', 0),
+    TICKS_PER_QUARTER * 2: ('half', 0),
+    TICKS_PER_QUARTER: ('quarter', 0),
+    TICKS_PER_QUARTER // 2: ('eighth', 1),
+    TICKS_PER_QUARTER // 4: ('16th', 2),
+    TICKS_PER_QUARTER // 8: ('32nd', 3),
+    TICKS_PER_QUARTER // 16: ('64th', 4),
+}
+
+# 小节内容缓存的最大条目数
+MEASURE_CACHE_SIZE = 1024
+
+XML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+    '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" '
+    '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+)
+
+
+def _note_values(unit):
+    """以unit为单位可以用一个（附点）音符表示的长度，从长到短
+
+    Returns:
+        list: (单位数, 音符类型, 附点数, 符杠数)
+    """
+    values = []
+    for ticks, (note_type, beams) in NOTE_TYPES.items():
+        if ticks >= unit and ticks % unit == 0:
+            values.append((ticks // unit, note_type, 0, beams))
+            if ticks >= 2 * unit:
+                values.append((ticks * 3 // (2 * unit), note_type, 1, beams))
+    return sorted(values, reverse=True)
+
+
+def _split(count, values):
+    """把count个单位拆分为可直接记谱的时值（贪心，第一个最长）"""
+    parts = []
+    for value in values:
+        while count >= value[0]:
+            parts.append(value)
+            count -= value[0]
+    return parts
+
+
+class MusicXMLWriter:
+    """把节奏型写为MusicXML鼓谱"""
+
+    def __init__(self, notation_config, midi_config=None, numerator=4, denominator=4, bpm=None, midi_channel=10):
+        """初始化写入器
+
+        Args:
+            notation_config: 鼓名称 -> {step, octave, notehead, voice} 记谱位置映射
+            midi_config: 鼓名称 -> MIDI音符编号映射，给出时写入播放用的乐器定义
+            numerator: 拍号分子
+            denominator: 拍号分母
+            bpm: 速度，给出时在第一小节写入速度标记
+            midi_channel: 乐器定义中的MIDI通道（1~16）
+        """
+        self.notation_config = notation_config
+        self.midi_config = midi_config or {}
+        self.numerator = numerator
+        self.denominator = denominator
+        self.bpm = bpm
+        self.midi_channel = midi_channel
+        self.bar_ticks = bar_ticks(numerator, denominator)
+
+        # 复拍子按附点四分音符分组，其余按四分音符分组
+        if denominator == 8 and numerator % 3 == 0 and numerator > 3:
+            self.group_ticks = TICKS_PER_QUARTER * 3 // 2
+            self.subdivisions = COMPOUND_SUBDIVISIONS
+        else:
+            self.group_ticks = TICKS_PER_QUARTER
+            self.subdivisions = SIMPLE_SUBDIVISIONS
+
+        # 鼓名称 -> (声部, unpitched片段, instrument片段, notehead片段)，生成音符时直接拼接
+        self._drums = {}
+        for name, entry in notation_config.items():
+            unpitched = (f"<unpitched><display-step>{entry['step']}</display-step>"
+                         f"<display-octave>{entry['octave']}</display-octave></unpitched>")
+            instrument = f'<instrument id="P1-{name}"/>' if name in self.midi_config else ''
+            notehead = entry.get('notehead', 'normal')
+            notehead = f"<notehead>{notehead}</notehead>" if notehead != 'normal' else ''
+            self._drums[name] = (entry.get('voice', HANDS), unpitched, instrument, notehead)
+
+        self._measures = OrderedDict()
+
+    @classmethod
+    def from_config(cls, notation_config_path="./configs/notation_config.yaml",
+                    midi_config_path="./configs/midi_config.yaml", run_config_path="./configs/run_configs.yaml"):
+        """按配置文件创建（拍号、速度和MIDI通道取自运行参数配置）"""
+        run_config = DrumSheetGenerator.load_yaml(run_config_path)
+        return cls(DrumSheetGenerator.load_yaml(notation_config_path),
+                   DrumSheetGenerator.load_yaml(midi_config_path),
+                   numerator=run_config.get('numerator', 4),
+                   denominator=run_config.get('denominator', 4),
+                   bpm=run_config.get('bpm'),
+                   midi_channel=run_config.get('midi_channel', 10))
+
+    def _voices(self, pattern):
+        """把节奏型按声部拆分
+
+        Returns:
+            dict: 声部 -> {小节内tick: ([鼓名称, ...], 是否重音)}
+        """
+        voices = {HANDS: {}, FEET: {}}
+        for note_info in pattern:
+            tick = beat_to_ticks(note_info['beat']) - TICKS_PER_QUARTER
+            if not 0 <= tick < self.bar_ticks:
+                continue
+            accent = bool(note_info['accent'])
+            for name in note_info['drums']:
+                drum = self._drums.get(name)
+                if drum is None:
+                    continue  # 与MIDI输出一致，忽略休止和未配置的鼓
+                chord, _ = voices[drum[0]].setdefault(tick, ([], accent))
+                if name not in chord:
+                    chord.append(name)
+
+        # 重音只标在一个声部上：手声部有音符时标在手声部
+        for tick, (_, accent) in voices[FEET].items():
+            if accent and tick in voices[HANDS]:
+                voices[FEET][tick] = (voices[FEET][tick][0], False)
+        return voices
+
+    def _group_items(self, onsets, length):
+        """把一拍（或一组）内的音符转换为记谱元素
+
+        Args:
+            onsets: {拍内tick: (鼓名称列表, 是否重音)}
+            length: 该组的tick长度
+
+        Returns:
+            tuple: (元素列表, 连音比例)；元素为 (鼓名称列表或None(休止), 是否重音, 实际时值, 类型, 附点, 符杠数)，
+                   连音比例为 (实际音符数, 正常音符数) 或None
+        """
+        for count in self.subdivisions:
+            if length % count == 0 and all(tick % (length // count) == 0 for tick in onsets):
+                break
+        else:
+            # 不在任何候选网格上：量化到最细的二进制网格，落在同一位置的音符合并
+            count = self.subdivisions[-1] if self.subdivisions is COMPOUND_SUBDIVISIONS else 16
+            quantized = {}
+            for tick, (drums, accent) in sorted(onsets.items()):
+                slot = min(round(tick * count / length), count - 1) * (length // count)
+                chord, previous = quantized.setdefault(slot, ([], False))
+                chord.extend(name for name in drums if name not in chord)
+                quantized[slot] = (chord, previous or accent)
+            onsets = quantized
+
+        slot = length // count
+        normal = count
+        if self.subdivisions is SIMPLE_SUBDIVISIONS:
+            normal = 1 << (count.bit_length() - 1)  # 不超过count的最大2的幂
+        tuplet = (count, normal) if normal != count else None
+        printed_unit = length // normal
+        values = _note_values(printed_unit)
+
+        items = []
+        positions = sorted(onsets)
+        if positions[0] > 0:
+            for units, note_type, dots, _ in _split(positions[0] // slot, values):
+                items.append((None, False, units * slot, note_type, dots, 0))
+        for position, end in zip(positions, positions[1:] + [length]):
+            drums, accent = onsets[position]
+            # 音符只占第一个时值，其余部分写为休止（鼓谱不需要连音线）
+            for index, (units, note_type, dots, beams) in enumerate(_split((end - position) // slot, values)):
+                items.append((drums if index == 0 else None, accent and index == 0,
+                              units * slot, note_type, dots, beams))
+        return items, tuplet
+
+    def _voice_xml(self, voice, onsets):
+        """一个声部一小节的XML"""
+        if not onsets:
+            return f'<note><rest measure="yes"/><duration>{self.bar_ticks}</duration><voice>{voice}</voice></note>'
+
+        stem = 'up' if voice == HANDS else 'down'
+        parts = []
+        for group_start in range(0, self.bar_ticks, self.group_ticks):
+            length = min(self.group_ticks, self.bar_ticks - group_start)
+            group = {tick - group_start: value for tick, value in onsets.items()
+                     if group_start <= tick < group_start + length}
+            if not group:
+                for units, note_type, dots, _ in _split(length, _note_values(1)):
+                    parts.append(self._rest_xml(voice, units, note_type, dots, None, None))
+                continue
+
+            items, tuplet = self._group_items(group, length)
+            beams = _beams(items)
+            last = len(items) - 1
+            for index, (drums, accent, duration, note_type, dots, _) in enumerate(items):
+                bracket = None
+                if tuplet is not None:
+                    bracket = 'start' if index == 0 else 'stop' if index == last else None
+                if drums is None:
+                    parts.append(self._rest_xml(voice, duration, note_type, dots, tuplet, bracket))
+                else:
+                    parts.append(self._chord_xml(voice, stem, drums, accent, duration, note_type, dots,
+                                                 tuplet, bracket, beams[index]))
+        return ''.join(parts)
+
+    @staticmethod
+    def _modification(tuplet):
+        if tuplet is None:
+            return ''
+        return (f"<time-modification><actual-notes>{tuplet[0]}</actual-notes>"
+                f"<normal-notes>{tuplet[1]}</normal-notes></time-modification>")
+
+    def _rest_xml(self, voice, duration, note_type, dots, tuplet, bracket):
+        notations = f'<notations><tuplet type="{bracket}"/></notations>' if bracket else ''
+        return (f"<note><rest/><duration>{duration}</duration><voice>{voice}</voice>"
+                f"<type>{note_type}</type>{'<dot/>' * dots}{self._modification(tuplet)}{notations}</note>")
+
+    def _chord_xml(self, voice, stem, drums, accent, duration, note_type, dots, tuplet, bracket, beams):
+        """和弦（同一时刻同一声部的多个鼓）：符杠、连音括号和重音只写在第一个音符上"""
+        modification = self._modification(tuplet)
+        notations = ''
+        if bracket == 'start':
+            notations += '<tuplet type="start" bracket="yes"/>'
+        elif bracket:
+            notations += f'<tuplet type="{bracket}"/>'
+        if accent:
+            notations += '<articulations><accent/></articulations>'
+        if notations:
+            notations = f"<notations>{notations}</notations>"
+        beam_xml = ''.join(f'<beam number="{number}">{value}</beam>' for number, value in enumerate(beams, 1))
+
+        parts = []
+        for index, name in enumerate(drums):
+            _, unpitched, instrument, notehead = self._drums[name]
+            first = index == 0
+            parts.append(
+                f"<note>{'' if first else '<chord/>'}{unpitched}<duration>{duration}</duration>{instrument}"
+                f"<voice>{voice}</voice><type>{note_type}</type>{'<dot/>' * dots}{modification}"
+                f"<stem>{stem}</stem>{notehead}{beam_xml if first else ''}{notations if first else ''}</note>"
+            )
+        return ''.join(parts)
+
+    def measure(self, pattern):
+        """一小节的音符XML（不含measure标签，按节奏型缓存）"""
+        if isinstance(pattern, PatternGrid):
+            pattern = pattern.to_dicts()
+        key = _pattern_key(pattern)
+        body = self._measures.get(key)
+        if body is not None:
+            self._measures.move_to_end(key)
+            return body
+
+        voices = self._voices(pattern)
+        body = self._voice_xml(HANDS, voices[HANDS])
+        if voices[FEET]:
+            body += f"<backup><duration>{self.bar_ticks}</duration></backup>" + self._voice_xml(FEET, voices[FEET])
+
+        self._measures[key] = body
+        if len(self._measures) > MEASURE_CACHE_SIZE:
+            self._measures.popitem(last=False)
+        return body
+
+    def _part_list(self):
+        instruments = [name for name in self.notation_config if name in self.midi_config]
+        parts = ['<part-list><score-part id="P1"><part-name>Drumset</part-name>']
+        parts.extend(f'<score-instrument id="P1-{name}"><instrument-name>{escape(name)}</instrument-name>'
+                     f'</score-instrument>' for name in instruments)
+        parts.extend(f'<midi-instrument id="P1-{name}"><midi-channel>{self.midi_channel}</midi-channel>'
+                     f'<midi-unpitched>{self.midi_config[name] + 1}</midi-unpitched></midi-instrument>'
+                     for name in instruments)
+        parts.append('</score-part></part-list>')
+        return ''.join(parts)
+
+    def _attributes(self):
+        attributes = (f"<attributes><divisions>{DIVISIONS}</divisions><key><fifths>0</fifths></key>"
+                      f"<time><beats>{self.numerator}</beats><beat-type>{self.denominator}</beat-type></time>"
+                      f"<clef><sign>percussion</sign></clef></attributes>")
+        if self.bpm is not None:
+            attributes += (f'<direction placement="above"><direction-type><metronome><beat-unit>quarter</beat-unit>'
+                           f'<per-minute>{self.bpm}</per-minute></metronome></direction-type>'
+                           f'<sound tempo="{self.bpm}"/></direction>')
+        return attributes
+
+    def score(self, patterns, title=None):
+        """生成完整的MusicXML文本
+
+        Args:
+            patterns: 各小节的节奏型列表（每个元素为一小节）
+            title: 乐谱标题
+
+        Returns:
+            str: MusicXML文本
+        """
+        parts = [XML_HEADER, '<score-partwise version="3.1">']
+        if title:
+            parts.append(f"<work><work-title>{escape(title)}</work-title></work>")
+        parts.append(self._part_list())
+        parts.append('<part id="P1">')
+        for number, pattern in enumerate(patterns, 1):
+            parts.append(f'<measure number="{number}">')
+            if number == 1:
+                parts.append(self._attributes())
+            parts.append(self.measure(pattern))
+            parts.append('</measure>')
+        parts.append('</part></score-partwise>\n')
+        return ''.join(parts)
+
+    def render(self, pattern, bars=1, title=None):
+        """把节奏型重复bars小节生成MusicXML文本"""
+        return self.score([pattern] * bars, title)
+
+    def write(self, file, patterns, title=None):
+        """写入MusicXML文件
+
+        Args:
+            file: 文件路径，或以二进制模式打开的文件对象
+            patterns: 各小节的节奏型列表
+            title: 乐谱标题
+
+        Returns:
+            int: 写入的字节数
+        """
+        data = self.score(patterns, title).encode('utf-8')
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as fileobj:
+                fileobj.write(data)
+        else:
+            file.write(data)
+        return len(data)
+
+
+def _beams(items):
+    """计算每个元素各层符杠的状态（相邻的音符连杠，休止打断符杠）
+
+    Returns:
+        list: 每个元素的符杠状态列表（第n项为第n层符杠）
+    """
+    result = [[] for _ in items]
+    run = []
+    for index, item in enumerate(items + [(None, False, 0, None, 0, 0)]):
+        if item[0] is not None and item[5] > 0:
+            run.append(index)
+            continue
+        if len(run) > 1:
+            for position, current in enumerate(run):
+                levels = items[current][5]
+                for level in range(1, levels + 1):
+                    before = position > 0 and items[run[position - 1]][5] >= level
+                    after = position < len(run) - 1 and items[run[position + 1]][5] >= level
+                    if before and after:
+                        state = 'continue'
+                    elif after:
+                        state = 'begin'
+                    elif before:
+                        state = 'end'
+                    else:
+                        state = 'forward hook' if position == 0 else 'backward hook'
+                    result[current].append(state)
+        run = []
+    return result
+
+
+def export_sheets(patterns, output_dir, bars=1, writer=None):
+    """批量导出鼓谱
+
+    Args:
+        patterns: 节奏型字典 {名称: 节奏型}
+        output_dir: 输出目录
+        bars: 每个乐谱的小节数
+        writer: MusicXMLWriter，默认按配置文件创建
+
+    Returns:
+        list: 写入的文件路径
+    """
+    writer = writer or MusicXMLWriter.from_config()
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, pattern in patterns.items():
+        path = os.path.join(output_dir, f"{name.replace('/', '__')}.musicxml")
+        writer.write(path, [pattern] * bars, title=name)
+        paths.append(path)
+    return paths
@@ -0,0 +1,149 @@
+"""紧凑的数组节奏型表示
+
+PatternGrid 用NumPy数组保存节奏型：
+- beats: 每个步进（音符位置）的拍位置，形状 (steps,)
+- hits: 步进 × 鼓声部 的布尔矩阵，形状 (steps, voices)
+- accents: 每个步进是否为重音，形状 (steps,)
+
+克隆时共享底层数组（写时复制），只有真正修改的那个副本才会复制数组，
+因此批量生成变体时不再为每个音符分配嵌套的列表和字典。
+"""
+import numpy as np
+
+# 默认鼓声部顺序，转换回字典格式时按此顺序排列drums
+DRUM_VOICES = (
+    'bass', 'snare', 'closed_hihat', 'open_hihat',
+    'ride', 'ride_bell', 'crash', 'chinese_cymbal',
+    't1', 't2', 't3',
+)
+
+
+def _freeze(array):
+    """返回数组的只读视图，之后的修改必须先复制
+
+    只把新建的视图标记为只读，不修改传入数组本身的可写标志（数组可能属于调用方）。
+    """
+    if not array.flags.writeable:
+        return array
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class PatternGrid:
+    """基于数组的节奏型，支持写时复制的廉价克隆"""
+
+    __slots__ = ('beats', 'hits', 'accents', 'voices', '_voice_index')
+
+    def __init__(self, beats, hits, accents, voices=DRUM_VOICES):
+        """初始化节奏型
+
+        Args:
+            beats: 拍位置数组，形状 (steps,)
+            hits: 布尔矩阵，形状 (steps, voices)
+            accents: 重音数组，形状 (steps,)
+            voices: 鼓声部名称元组，对应hits的列
+        """
+        self.beats = np.asarray(beats, dtype=np.float64)
+        self.hits = np.asarray(hits, dtype=bool)
+        self.accents = np.asarray(accents, dtype=bool)
+        self.voices = tuple(voices)
+        self._voice_index = {name: i for i, name in enumerate(self.voices)}
+
+        if self.hits.shape != (len(self.beats), len(self.voices)):
+            raise ValueError(f"hits形状 {self.hits.shape} 与步进数/声部数不匹配")
+        if self.accents.shape != self.beats.shape:
+            raise ValueError(f"accents形状 {self.accents.shape} 与步进数不匹配")
+
+        # 拍位置在变体生成中不会被修改，始终共享
+        self.beats = _freeze(self.beats)
+
+    @classmethod
+    def from_dicts(cls, pattern, voices=DRUM_VOICES):
+        """从字典列表格式的节奏型创建
+
+        Args:
+            pattern: 节奏型列表，每个元素包含beat, drums, accent
+            voices: 鼓声部顺序，遇到未列出的鼓时追加在末尾
+
+        Returns:
+            PatternGrid: 数组节奏型
+        """
+        voices = list(voices)
+        for note_info in pattern:
+            for drum in note_info['drums']:
+                if drum not in voices:
+                    voices.append(drum)
+
+        voice_index = {name: i for i, name in enumerate(voices)}
+        hits = np.zeros((len(pattern), len(voices)), dtype=bool)
+        for step, note_info in enumerate(pattern):
+            for drum in note_info['drums']:
+                hits[step, voice_index[drum]] = True
+
+        beats = [note_info['beat'] for note_info in pattern]
+        accents = [note_info['accent'] for note_info in pattern]
+        return cls(beats, hits, accents, voices)
+
+    def to_dicts(self):
+        """转换回字典列表格式
+
+        Returns:
+            list: 节奏型列表，drums按声部顺序排列
+        """
+        voices = self.voices
+        return [
+            {
+                'beat': float(beat),
+                'drums': [voices[v] for v in np.flatnonzero(row)],
+                'accent': bool(accent),
+            }
+            for beat, row, accent in zip(self.beats, self.hits, self.accents)
+        ]
+
+    def copy(self):
+        """写时复制克隆：与原节奏型共享数组，任何一方修改前才复制"""
+        self.hits = _freeze(self.hits)
+        self.accents = _freeze(self.accents)
+        clone = PatternGrid.__new__(PatternGrid)
+        clone.beats = self.beats
+        clone.hits = self.hits
+        clone.accents = self.accents
+        clone.voices = self.voices
+        clone._voice_index = self._voice_index
+        return clone
+
+    def writable_hits(self):
+        """返回可修改的hits数组（共享时先复制）"""
+        if not self.hits.flags.writeable:
+            self.hits = self.hits.copy()
+        return self.hits
+
+    def writable_accents(self):
+        """返回可修改的accents数组（共享时先复制）"""
+        if not self.accents.flags.writeable:
+            self.accents = self.accents.copy()
+        return self.accents
+
+    def voice(self, name):
+        """返回鼓声部在hits中的列索引"""
+        try:
+            return self._voice_index[name]
+        except KeyError:
+            raise KeyError(f"节奏型中没有鼓声部: {name}") from None
+
+    def __len__(self):
+        return len(self.beats)
+
+    def __eq__(self, other):
+        if not isinstance(other, PatternGrid):
+            return NotImplemented
+        return (self.voices == other.voices
+                and np.array_equal(self.beats, other.beats)
+                and np.array_equal(self.hits, other.hits)
+                and np.array_equal(self.accents, other.accents))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"PatternGrid(steps={len(self)}, voices={len(self.voices)}, notes={int(self.hits.sum())})"
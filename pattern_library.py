@@ -0,0 +1,338 @@
+"""节奏型库：紧凑的二进制语料文件与索引查询
+
+PatternLibrary 以列式数组保存大量节奏型：
+- 每个节奏型一行：风格、拍号、密度（每四分音符的音符数）、使用的鼓声部位掩码
+- 所有步进首尾相接（CSR格式）：拍位置、鼓声部位掩码、重音
+
+库可以保存为单个二进制文件，加载时用 numpy.memmap 直接映射各数组，
+不需要逐条解析，数万个节奏型也能瞬间打开；按名称查找为O(1)，
+按风格、拍号、密度和鼓声部的筛选在整列数组上向量化完成。
+
+文件格式：
+    b'DRUMLIB1' | 头部长度(uint32, 小端) | JSON头部 | 按8字节对齐的各数组数据
+"""
+import json
+import struct
+from collections import namedtuple
+
+import numpy as np
+import yaml
+
+from pattern_grid import DRUM_VOICES, PatternGrid
+from rhythm_patterns import RhythmPatterns
+
+MAGIC = b'DRUMLIB1'
+
+# 内置节奏型及其风格
+BUILTIN_STYLES = {
+    'standard_rock': 'rock',
+    'disco_pattern': 'disco',
+    'shuffle_pattern': 'shuffle',
+    'funk_pattern': 'funk',
+    'ballad_pattern': 'ballad',
+    'reggae_pattern': 'reggae',
+}
+
+# 二进制文件中保存的数组及其类型
+_ARRAY_DTYPES = {
+    'style_codes': '<u2',   # 每个节奏型的风格编号
+    'numerators': '<u1',    # 拍号分子
+    'denominators': '<u1',  # 拍号分母
+    'densities': '<f4',     # 每四分音符的音符数
+    'voice_masks': '<u8',   # 使用到的鼓声部位掩码
+    'step_starts': '<i8',   # 每个节奏型第一个步进的位置，长度为节奏型数+1
+    'beats': '<f8',         # 各步进的拍位置
+    'hit_masks': '<u8',     # 各步进演奏的鼓声部位掩码
+    'accents': '<u1',       # 各步进是否为重音
+}
+
+PatternInfo = namedtuple('PatternInfo', [
+    'name',         # 节奏型名称
+    'style',        # 风格
+    'numerator',    # 拍号分子
+    'denominator',  # 拍号分母
+    'density',      # 每四分音符的音符数
+    'voices',       # 使用到的鼓声部
+    'steps',        # 步进数
+])
+
+
+class PatternLibrary:
+    """带索引的节奏型库"""
+
+    def __init__(self, names, styles, voices, arrays):
+        """初始化节奏型库（一般通过 from_entries / load / builtin 创建）
+
+        Args:
+            names: 节奏型名称列表
+            styles: 风格名称列表，style_codes中的编号对应此列表
+            voices: 鼓声部名称列表，位掩码第i位对应voices[i]
+            arrays: 数组字典，键见 _ARRAY_DTYPES
+        """
+        self.names = list(names)
+        self.styles = list(styles)
+        self.voices = tuple(voices)
+        self._arrays = arrays
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._voice_bits = {name: 1 << i for i, name in enumerate(self.voices)}
+
+        if len(self._index) != len(self.names):
+            raise ValueError("节奏型名称重复")
+
+    @classmethod
+    def from_entries(cls, entries, voices=DRUM_VOICES):
+        """由节奏型条目构建库
+
+        Args:
+            entries: 可迭代的字典，每个包含 name, pattern，可选 style（默认'unknown'）、
+                     time_signature（如'6/8'，默认'4/4'）
+            voices: 鼓声部顺序，遇到未列出的鼓时追加在末尾
+
+        Returns:
+            PatternLibrary: 节奏型库
+        """
+        names, styles, voices = [], [], list(voices)
+        style_index, voice_index = {}, {name: i for i, name in enumerate(voices)}
+        columns = {key: [] for key in _ARRAY_DTYPES}
+        columns['step_starts'].append(0)
+
+        for entry in entries:
+            pattern = entry['pattern']
+            style = entry.get('style', 'unknown')
+            numerator, denominator = (int(part) for part in str(entry.get('time_signature', '4/4')).split('/'))
+
+            if style not in style_index:
+                style_index[style] = len(styles)
+                styles.append(style)
+
+            voice_mask = 0
+            note_count = 0
+            for note_info in pattern:
+                hit_mask = 0
+                for drum in note_info['drums']:
+                    if drum not in voice_index:
+                        voice_index[drum] = len(voices)
+                        voices.append(drum)
+                    hit_mask |= 1 << voice_index[drum]
+                voice_mask |= hit_mask
+                note_count += len(note_info['drums'])
+
+                columns['beats'].append(note_info['beat'])
+                columns['hit_masks'].append(hit_mask)
+                columns['accents'].append(bool(note_info['accent']))
+
+            names.append(entry['name'])
+            columns['style_codes'].append(style_index[style])
+            columns['numerators'].append(numerator)
+            columns['denominators'].append(denominator)
+            columns['densities'].append(note_count * denominator / (4 * numerator))
+            columns['voice_masks'].append(voice_mask)
+            columns['step_starts'].append(len(columns['beats']))
+
+        if len(voices) > 64:
+            raise ValueError(f"鼓声部数量 {len(voices)} 超过位掩码上限64")
+
+        arrays = {key: np.array(values, dtype=_ARRAY_DTYPES[key]) for key, values in columns.items()}
+        return cls(names, styles, voices, arrays)
+
+    @classmethod
+    def builtin(cls):
+        """由 RhythmPatterns 的预定义节奏型构建库"""
+        return cls.from_entries(
+            {'name': name, 'style': style, 'pattern': getattr(RhythmPatterns, name)()}
+            for name, style in BUILTIN_STYLES.items()
+        )
+
+    @classmethod
+    def from_yaml(cls, file_path):
+        """从YAML文件构建库
+
+        YAML文件为条目列表（或包含patterns键的字典），条目格式见 from_entries。
+        """
+        with open(file_path, 'r', encoding='utf-8') as file:
+            data = yaml.safe_load(file) or []
+        if isinstance(data, dict):
+            data = data.get('patterns', [])
+        return cls.from_entries(data)
+
+    def save(self, file_path):
+        """保存为二进制库文件"""
+        header = {
+            'names': self.names,
+            'styles': self.styles,
+            'voices': list(self.voices),
+            'arrays': {},
+        }
+
+        # 先计算各数组在文件中的位置（头部长度会影响偏移，因此反复计算直到稳定）
+        header_bytes = b''
+        while True:
+            offset = _align(len(MAGIC) + 4 + len(header_bytes))
+            for key in _ARRAY_DTYPES:
+                array = self._arrays[key]
+                header['arrays'][key] = {'offset': offset, 'length': len(array)}
+                offset = _align(offset + array.nbytes)
+            encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            stable = len(encoded) == len(header_bytes)
+            header_bytes = encoded
+            if stable:
+                break
+
+        with open(file_path, 'wb') as file:
+            file.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+            for key in _ARRAY_DTYPES:
+                file.write(b'\x00' * (header['arrays'][key]['offset'] - file.tell()))
+                file.write(np.ascontiguousarray(self._arrays[key]).tobytes())
+
+    @classmethod
+    def load(cls, file_path, mmap=True):
+        """加载二进制库文件
+
+        Args:
+            file_path: 库文件路径
+            mmap: 为True时用内存映射只读访问数组，否则一次性读入内存
+
+        Returns:
+            PatternLibrary: 节奏型库
+        """
+        with open(file_path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是节奏型库文件: {file_path}")
+            header_length, = struct.unpack('<I', file.read(4))
+            header = json.loads(file.read(header_length).decode('utf-8'))
+
+        if mmap:
+            raw = np.memmap(file_path, dtype=np.uint8, mode='r')
+        else:
+            raw = np.fromfile(file_path, dtype=np.uint8)
+
+        # 各数组按8字节对齐存放，直接在文件数据上创建视图
+        arrays = {}
+        for key, dtype in _ARRAY_DTYPES.items():
+            layout = header['arrays'][key]
+            dtype = np.dtype(dtype)
+            start = layout['offset']
+            arrays[key] = raw[start:start + layout['length'] * dtype.itemsize].view(dtype)
+
+        return cls(header['names'], header['styles'], header['voices'], arrays)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def _position(self, name):
+        """返回节奏型在库中的序号"""
+        try:
+            return self._index[name]
+        except KeyError:
+            raise KeyError(f"节奏型库中没有: {name}") from None
+
+    def _steps(self, position):
+        """返回节奏型步进在CSR数组中的范围"""
+        starts = self._arrays['step_starts']
+        return slice(int(starts[position]), int(starts[position + 1]))
+
+    def _mask_voices(self, mask):
+        """把位掩码转换为鼓声部名称列表（按声部顺序）"""
+        return [voice for voice, bit in self._voice_bits.items() if mask & bit]
+
+    def get(self, name):
+        """按名称获取节奏型（字典列表格式）"""
+        steps = self._steps(self._position(name))
+        arrays = self._arrays
+        return [
+            {'beat': float(beat), 'drums': self._mask_voices(int(hit_mask)), 'accent': bool(accent)}
+            for beat, hit_mask, accent in zip(arrays['beats'][steps], arrays['hit_masks'][steps],
+                                              arrays['accents'][steps])
+        ]
+
+    __getitem__ = get
+
+    def grid(self, name):
+        """按名称获取节奏型（PatternGrid格式）"""
+        steps = self._steps(self._position(name))
+        arrays = self._arrays
+        bits = np.arange(len(self.voices), dtype=np.uint64)
+        hits = (arrays['hit_masks'][steps, None] >> bits) & 1
+        return PatternGrid(arrays['beats'][steps], hits.astype(bool), arrays['accents'][steps].astype(bool),
+                           self.voices)
+
+    def info(self, name):
+        """按名称获取节奏型的索引信息"""
+        position = self._position(name)
+        arrays = self._arrays
+        steps = self._steps(position)
+        return PatternInfo(
+            name=name,
+            style=self.styles[arrays['style_codes'][position]],
+            numerator=int(arrays['numerators'][position]),
+            denominator=int(arrays['denominators'][position]),
+            density=float(arrays['densities'][position]),
+            voices=self._mask_voices(int(arrays['voice_masks'][position])),
+            steps=steps.stop - steps.start,
+        )
+
+    def query(self, style=None, time_signature=None, min_density=None, max_density=None,
+              uses=(), excludes=()):
+        """按条件筛选节奏型
+
+        Args:
+            style: 风格（或风格列表）
+            time_signature: 拍号，如 '4/4'
+            min_density: 最小密度（每四分音符的音符数）
+            max_density: 最大密度
+            uses: 必须使用的鼓声部
+            excludes: 不能使用的鼓声部
+
+        Returns:
+            list: 满足条件的节奏型名称（按库中顺序）
+        """
+        arrays = self._arrays
+        mask = np.ones(len(self.names), dtype=bool)
+
+        if style is not None:
+            styles = [style] if isinstance(style, str) else style
+            codes = [self.styles.index(s) for s in styles if s in self.styles]
+            mask &= np.isin(arrays['style_codes'], codes)
+        if time_signature is not None:
+            numerator, denominator = (int(part) for part in time_signature.split('/'))
+            mask &= (arrays['numerators'] == numerator) & (arrays['denominators'] == denominator)
+        if min_density is not None:
+            mask &= arrays['densities'] >= min_density
+        if max_density is not None:
+            mask &= arrays['densities'] <= max_density
+
+        if uses:
+            required = self._voices_mask(uses)
+            if required is None:
+                return []
+            mask &= (arrays['voice_masks'] & np.uint64(required)) == np.uint64(required)
+        if excludes:
+            excluded = self._voices_mask(excludes, missing_ok=True)
+            mask &= (arrays['voice_masks'] & np.uint64(excluded)) == 0
+
+        return [self.names[i] for i in np.flatnonzero(mask)]
+
+    def _voices_mask(self, voices, missing_ok=False):
+        """把鼓声部名称转换为位掩码；有未知声部且missing_ok为False时返回None"""
+        mask = 0
+        for voice in voices:
+            if voice in self._voice_bits:
+                mask |= self._voice_bits[voice]
+            elif not missing_ok:
+                return None
+        return mask
+
+    def as_dict(self, names=None):
+        """返回 {名称: 节奏型} 字典，可直接用于 generate_batch"""
+        return {name: self.get(name) for name in (self.names if names is None else names)}
+
+
+def _align(offset, alignment=8):
+    """把偏移向上对齐"""
+    return (offset + alignment - 1) // alignment * alignment
@@ -1,35 +1,112 @@
 import yaml
 import random
 import os
+import contextlib
 import copy
-from music21 import stream, note, meter, tempo, instrument, volume, converter
-from rhythm_patterns import RhythmPatterns
+import threading
+import io
+import tarfile
+import time
+import zipfile
+import functools
+import sys
+from collections import OrderedDict
+import midi_writer
+from beat_grid import TICKS_PER_QUARTER, beat_to_ticks, ticks_to_quarters, bar_ticks
+
+# NumPy及依赖它的模块（PatternGrid、人性化、随机节奏型、律动模型等）在第一次使用时才导入，
+# 只处理字典节奏型、用direct引擎导出时启动不需要加载NumPy
+
+# 已解析的配置缓存: (绝对路径, 修改时间, 文件大小) -> 配置字典
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
+# 单小节渲染结果缓存（LRU）: (生成器类型, 节奏型, 拍号) -> 小节内音符事件
+BAR_CACHE_SIZE = 1024
+_bar_cache = OrderedDict()
+_bar_cache_lock = threading.Lock()
+
+
+def clear_bar_cache():
+    """清空单小节渲染缓存"""
+    with _bar_cache_lock:
+        _bar_cache.clear()
+
+
+@functools.lru_cache(maxsize=BAR_CACHE_SIZE)
+def _durations_for_ticks(ticks):
+    """一次遍历计算每个音符到下一个音符的间隔（整数tick）
+
+    最后一个音符使用平均间隔（四舍五入到整数tick，只有一个音符时为8分音符）。
+    只依赖拍位置，因此同一节奏型的所有变体共享计算结果。
+
+    Args:
+        ticks: 按顺序排列的音符起点tick元组
+
+    Returns:
+        tuple: 每个音符的时长（tick）
+    """
+    if not ticks:
+        return ()
+
+    intervals = tuple(next_tick - tick for tick, next_tick in zip(ticks, ticks[1:]))
+    if intervals:
+        count = len(intervals)
+        last_duration = (ticks[-1] - ticks[0] + count // 2) // count
+    else:
+        last_duration = TICKS_PER_QUARTER // 2  # 默认8分音符
+    return intervals + (last_duration,)
+
+
+def _is_grid(pattern):
+    """判断是否为PatternGrid（pattern_grid 尚未导入时不可能是PatternGrid，不触发导入）"""
+    pattern_grid = sys.modules.get('pattern_grid')
+    return pattern_grid is not None and isinstance(pattern, pattern_grid.PatternGrid)
+
+
+def _pattern_key(pattern):
+    """把节奏型转换为可哈希的键"""
+    return tuple((note_info['beat'], tuple(note_info['drums']), bool(note_info['accent']))
+                 for note_info in pattern)
 
 
 class DrumSheetGenerator:
     """架子鼓乐谱生成器"""
 
-    def __init__(self, midi_config_path="./configs/midi_config.yaml", run_config_path="./configs/run_configs.yaml"):
-        """初始化生成器"""
-        self.midi_config = self.load_yaml(midi_config_path)
-        self.run_config = self.load_yaml(run_config_path)
+    # random_modify_notes 可随机添加的鼓
+    RANDOM_DRUMS = ['closed_hihat', 'open_hihat', 'ride', 'crash', 't1', 't2', 't3']
 
-        # 初始化音乐流
-        self.score = stream.Stream()
-        self.drum_part = stream.Part()
+    def __init__(self, midi_config_path="./configs/midi_config.yaml", run_config_path="./configs/run_configs.yaml",
+                 engine=None, midi_config=None, run_config=None):
+        """初始化生成器
+
+        Args:
+            midi_config_path: MIDI音符映射配置路径
+            run_config_path: 运行参数配置路径
+            engine: 渲染引擎，'music21' 或 'direct'（直接写MIDI字节），默认读取配置
+            midi_config: 已解析的MIDI映射配置，给出时不再读取midi_config_path
+            run_config: 已解析的运行参数配置，给出时不再读取run_config_path
+        """
+        self.midi_config = midi_config if midi_config is not None else self.load_yaml(midi_config_path)
+        self.run_config = run_config if run_config is not None else self.load_yaml(run_config_path)
+
+        self.engine = engine or self.run_config.get('engine', 'music21')
+        if self.engine not in ('music21', 'direct'):
+            raise ValueError(f"未知的渲染引擎: {self.engine}")
+        self.midi_channel = self.run_config.get('midi_channel', 1)
+
+        # 保护生成状态（events/drum_part/score），使同一实例可被多个线程使用
+        self._lock = threading.RLock()
 
         # 设置基本参数
         self.bpm = self.run_config.get('bpm', 120)
         self.numerator = self.run_config.get('numerator', 4)
         self.denominator = self.run_config.get('denominator', 4)
         self.bars = self.run_config.get('bars', 4)
+        self.bar_ticks = bar_ticks(self.numerator, self.denominator)
 
-        # 设置拍号和速度
-        self.score.insert(0, meter.TimeSignature(f'{self.numerator}/{self.denominator}'))
-        self.score.insert(0, tempo.MetronomeMark(number=self.bpm))
-
-        # 设置架子鼓乐器
-        self.drum_part.insert(0, instrument.Percussion())
+        # 初始化音乐流和音符事件
+        self.reset()
 
         # 获取概率参数
         self.base_note_length = self.run_config.get('base_note_length', 0.5)
@@ -43,11 +120,47 @@ class DrumSheetGenerator:
         # 鼓的概率权重
         self.drum_probabilities = self.run_config.get('drum_probabilities', {})
 
-    def load_yaml(self, file_path):
-        """加载YAML配置文件"""
+        # 随机节奏型生成器（别名表在第一次使用时构建）
+        self._groove_sampler = None
+        # 马尔可夫律动模型（'markov' 变体，第一次使用时训练或加载）
+        self._groove_model = None
+
+        # 力度与时间人性化（配置中 humanize.enabled 为真时开启）
+        humanize = self.run_config.get('humanize') or {}
+        self.humanizer = None
+        if humanize.get('enabled'):
+            from humanizer import Humanizer
+            self.humanizer = Humanizer.from_generator(self)
+
+        # 渲染结果缓存（配置中 render_cache.enabled 为真时开启）
+        cache_config = self.run_config.get('render_cache') or {}
+        self.render_cache = None
+        if cache_config.get('enabled'):
+            from render_cache import RenderCache
+            self.render_cache = RenderCache(cache_config.get('path', '.cache/midi'),
+                                            int(cache_config.get('max_mb', 256) * 1024 * 1024))
+
+    @staticmethod
+    def load_yaml(file_path):
+        """加载YAML配置文件
+
+        解析结果按 (路径, 修改时间, 文件大小) 缓存，文件未变化时不再重复解析；
+        每次返回缓存的深拷贝，调用方可以自由修改。
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return yaml.safe_load(file)
+            stat = os.stat(file_path)
+            key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+            with _config_cache_lock:
+                config = _config_cache.get(key)
+
+            if config is None:
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    config = yaml.safe_load(file) or {}
+                with _config_cache_lock:
+                    _config_cache[key] = config
+
+            return copy.deepcopy(config)
         except FileNotFoundError:
             print(f"配置文件 {file_path} 未找到")
             return {}
@@ -55,19 +168,100 @@ class DrumSheetGenerator:
             print(f"YAML文件解析错误: {e}")
             return {}
 
+    def reset(self):
+        """清空已生成的内容，使生成器可以直接用于下一个文件"""
+        with self._lock:
+            # 已生成的音符事件 (offset, note_names, duration, is_accent)，offset和duration为tick
+            self.events = []
+            # 当前内容对应的 (节奏型键, 小节数)，只由 generate_from_pattern 设置，用作渲染缓存的键
+            self._rendered = None
+
+            if self.engine == 'direct':
+                # direct引擎不使用music21对象，需要乐谱时由 build_score 按事件构建
+                self.score = None
+                self.drum_part = None
+                return
+
+            # 初始化音乐流，设置拍号和速度
+            self.score = self._new_score()
+
+            # 设置架子鼓乐器
+            self.drum_part = self._new_drum_part()
+
+    def _new_score(self):
+        """创建带拍号和速度的空音乐流"""
+        # music21导入耗时较长，只在需要乐谱时才导入
+        from music21 import stream, meter, tempo
+
+        score = stream.Stream()
+        score.insert(0, meter.TimeSignature(f'{self.numerator}/{self.denominator}'))
+        score.insert(0, tempo.MetronomeMark(number=self.bpm))
+        return score
+
+    @staticmethod
+    def _new_drum_part():
+        """创建带打击乐器的空声部"""
+        from music21 import stream, instrument
+
+        drum_part = stream.Part()
+        drum_part.insert(0, instrument.Percussion())
+        return drum_part
+
+    def _fork(self):
+        """复制出共享配置、拥有独立生成状态的生成器"""
+        worker = copy.copy(self)
+        worker._lock = threading.RLock()
+        worker.reset()
+        return worker
+
+    def render(self, pattern, bars=1):
+        """渲染节奏型并返回新的music21乐谱，不修改当前生成器的状态
+
+        Args:
+            pattern: 节奏型列表（或PatternGrid）
+            bars: 重复小节数
+
+        Returns:
+            stream.Stream: 包含拍号、速度和鼓声部的乐谱
+        """
+        worker = self._fork()
+        worker.generate_from_pattern(pattern, bars)
+        return worker.build_score()
+
+    def render_midi(self, pattern, bars=1):
+        """渲染节奏型并返回MIDI文件字节，不修改当前生成器的状态"""
+        worker = self._fork()
+        worker.generate_from_pattern(pattern, bars)
+        return worker.to_bytes()
+
     def add_note(self, note_names, note_duration, offset, is_accent=False):
         """向MIDI音轨添加音符
 
         Args:
             note_names: 音符名称，多个音符用|分隔
-            note_duration: 音符持续时间（四分音符为单位）
-            offset: 音符在小节中的偏移量
+            note_duration: 音符持续时间（tick）
+            offset: 音符在乐谱中的偏移量（tick）
             is_accent: 是否为重音
         """
+        self.events.append((offset, note_names, note_duration, is_accent))
+        self._rendered = None
+        if self.engine == 'direct':
+            return
+
+        self._insert_note(self.drum_part, note_names, note_duration, offset, is_accent)
+
+    def _insert_note(self, drum_part, note_names, note_duration, offset, is_accent=False):
+        """把一个音符事件转换为music21音符插入声部"""
+        from music21 import note, volume
+
+        # music21以四分音符为单位，用精确分数避免三连音等出现浮点误差
+        offset = ticks_to_quarters(offset)
+        note_duration = ticks_to_quarters(note_duration)
+
         if note_names == 'rest':
             # 添加休止符
             rest = note.Rest(quarterLength=note_duration)
-            self.drum_part.insert(offset, rest)
+            drum_part.insert(offset, rest)
             return
 
         # 处理多个同时发声的音符
@@ -84,137 +278,72 @@ class DrumSheetGenerator:
                 else:
                     drum_note.volume = volume.Volume(velocity=70)
 
-                self.drum_part.insert(offset, drum_note)
+                drum_part.insert(offset, drum_note)
 
     def generate_from_pattern(self, pattern, bars=1):
         """根据节奏型模板生成MIDI
 
         Args:
-            pattern: 节奏型列表，每个元素包含beat, drums, accent
+            pattern: 节奏型列表，每个元素包含beat, drums, accent（也可以是PatternGrid）
             bars: 重复小节数
         """
-        self.drum_part = stream.Part()
-        self.drum_part.insert(0, instrument.Percussion())
-
-        # 检测是否包含三连音（beat值包含.67或.33）
-        has_triplets = any(abs(note_info['beat'] % 1 - 0.67) < 0.01 or
-                           abs(note_info['beat'] % 1 - 0.33) < 0.01
-                           for note_info in pattern)
+        if _is_grid(pattern):
+            pattern = pattern.to_dicts()
 
-        if has_triplets:
-            self._generate_triplet_pattern(pattern, bars)
-        else:
-            self._generate_regular_pattern(pattern, bars)
+        with self._lock:
+            self.reset()
 
-    def _generate_triplet_pattern(self, pattern, bars):
-        """生成包含三连音的节奏型"""
-        from music21 import duration
+            # 一个小节的音符事件只计算一次，按小节偏移重复写入
+            bar_events = self.bar_events(pattern)
+            for bar in range(bars):
+                bar_offset = bar * self.bar_ticks
+                for offset, drums_str, note_duration, is_accent in bar_events:
+                    self.add_note(drums_str, note_duration, bar_offset + offset, is_accent)
+            self._rendered = (_pattern_key(pattern), bars)
 
-        for bar in range(bars):
-            bar_offset = bar * self.numerator
+    def bar_events(self, pattern, numerator=None, denominator=None):
+        """计算一个小节内的音符事件（带LRU缓存）
 
-            # 按拍分组处理
-            beat_groups = {}
-            for note_info in pattern:
-                beat_int = int(note_info['beat'])
-                if beat_int not in beat_groups:
-                    beat_groups[beat_int] = []
-                beat_groups[beat_int].append(note_info)
+        超出小节长度的音符（如4/4节奏型用于3/4小节时的第4拍）被丢弃，不会落入下一小节。
 
-            for beat_num, notes_in_beat in beat_groups.items():
-                beat_offset = bar_offset + beat_num - 1
-
-                # 检查这一拍是否包含三连音
-                triplet_notes = [n for n in notes_in_beat if abs(n['beat'] % 1 - 0.67) < 0.01]
+        Args:
+            pattern: 节奏型列表
+            numerator: 拍号分子，默认使用生成器的拍号
+            denominator: 拍号分母，默认使用生成器的拍号
 
-                if triplet_notes:
-                    # 处理三连音拍
-                    self._add_triplet_beat(notes_in_beat, beat_offset)
-                else:
-                    # 处理普通拍
-                    for note_info in notes_in_beat:
-                        beat_fraction = note_info['beat'] % 1
-                        note_offset = beat_offset + beat_fraction
-                        drums_str = '|'.join(note_info['drums'])
-
-                        # 计算音符时长
-                        note_duration = self._calculate_note_duration_in_pattern(note_info, pattern)
-
-                        self.add_note(drums_str, note_duration, note_offset, note_info['accent'])
-
-    def _add_triplet_beat(self, notes_in_beat, beat_offset):
-        """添加三连音拍"""
-        from music21 import duration, note as music21_note
-
-        # 创建三连音组
-        triplet_duration = duration.Duration(quarterLength=2 / 3)  # 三连音中每个音符的时长
-
-        # 按beat值排序
-        sorted_notes = sorted(notes_in_beat, key=lambda x: x['beat'])
-
-        for note_info in sorted_notes:
-            beat_fraction = note_info['beat'] % 1
-            drums = note_info['drums']
-
-            # 计算三连音内的偏移
-            if abs(beat_fraction - 0.0) < 0.01:  # 第一个三连音
-                triplet_offset = 0
-            elif abs(beat_fraction - 0.67) < 0.01:  # 第二个三连音
-                triplet_offset = 2 / 3
-            else:  # 其他位置按比例计算
-                triplet_offset = beat_fraction
-
-            note_offset = beat_offset + triplet_offset
-            drums_str = '|'.join(drums)
-
-            # 使用更精确的三连音时长
-            note_duration = 2 / 3 if abs(beat_fraction - 0.67) < 0.01 else 1 / 3
-
-            self.add_note(drums_str, note_duration, note_offset, note_info['accent'])
-
-    def _generate_regular_pattern(self, pattern, bars):
-        """生成普通节奏型（无三连音）"""
-        for bar in range(bars):
-            bar_offset = bar * self.numerator
-
-            for i, note_info in enumerate(pattern):
-                beat_offset = note_info['beat'] - 1  # 转换为0基础偏移
-                drums_str = '|'.join(note_info['drums'])
-
-                # 计算音符时长
-                note_duration = self._calculate_note_duration_in_pattern(note_info, pattern, i)
-
-                self.add_note(
-                    drums_str,
-                    note_duration,
-                    bar_offset + beat_offset,
-                    note_info['accent']
-                )
-
-    def _calculate_note_duration_in_pattern(self, current_note, pattern, current_index=None):
-        """计算节奏型中音符的时长"""
-        if current_index is None:
-            # 找到当前音符在pattern中的索引
-            current_index = next((i for i, note in enumerate(pattern) if note == current_note), 0)
-
-        if current_index < len(pattern) - 1:
-            # 不是最后一个音符，计算到下一个音符的间隔
-            next_beat = pattern[current_index + 1]['beat']
-            current_beat = current_note['beat']
-            return next_beat - current_beat
-        else:
-            # 是最后一个音符，根据节奏型的密度推断时长
-            beat_intervals = []
-            for i in range(len(pattern) - 1):
-                interval = pattern[i + 1]['beat'] - pattern[i]['beat']
-                beat_intervals.append(interval)
-
-            if beat_intervals:
-                # 使用最常见的间隔作为最后一个音符的时长
-                avg_interval = sum(beat_intervals) / len(beat_intervals)
-                return avg_interval
-            else:
-                return 0.5  # 默认8分音符
+        Returns:
+            tuple: (offset, note_names, duration, is_accent) 事件，offset相对小节开头，
+                   offset和duration为整数tick
+        """
+        numerator = numerator or self.numerator
+        denominator = denominator or self.denominator
+        key = (type(self), _pattern_key(pattern), numerator, denominator)
+
+        with _bar_cache_lock:
+            events = _bar_cache.get(key)
+            if events is not None:
+                _bar_cache.move_to_end(key)
+                return events
+
+        # 拍位置一次性量化到整数tick网格（第1拍为0），之后只做整数运算
+        length = bar_ticks(numerator, denominator)
+        notes = [(beat_to_ticks(note_info['beat']) - TICKS_PER_QUARTER, note_info) for note_info in pattern]
+        notes = [(tick, note_info) for tick, note_info in notes if 0 <= tick < length]
+        durations = _durations_for_ticks(tuple(tick for tick, _ in notes))
+        events = tuple(
+            (tick, '|'.join(note_info['drums']), note_duration, note_info['accent'])
+            for (tick, note_info), note_duration in zip(notes, durations)
+        )
+
+        with _bar_cache_lock:
+            _bar_cache[key] = events
+            if len(_bar_cache) > BAR_CACHE_SIZE:
+                _bar_cache.popitem(last=False)
+        return events
+
+    def _calculate_note_durations(self, pattern):
+        """计算节奏型中每个音符的时长（tick，到下一个音符的间隔，最后一个音符使用平均间隔）"""
+        return _durations_for_ticks(tuple(beat_to_ticks(note_info['beat']) for note_info in pattern))
 
     def add_random_snare(self, pattern, probability=0.3):
         """随机添加军鼓音符
@@ -224,8 +353,11 @@ class DrumSheetGenerator:
             probability: 添加军鼓的概率
 
         Returns:
-            list: 修改后的节奏型
+            list: 修改后的节奏型（输入为PatternGrid时返回PatternGrid）
         """
+        if _is_grid(pattern):
+            return self._add_random_drum_grid(pattern, 'snare', probability, accent=True)
+
         modified_pattern = copy.deepcopy(pattern)
 
         for note_info in modified_pattern:
@@ -245,8 +377,11 @@ class DrumSheetGenerator:
             probability: 添加底鼓的概率
 
         Returns:
-            list: 修改后的节奏型
+            list: 修改后的节奏型（输入为PatternGrid时返回PatternGrid）
         """
+        if _is_grid(pattern):
+            return self._add_random_drum_grid(pattern, 'bass', probability)
+
         modified_pattern = copy.deepcopy(pattern)
 
         for note_info in modified_pattern:
@@ -265,10 +400,13 @@ class DrumSheetGenerator:
             remove_probability: 移除音符的概率
 
         Returns:
-            list: 修改后的节奏型
+            list: 修改后的节奏型（输入为PatternGrid时返回PatternGrid）
         """
+        if _is_grid(pattern):
+            return self._random_modify_grid(pattern, add_probability, remove_probability)
+
         modified_pattern = copy.deepcopy(pattern)
-        available_drums = ['closed_hihat', 'open_hihat', 'ride', 'crash', 't1', 't2', 't3']
+        available_drums = self.RANDOM_DRUMS
 
         for note_info in modified_pattern:
             # 随机添加音符
@@ -294,12 +432,84 @@ class DrumSheetGenerator:
 
         return modified_pattern
 
+    def _add_random_drum_grid(self, grid, drum, probability, accent=False):
+        """在PatternGrid上随机添加某个鼓（与字典版本消耗相同的随机数序列）"""
+        import numpy as np
+
+        modified = grid.copy()
+        column = modified.voice(drum)
+
+        # 只对当前没有该鼓的步进抽取随机数
+        candidates = np.flatnonzero(~modified.hits[:, column])
+        draws = np.array([random.random() for _ in candidates])
+        chosen = candidates[draws < probability]
+
+        if len(chosen):
+            modified.writable_hits()[chosen, column] = True
+            if accent:
+                modified.writable_accents()[chosen] = True
+        return modified
+
+    def _random_modify_grid(self, grid, add_probability, remove_probability):
+        """在PatternGrid上随机增减音符"""
+        import numpy as np
+
+        modified = grid.copy()
+        hits = modified.writable_hits()
+        available = [modified.voice(drum) for drum in self.RANDOM_DRUMS if drum in modified.voices]
+        protected = {modified.voice(drum) for drum in ('bass', 'snare') if drum in modified.voices}
+
+        for row in hits:
+            # 随机添加音符
+            if random.random() < add_probability:
+                possible_adds = [v for v in available if not row[v]]
+                if possible_adds:
+                    row[random.choice(possible_adds)] = True
+
+            # 随机移除音符（但保留至少一个音符，优先保留bass和snare）
+            present = np.flatnonzero(row).tolist()
+            if len(present) > 1 and random.random() < remove_probability:
+                removable = [v for v in present if v not in protected]
+                row[random.choice(removable or present)] = False
+
+        return modified
+
+    def create_random_pattern(self, bars=1):
+        """按配置中的概率参数从零随机生成节奏型
+
+        Args:
+            bars: 生成的小节数
+
+        Returns:
+            list: bars为1时返回一个小节的节奏型，否则返回节奏型列表
+        """
+        if self._groove_sampler is None:
+            from groove_sampler import GrooveSampler
+            self._groove_sampler = GrooveSampler(self)
+        if bars == 1:
+            return self._groove_sampler.sample_bar()
+        return self._groove_sampler.sample_bars(bars)
+
+    def groove_model(self):
+        """马尔可夫律动模型：配置中 groove_model.path 给出时加载该模型，否则用预定义节奏型训练"""
+        if self._groove_model is None:
+            from markov_groove import MarkovGrooveModel
+            options = self.run_config.get('groove_model') or {}
+            if options.get('path'):
+                self._groove_model = MarkovGrooveModel.load(options['path'], variation=options.get('variation'))
+            else:
+                self._groove_model = MarkovGrooveModel.builtin(order=options.get('order', 2),
+                                                               variation=options.get('variation', 0.15))
+        return self._groove_model
+
     def create_pattern_variant(self, pattern, variant_type='random'):
         """创建节奏型变体
 
         Args:
             pattern: 原始节奏型
-            variant_type: 变体类型 ('snare', 'bass', 'random', 'all')
+            variant_type: 变体类型 ('snare', 'bass', 'random', 'all', 'markov')；
+                          'markov' 按节奏型最接近的风格从马尔可夫律动模型中采样新小节
+                          （模型中没有当前拍号的风格时返回原节奏型的副本）
 
         Returns:
             list: 变体节奏型
@@ -316,8 +526,161 @@ class DrumSheetGenerator:
             variant = self.add_random_bass(variant, 0.15)
             variant = self.random_modify_notes(variant, 0.1, 0.05)
             return variant
+        elif variant_type == 'markov':
+            signature = f"{self.numerator}/{self.denominator}"
+            model = self.groove_model()
+            if model.styles(signature):
+                variant = model.sample_like(pattern, signature)
+                if _is_grid(pattern):
+                    return type(pattern).from_dicts(variant)
+                return variant
+
+        # 未知的变体类型，或律动模型中没有当前拍号的风格时，返回原节奏型的副本
+        if _is_grid(pattern):
+            return pattern.copy()
+        return copy.deepcopy(pattern)
+
+    def midi_notes(self):
+        """把已生成的音符事件展开为 (offset, midi_note, duration, velocity) 列表（tick）"""
+        return self.events_to_midi_notes(self.events)
+
+    def events_to_midi_notes(self, events, offset_shift=0, bar_origin=0, bar_length=None):
+        """把音符事件展开为 (offset, midi_note, duration, velocity) 列表（tick）
+
+        设置了 humanizer 时，力度、时间偏移和鬼音在展开后对整批音符一次性计算。
+
+        Args:
+            events: (offset, note_names, duration, is_accent) 事件列表
+            offset_shift: 加到每个事件偏移上的tick数（如小节起点）
+            bar_origin: 人性化时小节网格的起点tick（拍号变化的段落起点）
+            bar_length: 人性化时的小节tick数，默认使用生成器的拍号
+        """
+        notes = []
+        for offset, note_names, note_duration, is_accent in events:
+            if note_names == 'rest':
+                continue
+            velocity = 100 if is_accent else 70
+            for drum_name in note_names.split('|'):
+                if drum_name in self.midi_config:
+                    notes.append((offset_shift + offset, self.midi_config[drum_name], note_duration, velocity))
+        if self.humanizer is not None:
+            return self.humanizer.apply(notes, bar_origin, bar_length)
+        return notes
+
+    def to_midi_bytes(self):
+        """不经过music21，直接把已生成的节奏编码为MIDI文件字节"""
+        with self._lock:
+            notes = self.midi_notes()
+        return midi_writer.notes_to_midi_bytes(
+            notes,
+            bpm=self.bpm,
+            numerator=self.numerator,
+            denominator=self.denominator,
+            channel=self.midi_channel - 1,
+        )
+
+    def build_score(self):
+        """用当前鼓声部构建新的乐谱（每次调用都返回新的Stream，声部不会重复累积）"""
+        with self._lock:
+            drum_part = self.drum_part
+            if drum_part is None:
+                # direct引擎：按已生成的事件构建鼓声部
+                drum_part = self._new_drum_part()
+                for offset, note_names, note_duration, is_accent in self.events:
+                    self._insert_note(drum_part, note_names, note_duration, offset, is_accent)
+
+            score = self._new_score()
+            score.append(drum_part)
+            return score
+
+    def to_bytes(self):
+        """把已生成的节奏序列化为MIDI文件字节（使用当前渲染引擎），不写文件
+
+        开启渲染缓存且内容由 generate_from_pattern 生成时，相同节奏型和渲染参数直接返回缓存的字节。
+        """
+        key = self._cache_key()
+        if key is not None:
+            return self.render_cache.get_or_render(key, self._render_bytes)
+        return self._render_bytes()
+
+    def _cache_key(self):
+        """当前内容在渲染缓存中的键，不可缓存时返回None"""
+        with self._lock:
+            rendered = self._rendered
+        if self.render_cache is None or rendered is None:
+            return None
+
+        pattern, bars = rendered
+        humanize = None
+        if self.humanizer is not None:
+            humanize = dict(self.run_config.get('humanize') or {}, seed=self.humanizer.seed)
+        params = {
+            'engine': self.engine,
+            'bpm': self.bpm,
+            'numerator': self.numerator,
+            'denominator': self.denominator,
+            'midi_channel': self.midi_channel,
+            'midi_config': self.midi_config,
+            'humanize': humanize,
+        }
+        from render_cache import cache_key
+        return cache_key(pattern, bars, params)
+
+    def _render_bytes(self):
+        """按当前渲染引擎编码MIDI字节"""
+        if self.engine == 'direct' or self.humanizer is not None:
+            # 直接写MIDI字节，不构建music21对象（人性化的力度和时间只在直接写出的音符中计算）
+            return self.to_midi_bytes()
+
+        from music21 import midi
+        return midi.translate.streamToMidiFile(self.build_score()).writestr()
+
+    def write(self, fileobj):
+        """把MIDI写入以二进制模式打开的文件对象（如BytesIO、HTTP响应流）
+
+        Returns:
+            int: 写入的字节数
+        """
+        data = self.to_bytes()
+        fileobj.write(data)
+        return len(data)
+
+    def write_archive(self, fileobj, grooves, bars=None, archive_format='zip'):
+        """把多个节奏型渲染为MIDI并一次性打包写入归档
+
+        归档按流式写入，fileobj可以是不支持seek的流（如HTTP响应）。
+
+        Args:
+            fileobj: 以二进制模式打开的文件对象
+            grooves: 可迭代的 (文件名, 节奏型) 序列
+            bars: 每个文件的小节数，默认使用配置中的bars
+            archive_format: 'zip' 或 'tar'
+
+        Returns:
+            int: 写入的文件数
+        """
+        if bars is None:
+            bars = self.bars
+        count = 0
+
+        if archive_format == 'zip':
+            with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for filename, pattern in grooves:
+                    archive.writestr(filename, self.render_midi(pattern, bars))
+                    count += 1
+        elif archive_format == 'tar':
+            with tarfile.open(fileobj=fileobj, mode='w|') as archive:
+                for filename, pattern in grooves:
+                    data = self.render_midi(pattern, bars)
+                    info = tarfile.TarInfo(filename)
+                    info.size = len(data)
+                    info.mtime = int(time.time())
+                    archive.addfile(info, io.BytesIO(data))
+                    count += 1
         else:
-            return copy.deepcopy(pattern)
+            raise ValueError(f"不支持的归档格式: {archive_format}")
+
+        return count
 
     def save_midi(self, filename=None):
         """保存MIDI文件"""
@@ -328,18 +691,48 @@ class DrumSheetGenerator:
         output_path = self.run_config.get('output_path', '../music/outputs/')
         os.makedirs(output_path, exist_ok=True)
 
-        # 将鼓声部添加到主音乐流
-        self.score.append(self.drum_part)
-
-        # 保存文件
         full_path = os.path.join(output_path, filename)
-        self.score.write('midi', fp=full_path)
+
+        with open(full_path, 'wb') as file:
+            self.write(file)
 
         print(f"MIDI文件已保存到: {full_path}")
         return full_path
 
 def main():
-    """主程序"""
+    """命令行入口：解析参数，按需开启计时统计或cProfile"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="架子鼓节奏型生成器")
+    parser.add_argument('--stats', metavar='PATH', help="记录各阶段耗时和计数，保存为JSON")
+    parser.add_argument('--profile', metavar='PATH', help="用cProfile记录运行过程，保存为 .prof 文件")
+    args = parser.parse_args()
+
+    if not (args.stats or args.profile):
+        generate_examples()
+        return
+
+    import instrumentation
+    # 以脚本运行时本模块为__main__，计时包装安装在导入的random_drumsheet模块上
+    from random_drumsheet import generate_examples as run
+
+    with contextlib.ExitStack() as stack:
+        if args.stats:
+            stack.enter_context(instrumentation.recording())
+        if args.profile:
+            stack.enter_context(instrumentation.profile(args.profile))
+        run()
+
+    if args.stats:
+        instrumentation.write_json(args.stats)
+        print(f"\n{instrumentation.format_report()}")
+        print(f"\n计时统计已保存到: {args.stats}")
+    if args.profile:
+        print(f"cProfile结果已保存到: {args.profile}")
+
+
+def generate_examples():
+    """生成示例：原始节奏型和四种变体"""
     print("架子鼓节奏型生成器")
     print("=" * 40)
 
@@ -347,18 +740,12 @@ def main():
     generator = DrumSheetGenerator()
 
     # 获取所有可用的节奏型
-    available_patterns = {
-        'standard_rock': RhythmPatterns.standard_rock(),
-        'disco_pattern': RhythmPatterns.disco_pattern(),
-        'shuffle_pattern': RhythmPatterns.shuffle_pattern(),
-        'funk_pattern': RhythmPatterns.funk_pattern(),
-        'ballad_pattern': RhythmPatterns.ballad_pattern(),
-        'reggae_pattern': RhythmPatterns.reggae_pattern(),
-    }
+    from pattern_library import PatternLibrary
+    library = PatternLibrary.builtin()
 
     # 选择一个节奏型（这里选择基本摇滚节奏）
     pattern_name = 'standard_rock'
-    original_pattern = available_patterns[pattern_name]
+    original_pattern = library.get(pattern_name)
 
     print(f"\n选择的节奏型: {pattern_name}")
     print(f"原始节奏型包含 {len(original_pattern)} 个音符")
@@ -371,28 +758,24 @@ def main():
     # 生成变体1：添加随机军鼓
     print("\n生成军鼓变体...")
     snare_variant = generator.create_pattern_variant(original_pattern, 'snare')
-    generator = DrumSheetGenerator()  # 重新初始化
     generator.generate_from_pattern(snare_variant, bars=4)
     snare_midi_path = generator.save_midi(f"{pattern_name}_snare_variant.mid")
 
     # 生成变体2：添加随机底鼓
     print("\n生成底鼓变体...")
     bass_variant = generator.create_pattern_variant(original_pattern, 'bass')
-    generator = DrumSheetGenerator()  # 重新初始化
     generator.generate_from_pattern(bass_variant, bars=4)
     bass_midi_path = generator.save_midi(f"{pattern_name}_bass_variant.mid")
 
     # 生成变体3：随机增减音符
     print("\n生成随机变体...")
     random_variant = generator.create_pattern_variant(original_pattern, 'random')
-    generator = DrumSheetGenerator()  # 重新初始化
     generator.generate_from_pattern(random_variant, bars=4)
     random_midi_path = generator.save_midi(f"{pattern_name}_random_variant.mid")
 
     # 生成变体4：综合变体
     print("\n生成综合变体...")
     all_variant = generator.create_pattern_variant(original_pattern, 'all')
-    generator = DrumSheetGenerator()  # 重新初始化
     generator.generate_from_pattern(all_variant, bars=4)
     all_midi_path = generator.save_midi(f"{pattern_name}_all_variant.mid")
 
@@ -0,0 +1,206 @@
+"""按内容寻址的MIDI渲染缓存
+
+同一节奏型、小节数和渲染参数（速度、拍号、引擎、MIDI通道、人性化参数、MIDI音符映射）
+总是得到相同的MIDI字节。RenderCache 以这些内容的规范化哈希为键把渲染结果保存在磁盘上，
+命中时直接返回已有文件，不再构建乐谱和编码。
+
+- 文件按哈希前两位分目录保存，写入时先写临时文件再 os.replace，读者不会看到写了一半的文件
+- 读取命中时更新文件的修改时间，总大小超过上限时按修改时间淘汰最久未使用的文件（LRU）
+- 淘汰过程用文件锁（fcntl.flock）串行化，多个工作进程可以安全地共享同一缓存目录
+"""
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有flock，淘汰时只依赖删除操作本身的原子性
+    fcntl = None
+
+# 缓存格式版本，渲染逻辑改变导致输出不同时递增，使旧缓存失效
+CACHE_VERSION = 1
+
+# 淘汰后保留的大小占上限的比例，避免每次写入都触发淘汰
+LOW_WATERMARK = 0.9
+
+# 缓存文件扩展名
+SUFFIX = '.mid'
+
+
+def cache_key(pattern, bars, params):
+    """计算渲染结果的规范化哈希
+
+    Args:
+        pattern: 节奏型列表，或 (beat, drums, accent) 元组序列
+        bars: 小节数
+        params: 影响输出的渲染参数字典（需可JSON序列化）
+
+    Returns:
+        str: 十六进制哈希
+    """
+    canonical = {
+        'version': CACHE_VERSION,
+        'pattern': [[float(beat), list(drums), bool(accent)] for beat, drums, accent in map(_note_tuple, pattern)],
+        'bars': bars,
+        'params': params,
+    }
+    data = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=20).hexdigest()
+
+
+def _note_tuple(note_info):
+    if isinstance(note_info, dict):
+        return note_info['beat'], note_info['drums'], note_info['accent']
+    return note_info
+
+
+class RenderCache:
+    """磁盘上的MIDI渲染缓存"""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        """初始化缓存
+
+        Args:
+            directory: 缓存目录（不存在时自动创建）
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._size = None  # 本进程估计的缓存总大小，第一次写入时扫描目录得到
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + SUFFIX)
+
+    def get(self, key):
+        """读取缓存
+
+        Returns:
+            bytes: 命中时返回MIDI字节，否则返回None
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新修改时间作为LRU顺序（文件可能刚被其他进程淘汰）
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """写入缓存（原子替换），总大小超过上限时淘汰最久未使用的文件"""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # 覆盖已有的键时，大小估计只增加新旧文件的差值
+        try:
+            old_size = os.path.getsize(path)
+        except FileNotFoundError:
+            old_size = 0
+
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - old_size
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def get_or_render(self, key, render):
+        """命中时返回缓存，否则调用render()生成MIDI字节并写入缓存"""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def _entries(self):
+        """枚举缓存文件: [(修改时间, 大小, 路径), ...]"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                with contextlib.suppress(FileNotFoundError):
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """跨进程的排他锁（没有fcntl时只在进程内互斥）"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def evict(self, max_bytes=None):
+        """按LRU淘汰文件，直到总大小不超过上限的 LOW_WATERMARK
+
+        Args:
+            max_bytes: 临时使用的上限，默认使用 self.max_bytes
+
+        Returns:
+            int: 淘汰后的总大小
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._exclusive():
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total > limit:
+                target = limit * LOW_WATERMARK
+                for _, size, path in sorted(entries):
+                    if total <= target:
+                        break
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                    total -= size
+
+        with self._lock:
+            self._size = total
+        return total
+
+    def clear(self):
+        """删除所有缓存文件"""
+        self.evict(max_bytes=0)
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
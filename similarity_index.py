@@ -0,0 +1,251 @@
+"""节奏型指纹、去重与相似度索引
+
+把节奏型映射到固定的 位置 × (鼓声部 + 重音) 网格上，编码为位掩码指纹：
+- 完全相同的节奏型指纹相同，可以用集合精确去重
+- 两个指纹异或后的置位数即Hamming距离（不同的音符数），
+  交集/并集的置位数给出Jaccard距离
+
+SimilarityIndex 把所有指纹保存为 uint64 矩阵，一次查询用向量化的
+异或和 np.bitwise_count 与全部已有指纹比较，每秒可完成数百万次比较
+（NumPy 2.0 之前没有 bitwise_count，改为按字节查表计数）。
+"""
+import numpy as np
+
+from beat_grid import beat_to_fraction
+from pattern_grid import DRUM_VOICES, PatternGrid
+
+# 每四分音符的网格位置数（12可同时表示16分音符和8分三连音）
+STEPS_PER_QUARTER = 12
+
+# 支持的距离度量
+METRICS = ('hamming', 'jaccard')
+
+# 每个字节值的置位数
+_BYTE_BITS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def _popcount_table(words):
+    """按字节查表计算每个 uint64 的置位数（NumPy 2.0 之前的替代实现）"""
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    return _BYTE_BITS[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+_popcount = getattr(np, 'bitwise_count', _popcount_table)
+
+
+def _slot(beat, steps_per_quarter):
+    """拍位置对应的网格位置（第1拍为0）"""
+    return round((beat_to_fraction(float(beat)) - 1) * steps_per_quarter)
+
+
+class Fingerprinter:
+    """把节奏型编码为固定长度的位掩码"""
+
+    def __init__(self, quarters=4, steps_per_quarter=STEPS_PER_QUARTER, voices=DRUM_VOICES):
+        """初始化指纹编码
+
+        Args:
+            quarters: 一个小节的四分音符数（6/8拍为3，7/8拍为3.5）
+            steps_per_quarter: 每四分音符的网格位置数，不在网格上的音符取最近的位置
+            voices: 鼓声部顺序，每个位置占 len(voices)+1 位（最后一位为重音）
+        """
+        self.steps_per_quarter = steps_per_quarter
+        self.voices = tuple(voices)
+        self.slots = int(round(quarters * steps_per_quarter))
+        self.width = len(self.voices) + 1
+        self.bits = self.slots * self.width
+        self.words = (self.bits + 63) // 64
+        self._voice_index = {name: i for i, name in enumerate(self.voices)}
+
+    def fingerprint(self, pattern):
+        """计算单个节奏型的指纹
+
+        Args:
+            pattern: 节奏型列表（或PatternGrid）
+
+        Returns:
+            int: 位掩码指纹，第 位置*width+声部 位表示该位置演奏该鼓
+        """
+        if isinstance(pattern, PatternGrid):
+            pattern = pattern.to_dicts()
+
+        value = 0
+        for note_info in pattern:
+            base = self._check_slot(_slot(note_info['beat'], self.steps_per_quarter)) * self.width
+            for drum in note_info['drums']:
+                value |= 1 << (base + self.voice(drum))
+            if note_info['accent']:
+                value |= 1 << (base + self.width - 1)
+        return value
+
+    def fingerprint_arrays(self, beats, hits, accents, voices=None):
+        """批量计算数组节奏型的指纹（如 VariantEngine.create_variants 的结果）
+
+        Args:
+            beats: 拍位置，形状 (steps,)
+            hits: 布尔数组，形状 (batch, steps, voices)
+            accents: 布尔数组，形状 (batch, steps)
+            voices: hits各列对应的鼓声部名称，默认与指纹的声部顺序相同
+
+        Returns:
+            np.ndarray: uint64矩阵，形状 (batch, words)
+        """
+        hits = np.asarray(hits, dtype=bool)
+        accents = np.asarray(accents, dtype=bool)
+        columns = [self.voice(name) for name in (voices or self.voices)]
+        slots = [self._check_slot(_slot(beat, self.steps_per_quarter)) for beat in beats]
+
+        grid = np.zeros((hits.shape[0], self.slots, self.width), dtype=bool)
+        for step, slot in enumerate(slots):
+            grid[:, slot, columns] |= hits[:, step]
+            grid[:, slot, -1] |= accents[:, step]
+        return self._pack(grid.reshape(len(grid), -1))
+
+    def to_words(self, value):
+        """把整数指纹转换为 uint64 数组"""
+        return np.frombuffer(value.to_bytes(self.words * 8, 'little'), dtype='<u8').astype(np.uint64)
+
+    def from_words(self, words):
+        """把 uint64 数组转换回整数指纹"""
+        return int.from_bytes(np.asarray(words, dtype='<u8').tobytes(), 'little')
+
+    def _pack(self, bits):
+        """把 (batch, bits) 布尔矩阵打包为 (batch, words) 的 uint64 矩阵"""
+        padded = np.zeros((len(bits), self.words * 64), dtype=bool)
+        padded[:, :bits.shape[1]] = bits
+        return np.packbits(padded, axis=1, bitorder='little').view('<u8').astype(np.uint64)
+
+    def voice(self, name):
+        """鼓声部在指纹中的位置"""
+        try:
+            return self._voice_index[name]
+        except KeyError:
+            raise KeyError(f"指纹中没有鼓声部: {name}") from None
+
+    def _check_slot(self, slot):
+        if not 0 <= slot < self.slots:
+            raise ValueError(f"网格位置 {slot} 超出小节范围（共 {self.slots} 个位置）")
+        return slot
+
+
+def hamming(a, b):
+    """两个整数指纹的Hamming距离"""
+    return (a ^ b).bit_count()
+
+
+def jaccard(a, b):
+    """两个整数指纹的Jaccard距离（都为空时为0）"""
+    union = (a | b).bit_count()
+    if union == 0:
+        return 0.0
+    return 1 - (a & b).bit_count() / union
+
+
+def distance(a, b, metric='hamming'):
+    """按度量计算两个整数指纹的距离"""
+    if metric == 'hamming':
+        return hamming(a, b)
+    if metric == 'jaccard':
+        return jaccard(a, b)
+    raise ValueError(f"未知的距离度量: {metric}")
+
+
+class SimilarityIndex:
+    """指纹的精确去重与最近邻查询"""
+
+    def __init__(self, fingerprinter=None, metric='hamming'):
+        """初始化索引
+
+        Args:
+            fingerprinter: 指纹编码，默认4/4拍、每四分音符12个位置
+            metric: 距离度量，'hamming'（不同的音符数）或 'jaccard'（0~1）
+        """
+        if metric not in METRICS:
+            raise ValueError(f"未知的距离度量: {metric}")
+        self.fingerprinter = fingerprinter or Fingerprinter()
+        self.metric = metric
+        self._seen = set()
+        self._words = np.zeros((16, self.fingerprinter.words), dtype=np.uint64)
+        self._counts = np.zeros(16, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, pattern):
+        return self._as_fingerprint(pattern) in self._seen
+
+    def add(self, pattern):
+        """加入节奏型（或整数指纹）
+
+        Returns:
+            bool: 是否为新节奏型（完全相同的已存在时不加入，返回False）
+        """
+        value = self._as_fingerprint(pattern)
+        if value in self._seen:
+            return False
+        self._seen.add(value)
+
+        if self._size == len(self._words):
+            self._words = np.concatenate([self._words, np.zeros_like(self._words)])
+            self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+        self._words[self._size] = self.fingerprinter.to_words(value)
+        self._counts[self._size] = value.bit_count()
+        self._size += 1
+        return True
+
+    def distances(self, pattern):
+        """计算节奏型与索引中所有指纹的距离
+
+        Returns:
+            np.ndarray: 按加入顺序排列的距离
+        """
+        value = self._as_fingerprint(pattern)
+        words = self._words[:self._size]
+        query = self.fingerprinter.to_words(value)
+
+        different = _popcount(words ^ query).sum(axis=1, dtype=np.int64)
+        if self.metric == 'hamming':
+            return different
+
+        # |A∪B| = (|A| + |B| + |A⊕B|) / 2，|A∩B| = |A∪B| - |A⊕B|
+        union = (self._counts[:self._size] + value.bit_count() + different) // 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(union > 0, different / union, 0.0)
+
+    def nearest(self, pattern):
+        """查找最近的节奏型
+
+        Returns:
+            tuple: (加入顺序中的序号, 距离)，索引为空时返回 (None, None)
+        """
+        if not self._size:
+            return None, None
+        distances = self.distances(pattern)
+        position = int(np.argmin(distances))
+        return position, distances[position].item()
+
+    def is_near(self, pattern, threshold):
+        """是否存在距离小于threshold的节奏型（threshold为0时只判断完全相同）"""
+        value = self._as_fingerprint(pattern)
+        if value in self._seen:
+            return True
+        if not self._size or threshold <= 0:
+            return False
+        return bool((self.distances(value) < threshold).any())
+
+    def add_if_distinct(self, pattern, threshold=0):
+        """与已有节奏型的距离都不小于threshold时加入
+
+        Returns:
+            bool: 是否加入
+        """
+        value = self._as_fingerprint(pattern)
+        if self.is_near(value, threshold):
+            return False
+        return self.add(value)
+
+    def _as_fingerprint(self, pattern):
+        if isinstance(pattern, int):
+            return pattern
+        return self.fingerprinter.fingerprint(pattern)
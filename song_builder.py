@@ -0,0 +1,116 @@
+"""流式生成长篇歌曲
+
+SongBuilder 按段落组合节奏型、变体和过门，逐小节生成并流式写入MIDI文件：
+每个小节的音符事件来自 DrumSheetGenerator 的单小节缓存，写出后即释放，
+内存占用与歌曲长度无关，可以生成上千小节的伴奏轨。
+"""
+import os
+import random
+from collections import namedtuple
+
+import midi_writer
+from pattern_grid import PatternGrid
+from random_drumsheet import DrumSheetGenerator
+
+SongSection = namedtuple('SongSection', [
+    'pattern',       # 段落使用的节奏型
+    'bars',          # 段落小节数
+    'variant_type',  # 每小节应用的变体类型（None表示原样重复）
+    'fill',          # 过门节奏型（None表示没有过门）
+    'fill_every',    # 每隔多少小节插入一次过门（None表示只在段落最后一小节）
+])
+
+
+class SongBuilder:
+    """按段落组织的流式歌曲生成器"""
+
+    def __init__(self, generator=None, seed=None):
+        """初始化歌曲生成器
+
+        Args:
+            generator: 用于计算小节事件的DrumSheetGenerator，默认新建一个
+            seed: 随机种子，给出时变体序列可复现
+        """
+        self.generator = generator or DrumSheetGenerator(engine='direct')
+        self.seed = seed
+        self.sections = []
+
+    def add_section(self, pattern, bars, variant_type=None, fill=None, fill_every=None):
+        """添加一个段落
+
+        Args:
+            pattern: 节奏型列表（或PatternGrid）
+            bars: 小节数
+            variant_type: 每小节应用的变体类型 ('snare', 'bass', 'random', 'all')
+            fill: 过门节奏型
+            fill_every: 每隔多少小节插入一次过门，默认只在段落最后一小节
+
+        Returns:
+            SongBuilder: 自身，便于链式调用
+        """
+        self.sections.append(SongSection(pattern, bars, variant_type, fill, fill_every))
+        return self
+
+    def __len__(self):
+        """歌曲总小节数"""
+        return sum(section.bars for section in self.sections)
+
+    def iter_bars(self):
+        """逐小节生成节奏型
+
+        Yields:
+            list: 每个小节使用的节奏型
+        """
+        if self.seed is not None:
+            random.seed(self.seed)
+
+        for section in self.sections:
+            for bar in range(section.bars):
+                if section.fill is not None and self._is_fill_bar(section, bar):
+                    pattern = section.fill
+                elif section.variant_type:
+                    pattern = self.generator.create_pattern_variant(section.pattern, section.variant_type)
+                else:
+                    pattern = section.pattern
+
+                if isinstance(pattern, PatternGrid):
+                    pattern = pattern.to_dicts()
+                yield pattern
+
+    @staticmethod
+    def _is_fill_bar(section, bar):
+        """判断段落中的第bar小节（0基础）是否为过门"""
+        if section.fill_every:
+            return (bar + 1) % section.fill_every == 0
+        return bar == section.bars - 1
+
+    def write(self, file):
+        """流式写入MIDI文件
+
+        Args:
+            file: 文件路径，或以二进制模式打开、可seek的文件对象
+
+        Returns:
+            int: 写入的小节数
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as fileobj:
+                return self.write(fileobj)
+
+        generator = self.generator
+        bar_length = generator.bar_ticks
+        bars_written = 0
+
+        with midi_writer.MidiStreamWriter(
+                file,
+                bpm=generator.bpm,
+                numerator=generator.numerator,
+                denominator=generator.denominator,
+                channel=generator.midi_channel - 1) as writer:
+            for bar, pattern in enumerate(self.iter_bars()):
+                bar_offset = bar * bar_length
+                notes = generator.events_to_midi_notes(generator.bar_events(pattern), bar_offset)
+                writer.write_notes(notes, until=bar_offset + bar_length)
+                bars_written += 1
+
+        return bars_written
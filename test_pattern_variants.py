@@ -103,6 +103,1013 @@ def test_custom_probabilities():
 
         print(f"  文件: {midi_path}")
 
+def test_direct_engine():
+    """测试direct引擎与music21引擎输出逐字节一致"""
+    print("\n\n测试direct渲染引擎")
+    print("=" * 50)
+
+    from music21 import midi
+
+    pattern_methods = [
+        ('standard_rock', RhythmPatterns.standard_rock),
+        ('disco_pattern', RhythmPatterns.disco_pattern),
+        ('shuffle_pattern', RhythmPatterns.shuffle_pattern),
+        ('funk_pattern', RhythmPatterns.funk_pattern),
+        ('ballad_pattern', RhythmPatterns.ballad_pattern),
+        ('reggae_pattern', RhythmPatterns.reggae_pattern)
+    ]
+
+    for pattern_name, pattern_method in pattern_methods:
+        pattern = pattern_method()
+
+        # music21路径
+        generator = DrumSheetGenerator(engine='music21')
+        generator.generate_from_pattern(pattern, bars=4)
+        generator.score.append(generator.drum_part)
+        expected = midi.translate.streamToMidiFile(generator.score).writestr()
+
+        # direct路径
+        generator = DrumSheetGenerator(engine='direct')
+        generator.generate_from_pattern(pattern, bars=4)
+        actual = generator.to_midi_bytes()
+
+        assert actual == expected, f"{pattern_name} 两种引擎输出不一致"
+        print(f"  {pattern_name}: {len(actual)} 字节，一致")
+
+def test_batch_generation():
+    """测试批量生成：多进程与单进程结果一致"""
+    print("\n\n测试批量变体生成")
+    print("=" * 50)
+
+    from batch_generator import generate_batch
+
+    patterns = {
+        'standard_rock': RhythmPatterns.standard_rock(),
+        'shuffle_pattern': RhythmPatterns.shuffle_pattern(),
+    }
+    variant_types = ['snare', 'all']
+
+    def collect(max_workers):
+        results = generate_batch(patterns, variant_types, count=8, seeds=42,
+                                 max_workers=max_workers, chunk_size=4)
+        return {(r.pattern_name, r.variant_type, r.index): r.midi_bytes for r in results}
+
+    serial = collect(1)
+    parallel = collect(2)
+
+    assert len(serial) == len(patterns) * len(variant_types) * 8
+    assert serial == parallel, "多进程与单进程生成结果不一致"
+    print(f"  生成 {len(parallel)} 个变体，结果可复现")
+
+    # 种子列表长度不对时在调用处立即报错
+    try:
+        generate_batch(patterns, variant_types, count=8, seeds=[1, 2, 3])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("种子数量不一致时没有立即报错")
+
+    # 启用人性化且未固定种子时，结果同样只由任务种子决定
+    import copy
+    import os
+    import tempfile
+    import yaml
+
+    run_config = copy.deepcopy(DrumSheetGenerator.load_yaml("./configs/run_configs.yaml"))
+    run_config['humanize'].update(enabled=True, seed=None)
+    with tempfile.TemporaryDirectory() as directory:
+        run_config_path = os.path.join(directory, 'run_configs.yaml')
+        with open(run_config_path, 'w', encoding='utf-8') as file:
+            yaml.safe_dump(run_config, file)
+
+        def humanized(max_workers, state):
+            random.seed(state)
+            results = generate_batch(patterns, ['all'], count=3, seeds=7, max_workers=max_workers,
+                                     chunk_size=1, run_config_path=run_config_path)
+            return {(r.pattern_name, r.index): r.midi_bytes for r in results}
+
+        first = humanized(1, 1)
+        assert first == humanized(1, 2) == humanized(2, 3), "启用人性化时批量结果应可复现"
+        assert len(set(first.values())) == len(first)
+    print("  启用人性化时结果同样可复现")
+
+def test_pattern_grid():
+    """测试数组节奏型：与字典格式互相转换、变体结果一致"""
+    print("\n\n测试PatternGrid节奏型")
+    print("=" * 50)
+
+    from pattern_grid import PatternGrid
+
+    generator = DrumSheetGenerator(engine='direct')
+
+    for pattern_name in ['standard_rock', 'disco_pattern', 'shuffle_pattern',
+                         'funk_pattern', 'ballad_pattern', 'reggae_pattern']:
+        pattern = getattr(RhythmPatterns, pattern_name)()
+        grid = PatternGrid.from_dicts(pattern)
+        assert grid.to_dicts() == pattern, f"{pattern_name} 转换结果不一致"
+
+        # 相同种子下，数组版本与字典版本生成相同的军鼓/底鼓变体
+        for variant_type in ['snare', 'bass']:
+            random.seed(7)
+            expected = generator.create_pattern_variant(pattern, variant_type)
+            random.seed(7)
+            actual = generator.create_pattern_variant(grid, variant_type)
+            assert actual == PatternGrid.from_dicts(expected)
+
+        # 写时复制：修改克隆不影响原节奏型
+        variant = generator.create_pattern_variant(grid, 'all')
+        assert grid.to_dicts() == pattern
+        print(f"  {pattern_name}: {grid!r} -> {variant!r}")
+
+    # 调用方传入的数组不会被标记为只读
+    import numpy as np
+    beats, hits, accents = np.array([1.0, 2.0]), np.zeros((2, 2), dtype=bool), np.zeros(2, dtype=bool)
+    shared = PatternGrid(beats, hits, accents, ('bass', 'snare'))
+    clone = shared.copy()
+    clone.writable_hits()[0, 0] = True
+    assert beats.flags.writeable and hits.flags.writeable and accents.flags.writeable
+    assert not hits.any() and not shared.hits.any()
+
+def test_variant_engine():
+    """测试向量化变体引擎：可复现、不清空音符、不修改原节奏型"""
+    print("\n\n测试向量化变体引擎")
+    print("=" * 50)
+
+    from pattern_grid import PatternGrid
+    from variant_engine import VariantEngine
+
+    grid = PatternGrid.from_dicts(RhythmPatterns.funk_pattern())
+    original = grid.to_dicts()
+
+    for variant_type in ['snare', 'bass', 'random', 'all']:
+        hits, accents = VariantEngine(seed=42).create_variants(grid, variant_type, count=1000)
+        again, _ = VariantEngine(seed=42).create_variants(grid, variant_type, count=1000)
+
+        assert hits.shape == (1000,) + grid.hits.shape
+        assert (hits == again).all(), "相同种子生成的变体不一致"
+        assert hits.any(axis=-1).all(), "变体中出现了没有任何鼓的位置"
+        print(f"  {variant_type}: 平均音符数 {hits.sum(axis=(1, 2)).mean():.2f}")
+
+    # random模式不移除bass和snare
+    hits, accents = VariantEngine(seed=42).create_variants(grid, 'random', count=1000)
+    for drum in ('bass', 'snare'):
+        column = grid.voice(drum)
+        assert hits[..., column][:, grid.hits[:, column]].all(), f"random模式移除了{drum}"
+    assert (accents == grid.accents).all()
+
+    # 新增的军鼓设为重音
+    hits, accents = VariantEngine(seed=42).create_variants(grid, 'snare', count=1000)
+    snare = grid.voice('snare')
+    added = hits[..., snare] & ~grid.hits[:, snare]
+    assert added.any() and accents[added].all(), "新增的军鼓没有设为重音"
+
+    # 缺少bass/snare声部时给出明确错误
+    try:
+        VariantEngine(seed=42).mutate(grid.hits[None, :, :1], grid.accents[None], grid.voices[:1], 'snare')
+    except KeyError as error:
+        assert '节奏型中没有鼓声部: snare' in str(error)
+    else:
+        raise AssertionError("缺少snare声部时没有报错")
+
+    assert grid.to_dicts() == original
+
+def test_generator_reuse():
+    """测试生成器复用：渲染不修改状态，重复生成不累积声部"""
+    print("\n\n测试生成器复用")
+    print("=" * 50)
+
+    generator = DrumSheetGenerator()
+    rock = RhythmPatterns.standard_rock()
+    funk = RhythmPatterns.funk_pattern()
+
+    generator.generate_from_pattern(rock, bars=2)
+    events = list(generator.events)
+
+    # render 使用独立的状态，不影响已生成的内容
+    score = generator.render(funk, bars=2)
+    assert generator.events == events
+    assert len(score.getElementsByClass('Part')) == 1
+
+    # 多次构建乐谱时声部不会累积
+    generator.build_score()
+    assert len(generator.build_score().getElementsByClass('Part')) == 1
+
+    # 复用同一实例生成与新实例相同的结果
+    generator.generate_from_pattern(funk, bars=2)
+    fresh = DrumSheetGenerator()
+    fresh.generate_from_pattern(funk, bars=2)
+    assert generator.to_midi_bytes() == fresh.to_midi_bytes() == generator.render_midi(funk, bars=2)
+    print("  复用生成器结果一致")
+
+def test_song_builder():
+    """测试流式歌曲生成：与一次性渲染结果逐字节一致"""
+    print("\n\n测试流式歌曲生成")
+    print("=" * 50)
+
+    import io
+    from song_builder import SongBuilder
+
+    pattern = RhythmPatterns.shuffle_pattern()
+
+    generator = DrumSheetGenerator(engine='direct')
+    generator.generate_from_pattern(pattern, bars=32)
+
+    buffer = io.BytesIO()
+    bars = SongBuilder(generator).add_section(pattern, 32).write(buffer)
+    assert bars == 32
+    assert buffer.getvalue() == generator.to_midi_bytes()
+
+    # 混合段落、变体和过门
+    song = (SongBuilder(seed=42)
+            .add_section(RhythmPatterns.standard_rock(), 16, 'all', fill=RhythmPatterns.funk_pattern(), fill_every=4)
+            .add_section(RhythmPatterns.disco_pattern(), 16, fill=RhythmPatterns.funk_pattern()))
+    buffer = io.BytesIO()
+    assert song.write(buffer) == len(song) == 32
+    print(f"  {len(song)} 小节，{len(buffer.getvalue())} 字节")
+
+def test_in_memory_output():
+    """测试内存输出：to_bytes/write与归档打包"""
+    print("\n\n测试内存MIDI输出")
+    print("=" * 50)
+
+    import io
+    import zipfile
+
+    pattern = RhythmPatterns.funk_pattern()
+
+    for engine in ['music21', 'direct']:
+        generator = DrumSheetGenerator(engine=engine)
+        generator.generate_from_pattern(pattern, bars=4)
+        buffer = io.BytesIO()
+        assert generator.write(buffer) == len(generator.to_bytes())
+        assert buffer.getvalue() == generator.to_bytes()
+
+    generator = DrumSheetGenerator(engine='direct')
+    grooves = [(f"{name}.mid", getattr(RhythmPatterns, name)())
+               for name in ['standard_rock', 'shuffle_pattern', 'reggae_pattern']]
+    buffer = io.BytesIO()
+    assert generator.write_archive(buffer, grooves, bars=2) == 3
+
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as archive:
+        for filename, groove in grooves:
+            assert archive.read(filename) == generator.render_midi(groove, bars=2)
+    print(f"  归档 {len(grooves)} 个文件，{len(buffer.getvalue())} 字节")
+
+def test_beat_grid():
+    """测试精确的整数tick节拍网格：三连音、五连音和6/8拍"""
+    print("\n\n测试整数tick节拍网格")
+    print("=" * 50)
+
+    from fractions import Fraction
+    from beat_grid import TICKS_PER_QUARTER, beat_to_fraction
+
+    assert beat_to_fraction(1.67) == Fraction(5, 3)
+    assert beat_to_fraction(1.33) == Fraction(4, 3)
+    assert beat_to_fraction(1.2) == Fraction(6, 5)
+    assert beat_to_fraction(1.0625) == Fraction(17, 16)
+
+    generator = DrumSheetGenerator(engine='direct')
+
+    # Shuffle：三连音的第1、3个音落在网格上，时长为到下一个音符的间隔
+    events = generator.bar_events(RhythmPatterns.shuffle_pattern())
+    third = TICKS_PER_QUARTER // 3
+    assert [event[0] for event in events[:3]] == [0, 2 * third, 3 * third]
+    assert [event[2] for event in events[:2]] == [2 * third, third]
+    assert all(isinstance(value, int) for event in events for value in (event[0], event[2]))
+
+    # 五连音：相邻音符间隔相同，没有取整误差
+    quintuplet = [{'beat': round(1 + i / 5, 2), 'drums': ['snare'], 'accent': i == 0} for i in range(5)]
+    events = generator.bar_events(quintuplet)
+    assert {event[2] for event in events} == {TICKS_PER_QUARTER // 5}
+    print(f"  Shuffle和五连音均精确落在 {TICKS_PER_QUARTER} PPQ 网格上")
+
+    # 6/8拍：每小节3个四分音符
+    run_config = dict(generator.run_config, numerator=6, denominator=8)
+    compound = DrumSheetGenerator(engine='direct', run_config=run_config)
+    compound.generate_from_pattern([{'beat': 1.0, 'drums': ['bass'], 'accent': True}], bars=2)
+    assert [event[0] for event in compound.events] == [0, 3 * TICKS_PER_QUARTER]
+    print(f"  6/8拍小节长度: {compound.bar_ticks} tick")
+
+def test_pattern_library():
+    """测试节奏型库：二进制文件往返、按名称查找和筛选"""
+    print("\n\n测试节奏型库")
+    print("=" * 50)
+
+    import os
+    import tempfile
+    from pattern_library import PatternLibrary
+
+    library = PatternLibrary.builtin()
+    assert library.get('funk_pattern') == RhythmPatterns.funk_pattern()
+    assert library.info('shuffle_pattern').style == 'shuffle'
+
+    # 扩充一个小语料：同一节奏型在不同拍号和风格下
+    entries = [{'name': name, 'style': library.info(name).style, 'pattern': library.get(name)} for name in library]
+    entries.append({'name': 'waltz', 'style': 'ballad', 'time_signature': '3/4', 'pattern': [
+        {'beat': 1.0, 'drums': ['bass'], 'accent': True},
+        {'beat': 2.0, 'drums': ['ride'], 'accent': False},
+        {'beat': 3.0, 'drums': ['ride'], 'accent': False},
+    ]})
+    corpus = PatternLibrary.from_entries(entries)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'grooves.lib')
+        corpus.save(path)
+        loaded = PatternLibrary.load(path)
+
+        assert len(loaded) == len(corpus) == 7
+        for name in corpus:
+            assert loaded.get(name) == corpus.get(name)
+            assert loaded.grid(name) == corpus.grid(name)
+
+        assert loaded.query(style='ballad') == ['ballad_pattern', 'waltz']
+        assert loaded.query(time_signature='3/4') == ['waltz']
+        assert loaded.query(uses=['ride']) == ['waltz']
+        assert loaded.query(excludes=['closed_hihat'], style='ballad') == ['waltz']
+        assert loaded.query(min_density=3.5) == ['disco_pattern', 'funk_pattern']
+        print(f"  库文件 {os.path.getsize(path)} 字节，{len(loaded)} 个节奏型")
+        del loaded
+
+def test_midi_importer():
+    """测试MIDI导入：生成的文件导回节奏型，人工演奏的偏差被量化"""
+    print("\n\n测试MIDI导入")
+    print("=" * 50)
+
+    import os
+    import tempfile
+    import midi_writer
+    from midi_importer import import_directory, midi_to_patterns, note_name_map
+
+    generator = DrumSheetGenerator(engine='direct')
+    names = ['standard_rock', 'shuffle_pattern', 'funk_pattern']
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            os.makedirs(os.path.join(directory, name))
+            generator.generate_from_pattern(getattr(RhythmPatterns, name)(), bars=4)
+            with open(os.path.join(directory, name, 'groove.mid'), 'wb') as file:
+                generator.write(file)
+
+        # 生成器输出在通道1，默认读取所有通道；重复的小节只保留一个
+        serial = list(import_directory(directory, max_workers=1))
+        parallel = list(import_directory(directory, max_workers=2))
+        assert list(import_directory(directory, channel=10, max_workers=1)) == []
+        assert serial == parallel
+        assert [entry['name'] for entry in serial] == [f"{name}/groove_bar1" for name in sorted(names)]
+        for entry in serial:
+            assert entry['pattern'] == getattr(RhythmPatterns, entry['style'])()
+        print(f"  导入 {len(names)} 个文件，得到 {len(serial)} 个节奏型")
+
+    # GM通道10、480 PPQ、带演奏偏差的音符
+    notes = [(3, 36, 100, 110), (320, 42, 100, 60), (955, 40, 100, 80), (1916, 42, 100, 100)]
+    data = midi_writer.notes_to_midi_bytes(notes, ticks_per_quarter=480, channel=9)
+    time_signature, patterns = midi_to_patterns(data, note_name_map(generator.midi_config))
+    assert time_signature == '4/4'
+    assert patterns == [
+        (0, [{'beat': 1.0, 'drums': ['bass'], 'accent': True},
+             {'beat': 1.67, 'drums': ['closed_hihat'], 'accent': False},
+             {'beat': 3.0, 'drums': ['snare'], 'accent': False}]),
+        (1, [{'beat': 1.0, 'drums': ['closed_hihat'], 'accent': True}]),
+    ]
+
+def test_similarity_index():
+    """测试指纹去重与相似度索引，以及批量生成中的去重"""
+    print("\n\n测试相似度索引")
+    print("=" * 50)
+
+    import copy
+    from batch_generator import generate_batch
+    from pattern_grid import PatternGrid
+    import numpy as np
+    from similarity_index import Fingerprinter, SimilarityIndex, hamming, _popcount_table
+    from variant_engine import VariantEngine
+
+    # 旧版NumPy使用的查表计数与逐个整数计数一致
+    words = np.random.default_rng(0).integers(0, 2 ** 63, size=(50, 3), dtype=np.uint64) << np.uint64(1)
+    assert _popcount_table(words).tolist() == [[int(word).bit_count() for word in row] for row in words]
+
+    fingerprinter = Fingerprinter()
+    rock = RhythmPatterns.standard_rock()
+    disco = RhythmPatterns.disco_pattern()
+
+    # disco比rock多两个底鼓
+    assert hamming(fingerprinter.fingerprint(rock), fingerprinter.fingerprint(disco)) == 2
+    assert fingerprinter.fingerprint(rock) == fingerprinter.fingerprint(PatternGrid.from_dicts(rock))
+
+    # 批量指纹与逐个计算一致
+    grid = PatternGrid.from_dicts(rock)
+    hits, accents = VariantEngine(seed=0).create_variants(grid, 'all', count=100)
+    words = fingerprinter.fingerprint_arrays(grid.beats, hits, accents, grid.voices)
+    for i in range(100):
+        variant = PatternGrid(grid.beats, hits[i], accents[i], grid.voices)
+        assert fingerprinter.from_words(words[i]) == fingerprinter.fingerprint(variant)
+
+    index = SimilarityIndex(fingerprinter)
+    assert index.add(rock) and not index.add(copy.deepcopy(rock))
+    assert index.nearest(disco) == (0, 2)
+    assert index.is_near(disco, 3) and not index.is_near(disco, 2)
+
+    # 批量生成去重：结果两两不同，且多进程与单进程一致
+    patterns = {'standard_rock': rock}
+
+    def collect(max_workers):
+        results = generate_batch(patterns, ['snare'], count=40, seeds=7, max_workers=max_workers,
+                                 chunk_size=8, min_distance=2)
+        return [(r.index, fingerprinter.fingerprint(r.pattern)) for r in results]
+
+    serial = collect(1)
+    assert serial == collect(2)
+    values = [value for _, value in serial]
+    original = fingerprinter.fingerprint(rock)
+    assert all(hamming(value, original) >= 2 for value in values)
+    assert all(hamming(a, b) >= 2 for i, a in enumerate(values) for b in values[i + 1:])
+    print(f"  40个军鼓变体去重后保留 {len(values)} 个")
+
+def test_groove_sampler():
+    """测试按配置概率从零生成随机节奏型"""
+    print("\n\n测试随机节奏型生成")
+    print("=" * 50)
+
+    from collections import Counter
+    from groove_sampler import AliasTable, GrooveSampler
+
+    # 别名表抽样频率符合权重
+    rng = random.Random(0)
+    table = AliasTable(['a', 'b', 'c'], [1, 2, 7])
+    counts = Counter(table.draw(rng) for _ in range(20000))
+    assert abs(counts['c'] / 20000 - 0.7) < 0.02 and abs(counts['a'] / 20000 - 0.1) < 0.02
+
+    generator = DrumSheetGenerator(engine='direct')
+    bars = GrooveSampler(generator, seed=1).sample_bars(500)
+    assert bars == GrooveSampler(generator, seed=1).sample_bars(500), "相同种子结果应一致"
+
+    for pattern in bars:
+        assert pattern[0]['beat'] == 1.0, "每小节第一个位置总会发声"
+        beats = [note_info['beat'] for note_info in pattern]
+        assert beats == sorted(set(beats)) and all(1 <= beat < 5 for beat in beats)
+        for note_info in pattern:
+            drums = note_info['drums']
+            assert 1 <= len(drums) <= 3 and len(set(drums)) == len(drums)
+            assert not {'closed_hihat', 'open_hihat'} <= set(drums)
+
+    # 权重高的鼓出现得更多
+    drums = Counter(drum for pattern in bars for note_info in pattern for drum in note_info['drums'])
+    assert drums['closed_hihat'] > drums['open_hihat'] > drums['crash']
+
+    random.seed(5)
+    pattern = generator.create_random_pattern()
+    generator.generate_from_pattern(pattern, bars=2)
+    assert generator.to_bytes()
+    print(f"  生成 {len(bars)} 个随机小节，平均每小节 {sum(map(len, bars)) / len(bars):.1f} 个音符")
+
+def test_live_player():
+    """测试实时播放：小节线处切换节奏型、发送延迟统计"""
+    print("\n\n测试实时播放")
+    print("=" * 50)
+
+    import asyncio
+    from live_player import LATENCY_WINDOW, LivePlayer
+    from midi_importer import parse_midi
+
+    rock, funk = RhythmPatterns.standard_rock(), RhythmPatterns.funk_pattern()
+    generator = DrumSheetGenerator(engine='direct')
+    generator.bpm = 480  # 每小节0.5秒，缩短测试时间
+    player = LivePlayer(rock, generator)
+
+    played = []
+
+    def on_bar(bar, pattern):
+        played.append(pattern)
+        if bar == 1:
+            # 在第2小节中间切换，第3小节开始生效
+            asyncio.get_running_loop().call_later(player.bar_seconds / 2, player.switch, funk)
+
+    assert player.run(4, on_bar) == 4
+    assert played == [rock, rock, funk, funk]
+
+    # 发送的音符与逐小节渲染一致
+    expected = sum(len(generator.events_to_midi_notes(generator.bar_events(pattern))) for pattern in played)
+    messages = player.sink.messages
+    assert sum(message[0] & 0xF0 == 0x90 for _, message in messages) == expected
+    assert len(messages) == 2 * expected
+    assert [t for t, _ in messages] == sorted(t for t, _ in messages)
+
+    recorded = parse_midi(player.sink.to_midi_bytes(bpm=generator.bpm))
+    assert len(recorded.notes) == expected
+
+    stats = player.jitter_stats()
+    assert stats.events == len(messages)  # 延迟数值受调度影响，只打印，不做断言
+    print(f"  {stats.events} 个消息，平均延迟 {stats.mean_ms:.3f} ms，"
+          f"p99 {stats.p99_ms:.3f} ms，最大 {stats.max_ms:.3f} ms")
+
+    # 长时间播放：延迟窗口定长，消息数、平均值和最大值仍覆盖整个会话
+    player.reset_stats()
+    for index in range(LATENCY_WINDOW + 500):
+        player._record_latency(0.002 if index == 0 else 0.001)
+    stats = player.jitter_stats()
+    assert len(player._latencies) == LATENCY_WINDOW
+    assert stats.events == LATENCY_WINDOW + 500 and stats.max_ms == 2.0 and stats.p99_ms == 1.0
+
+def test_humanizer():
+    """测试力度与时间人性化：可复现、逐小节与整首一致、鬼音"""
+    print("\n\n测试力度与时间人性化")
+    print("=" * 50)
+
+    import copy
+    import io
+    from humanizer import Humanizer
+    from song_builder import SongBuilder
+
+    pattern = RhythmPatterns.funk_pattern()
+    run_config = copy.deepcopy(DrumSheetGenerator.load_yaml("./configs/run_configs.yaml"))
+    run_config['humanize'].update(enabled=True, seed=7, ghost_probability=0.2)
+
+    generator = DrumSheetGenerator(run_config=run_config)
+    generator.generate_from_pattern(pattern, bars=16)
+    notes = generator.midi_notes()
+    assert notes == DrumSheetGenerator(run_config=run_config).humanizer.apply(
+        DrumSheetGenerator().events_to_midi_notes(generator.events)), "相同种子结果应一致"
+
+    # 逐小节流式写入与整首一次处理逐字节相同
+    buffer = io.BytesIO()
+    SongBuilder(generator).add_section(pattern, 16).write(buffer)
+    assert buffer.getvalue() == generator.to_bytes()
+
+    plain = DrumSheetGenerator().events_to_midi_notes(generator.events)
+    snare = generator.midi_config['snare']
+    ghosts = notes[len(plain):]
+    assert ghosts and all(pitch == snare and 20 <= velocity <= 40 for _, pitch, _, velocity in ghosts)
+    assert all(1 <= velocity <= 127 for *_, velocity in notes)
+    assert len({velocity for *_, velocity in notes}) > 10, "力度应有变化"
+    for (tick, *_), (original, *_) in zip(notes, plain):
+        assert tick >= original - original % generator.bar_ticks, "音符不应移到所属小节之前"
+
+    # music21引擎开启人性化时同样直接写出音符
+    generator = DrumSheetGenerator(engine='music21', run_config=run_config)
+    generator.generate_from_pattern(pattern, bars=2)
+    assert generator.to_bytes() == generator.to_midi_bytes()
+
+    # 不同种子结果不同
+    other = Humanizer(generator.midi_config, seed=8).apply(plain)
+    assert other != Humanizer(generator.midi_config, seed=7).apply(plain)
+    print(f"  {len(plain)} 个音符，加入 {len(ghosts)} 个鬼音")
+
+def test_instrumentation():
+    """测试计时与计数：记录各阶段，关闭后恢复原方法"""
+    print("\n\n测试计时与计数")
+    print("=" * 50)
+
+    import copy
+    import json
+    import os
+    import tempfile
+    import instrumentation
+
+    originals = {name: DrumSheetGenerator.__dict__[name] for name in
+                 ['load_yaml', 'create_pattern_variant', 'generate_from_pattern', 'to_bytes', 'save_midi']}
+
+    with tempfile.TemporaryDirectory() as output_path:
+        run_config = copy.deepcopy(DrumSheetGenerator.load_yaml("./configs/run_configs.yaml"))
+        run_config['output_path'] = output_path
+
+        instrumentation.reset()
+        with instrumentation.recording():
+            assert instrumentation.is_enabled()
+            generator = DrumSheetGenerator(run_config=run_config)
+            variant = generator.create_pattern_variant(RhythmPatterns.standard_rock(), 'all')
+            generator.generate_from_pattern(variant, bars=4)
+            path = generator.save_midi("instrumented.mid")
+
+        report = instrumentation.snapshot()
+        stats_path = os.path.join(output_path, "stats.json")
+        instrumentation.write_json(stats_path)
+        with open(stats_path, encoding='utf-8') as file:
+            assert json.load(file) == report
+
+        notes = sum(len(variant_info['drums']) for variant_info in variant) * 4
+        assert report['counters']['notes_created'] == notes > len(generator.events)
+        assert report['counters']['bytes_written'] == os.path.getsize(path)
+        assert report['counters']['files_saved'] == 1
+        for stage in ['load_yaml', 'create_pattern_variant', 'generate_from_pattern', 'to_bytes', 'save_midi']:
+            stats = report['stages'][stage]
+            assert stats['calls'] >= 1 and sum(stats['histogram_us'].values()) == stats['calls']
+
+    # 关闭后方法恢复原样，没有额外开销
+    assert not instrumentation.is_enabled()
+    assert all(DrumSheetGenerator.__dict__[name] is original for name, original in originals.items())
+    print(instrumentation.format_report())
+    instrumentation.reset()
+
+def test_arrangement():
+    """测试多段落编曲：速度/拍号变化、多声部叠加与k路归并"""
+    print("\n\n测试多段落编曲")
+    print("=" * 50)
+
+    import struct
+    from arrangement import Arrangement
+    from midi_importer import parse_midi
+
+    # 单段落单声部与一次性渲染逐字节相同
+    generator = DrumSheetGenerator(engine='direct')
+    generator.generate_from_pattern(RhythmPatterns.shuffle_pattern(), bars=8)
+    assert Arrangement(generator).add_section(RhythmPatterns.shuffle_pattern(), 8).to_midi_bytes() == \
+        generator.to_midi_bytes()
+
+    arrangement = (Arrangement(seed=3)
+                   .add_section(RhythmPatterns.standard_rock(), 4, variant_type='all')
+                   .add_section(RhythmPatterns.ballad_pattern(), 2, bpm=90, time_signature='3/4',
+                                layers={'Shaker': RhythmPatterns.disco_pattern()})
+                   .add_section(RhythmPatterns.funk_pattern(), 4, bpm=90, time_signature='4/4'))
+    assert len(arrangement) == 10
+    assert arrangement.tracks() == ['Percussion', 'Shaker']
+    assert [start for start, *_ in arrangement.tempo_map()] == [0, 4 * 4 * 10080, 4 * 4 * 10080 + 2 * 3 * 10080]
+
+    data = arrangement.to_midi_bytes()
+    assert data == arrangement.to_midi_bytes(), "相同种子结果应一致"
+    assert struct.unpack('>H', data[10:12])[0] == 3  # 指挥轨 + 两个声部
+    conductor = data[14:14 + 8 + struct.unpack('>I', data[18:22])[0]]
+    assert conductor.count(b'\xff\x51\x03') == 2, "速度只在变化时写出"
+    assert conductor.count(b'\xff\x58\x04') == 3
+
+    sections = arrangement.sections
+    expected = sum(len(generator.events_to_midi_notes(
+        generator.bar_events(pattern, sections[index].numerator, sections[index].denominator)))
+        for index, _, layers in arrangement.iter_bars() for _, pattern in layers)
+    assert len(parse_midi(data).notes) == expected
+
+    # 4/4节奏型用于3/4段落时，超出小节的音符被丢弃，不会落入段落之后
+    waltz = Arrangement().add_section(RhythmPatterns.standard_rock(), 2, time_signature='3/4')
+    ticks = [tick for tick, *_ in parse_midi(waltz.to_midi_bytes()).notes]
+    assert max(ticks) < 2 * 3 * 10080, "音符不应落在段落结束之后"
+    assert len(ticks) == 2 * sum(len(note['drums']) for note in RhythmPatterns.standard_rock() if note['beat'] < 4)
+
+    # music21引擎构建多声部乐谱
+    arrangement.generator = DrumSheetGenerator(engine='music21')
+    score = arrangement.build_score()
+    assert len(score.parts) == 2 and arrangement.to_bytes()
+    print(f"  {len(arrangement)} 小节，{len(arrangement.tracks())} 个声部，{len(data)} 字节")
+
+def test_render_cache():
+    """测试按内容寻址的渲染缓存：命中、键的区分、LRU淘汰与并发写入"""
+    print("\n\n测试渲染缓存")
+    print("=" * 50)
+
+    import copy
+    import os
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from render_cache import RenderCache
+
+    pattern = RhythmPatterns.funk_pattern()
+    with tempfile.TemporaryDirectory() as directory:
+        run_config = copy.deepcopy(DrumSheetGenerator.load_yaml("./configs/run_configs.yaml"))
+        run_config['render_cache'] = {'enabled': True, 'path': directory, 'max_mb': 1}
+
+        generator = DrumSheetGenerator(engine='music21', run_config=run_config)
+        generator.generate_from_pattern(pattern, bars=4)
+        first = generator.to_bytes()
+        generator.generate_from_pattern(copy.deepcopy(pattern), bars=4)
+        assert generator.to_bytes() == first
+        assert (generator.render_cache.hits, generator.render_cache.misses) == (1, 1)
+
+        # 结果与不使用缓存时相同；小节数、速度不同时不会命中
+        plain = DrumSheetGenerator(engine='music21')
+        plain.generate_from_pattern(pattern, bars=4)
+        assert plain.to_bytes() == first
+        generator.generate_from_pattern(pattern, bars=2)
+        assert generator.to_bytes() != first
+        generator.bpm = 90
+        generator.generate_from_pattern(pattern, bars=4)
+        assert generator.to_bytes() != first
+        assert generator.render_cache.misses == 3
+
+        # 直接用 add_note 修改的内容不使用缓存
+        generator.add_note('snare', 2520, 0)
+        assert generator._cache_key() is None
+
+        # 多个缓存实例（相当于多个工作进程）同时写入同一目录
+        caches = [RenderCache(directory, max_bytes=8 * 1024) for _ in range(4)]
+
+        def fill(cache):
+            for index in range(40):
+                key = f"{index:040x}"
+                cache.put(key, b'MThd' + bytes(400))
+                assert cache.get(key) in (None, b'MThd' + bytes(400))
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(fill, caches))
+        total = sum(os.path.getsize(os.path.join(root, name))
+                    for root, _, files in os.walk(directory) for name in files if name.endswith('.mid'))
+        assert caches[0].evict() <= 8 * 1024 and total <= 8 * 1024 * 2
+        assert not [name for _, _, files in os.walk(directory) for name in files if name.endswith('.tmp')]
+
+        caches[0].clear()
+        assert len(caches[0]) == 0
+
+        # 覆盖同一个键不会累加大小估计
+        cache = RenderCache(directory, max_bytes=8 * 1024)
+        cache.put('0' * 40, bytes(1000))
+        for _ in range(20):
+            cache.put('0' * 40, bytes(1000))
+        assert cache._size == 1000 and len(cache) == 1
+    print("  命中、淘汰与并发写入正常")
+
+
+def test_dataset_job():
+    """测试分片数据集任务：分批运行、中断后续跑与结果一致性"""
+    print("\n\n测试分片数据集任务")
+    print("=" * 50)
+
+    import os
+    import tempfile
+    from batch_generator import generate_batch
+    from dataset_job import DatasetJob, JobSpec, manifest_path, read_manifest
+
+    spec = JobSpec(['standard_rock', 'funk_pattern'], ['all', 'snare'], 6, 11, 2, 3, None)
+    with tempfile.TemporaryDirectory() as directory:
+        job = DatasetJob(directory, spec)
+        assert job.run(shards=[0, 1], max_workers=1, limit=5) == 5
+
+        # 模拟写清单时中断：末尾留下半行
+        path = next(manifest_path(directory, shard, 3) for shard in range(3)
+                    if os.path.exists(manifest_path(directory, shard, 3)))
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write('{"id": "standard_rock/all')
+
+        # 查看进度只读取清单（其他机器可能正在追加），不截断
+        size = os.path.getsize(path)
+        assert sum(done for done, _ in DatasetJob(directory).status().values()) == 5
+        assert os.path.getsize(path) == size, "查看进度不应修改清单"
+
+        # 续跑（不给出spec，使用 job.json 中的描述）
+        resumed = DatasetJob(directory)
+        assert resumed.spec == job.spec
+        assert resumed.run(max_workers=1) == 24 - 5
+        assert resumed.run(max_workers=1) == 0
+        assert all(done == total for done, total in resumed.status().values())
+
+        records = [record for shard in range(3) for record in read_manifest(manifest_path(directory, shard, 3))]
+        assert len(records) == len({record['id'] for record in records}) == 24
+
+        # 与一次性批量生成的结果逐字节相同
+        expected = {(result.pattern_name, result.variant_type, result.index): result.midi_bytes
+                    for result in generate_batch(job.load_patterns(), spec.variant_types, spec.count,
+                                                 spec.seed, spec.bars, max_workers=1)}
+        for record in records:
+            with open(os.path.join(directory, record['path']), 'rb') as file:
+                assert file.read() == expected[record['pattern_name'], record['variant_type'], record['index']]
+
+        try:
+            DatasetJob(directory, spec._replace(count=7))
+            assert False, "任务描述不一致时应报错"
+        except ValueError:
+            pass
+
+        # 命令行：给出与已有任务不一致的参数时报错，--status 不会创建任务
+        import contextlib
+        import io
+        import sys
+        import dataset_job
+
+        def run_cli(*argv):
+            saved = sys.argv
+            sys.argv = ['dataset_job.py', *argv]
+            try:
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    dataset_job.main()
+                return 0
+            except SystemExit as error:
+                return error.code
+            finally:
+                sys.argv = saved
+
+        assert run_cli(directory, '--count', '7') == 2
+        assert run_cli(directory, '--count', '6', '--status') == 0
+        empty = os.path.join(directory, 'empty')
+        assert run_cli(empty, '--status') == 2 and not os.path.exists(empty)
+    print("  分批运行、续跑和结果一致性正常")
+
+
+def test_musicxml_writer():
+    """测试MusicXML鼓谱导出：声部、符头、连音括号和时值"""
+    print("\n\n测试MusicXML鼓谱导出")
+    print("=" * 50)
+
+    import os
+    import tempfile
+    from music21 import converter
+    from musicxml_writer import MusicXMLWriter, export_sheets
+
+    writer = MusicXMLWriter.from_config()
+    for name in ['standard_rock', 'shuffle_pattern', 'funk_pattern']:
+        pattern = getattr(RhythmPatterns, name)()
+        xml = writer.render(pattern, bars=2, title=name)
+        score = converter.parse(xml, format='musicxml')
+        measures = score.parts[0].getElementsByClass('Measure')
+        assert len(measures) == 2
+        for measure in measures:
+            voices = measure.getElementsByClass('Voice')
+            assert [voice.duration.quarterLength for voice in voices] == [4.0, 4.0]
+
+        # 每个起点都在谱面上（手和脚两个声部合计）
+        onsets = {float(round(note_info['beat'] - 1, 2)) for note_info in pattern}
+        printed = {float(round(element.offset, 2)) for voice in measures[0].getElementsByClass('Voice')
+                   for element in voice.notes}
+        assert printed == onsets, name
+
+        assert '<notehead>x</notehead>' in xml and '<stem>down</stem>' in xml
+        assert ('<tuplet type="start" bracket="yes"/>' in xml) == (name == 'shuffle_pattern')
+        print(f"  {name}: {len(xml)} 字符")
+
+    # 复拍子按附点四分音符分组
+    compound = MusicXMLWriter(writer.notation_config, writer.midi_config, numerator=6, denominator=8)
+    xml = compound.render([{'beat': 1.0, 'drums': ['bass'], 'accent': True},
+                           {'beat': 2.5, 'drums': ['snare'], 'accent': False}])
+    measure = converter.parse(xml, format='musicxml').parts[0].getElementsByClass('Measure')[0]
+    assert measure.duration.quarterLength == 3.0
+    assert '<dot/>' in xml and '<time-modification>' not in xml
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = export_sheets({'rock': RhythmPatterns.standard_rock(), 'disco': RhythmPatterns.disco_pattern()},
+                              directory, bars=4, writer=writer)
+        assert all(os.path.getsize(path) > 0 for path in paths)
+    print("  复拍子分组与批量导出正常")
+
+
+def test_audio_renderer():
+    """测试NumPy音频渲染：采样偏移、余音、WAV读写与批量试听"""
+    print("\n\n测试音频渲染")
+    print("=" * 50)
+
+    import io
+    import os
+    import tempfile
+    import numpy as np
+    from audio_renderer import AudioRenderer, DrumKit, read_wav, render_previews, wav_bytes
+
+    generator = DrumSheetGenerator(engine='direct')
+    renderer = AudioRenderer.from_generator(generator)
+    rate = renderer.sample_rate
+
+    # 120bpm 4/4：4小节为8秒，最后一个音符的余音超出时加长
+    buffer = renderer.render(generator, RhythmPatterns.standard_rock(), bars=4)
+    assert len(buffer) >= 8 * rate and 0 < np.abs(buffer).max() <= 0.98
+    print(f"  4小节: {len(buffer) / rate:.2f} 秒")
+
+    # PatternGrid节奏型与字典节奏型渲染结果相同
+    from pattern_grid import PatternGrid
+    grid = PatternGrid.from_dicts(RhythmPatterns.funk_pattern())
+    assert np.array_equal(renderer.render(generator, grid, bars=2),
+                          renderer.render(generator, RhythmPatterns.funk_pattern(), bars=2))
+
+    # 单个音符从对应的采样偏移开始，力度线性缩放
+    snare = generator.midi_config['snare']
+    single = renderer.render_notes([(generator.bar_ticks // 2, snare, 0, 80)])
+    start = int(round(generator.bar_ticks // 2 * renderer.samples_per_tick()))
+    assert not single[:start].any() and single[start:].any()
+    soft = renderer.render_notes([(generator.bar_ticks // 2, snare, 0, 40)])
+    assert np.allclose(soft[start:] * 2, single[start:])
+
+    # WAV往返与采样文件鼓组
+    decoded = read_wav(io.BytesIO(wav_bytes(buffer, rate)), rate)
+    assert len(decoded) == len(buffer) and np.abs(decoded - buffer).max() < 1e-4
+    with tempfile.TemporaryDirectory() as directory:
+        click = os.path.join(directory, 'click.wav')
+        with open(click, 'wb') as file:
+            file.write(wav_bytes(np.ones(100) * 0.5, 22050))
+        kit = DrumKit.from_files(generator.midi_config, {'snare': click}, rate)
+        assert len(kit.voices[snare]) == 200 and np.allclose(kit.voices[snare], 0.5, atol=1e-3)
+
+        patterns = {name: getattr(RhythmPatterns, name)() for name in ['standard_rock', 'funk_pattern', 'shuffle_pattern']}
+        paths = render_previews(patterns, directory, bars=2, max_workers=1)
+        assert len(paths) == 3
+        for path in paths:
+            assert len(read_wav(path, rate)) >= 4 * rate
+
+        # 启用人性化时，相同seed渲染结果相同，不同seed结果不同
+        import copy
+        import yaml
+        run_config = copy.deepcopy(DrumSheetGenerator.load_yaml("./configs/run_configs.yaml"))
+        run_config['humanize'].update(enabled=True, seed=None)
+        run_config_path = os.path.join(directory, 'run_configs.yaml')
+        with open(run_config_path, 'w', encoding='utf-8') as file:
+            yaml.safe_dump(run_config, file)
+
+        def humanized(seed, state):
+            random.seed(state)
+            output_dir = os.path.join(directory, f"humanized_{seed}_{state}")
+            paths = render_previews(patterns, output_dir, bars=2, max_workers=1, seed=seed,
+                                    run_config_path=run_config_path)
+            contents = []
+            for path in paths:
+                with open(path, 'rb') as file:
+                    contents.append(file.read())
+            return contents
+
+        assert humanized(5, 1) == humanized(5, 2), "相同seed的试听结果应一致"
+        assert humanized(5, 1) != humanized(6, 1)
+    print("  采样偏移、WAV读写与批量试听正常")
+
+
+def test_markov_groove():
+    """测试马尔可夫律动模型：训练、按风格采样、风格判断与保存加载"""
+    print("\n\n测试马尔可夫律动模型")
+    print("=" * 50)
+
+    import io
+    from markov_groove import MarkovGrooveModel
+
+    presets = {'rock': 'standard_rock', 'disco': 'disco_pattern', 'shuffle': 'shuffle_pattern',
+               'funk': 'funk_pattern', 'ballad': 'ballad_pattern', 'reggae': 'reggae_pattern'}
+    model = MarkovGrooveModel.builtin(seed=3)
+    assert model.styles() == list(presets)
+    assert model.resolutions[('shuffle', '4/4')] == 3 and model.resolutions[('funk', '4/4')] == 4
+
+    # 不加变化时每种风格重现训练的节奏型
+    exact = MarkovGrooveModel.builtin(seed=0, variation=0)
+    for style, name in presets.items():
+        pattern = getattr(RhythmPatterns, name)()
+        assert exact.sample_bar(style) == pattern
+        assert model.style_of(pattern) == style
+
+    # 采样结果落在该风格的网格上，且每个小节以发声开始
+    for style in presets:
+        resolution = model.resolutions[(style, '4/4')]
+        for pattern in model.sample_bars(style, 50):
+            assert pattern[0]['beat'] == 1.0 and pattern[0]['drums']
+            assert all(abs(note['beat'] * resolution - round(note['beat'] * resolution)) < 0.05 for note in pattern)
+        print(f"  {style}: {model.sample_bar(style)[:3]}")
+
+    # 保存加载后相同种子的采样结果一致
+    buffer = io.BytesIO()
+    model.save(buffer)
+    buffer.seek(0)
+    loaded = MarkovGrooveModel.load(buffer, seed=9)
+    fresh = MarkovGrooveModel.builtin(seed=9)
+    assert [loaded.sample_bar('funk') for _ in range(20)] == [fresh.sample_bar('funk') for _ in range(20)]
+    print(f"  模型文件 {len(buffer.getvalue())} 字节")
+
+    # 其他拍号的语料
+    waltz = [{'beat': 1.0, 'drums': ['bass', 'ride'], 'accent': True},
+             {'beat': 2.0, 'drums': ['ride'], 'accent': False},
+             {'beat': 3.0, 'drums': ['snare', 'ride'], 'accent': False}]
+    custom = MarkovGrooveModel.train([{'pattern': waltz, 'style': 'waltz', 'time_signature': '3/4'}], seed=1)
+    assert custom.sample_bar('waltz') == waltz and custom.style_of(waltz, '4/4') is None
+
+    # 五连音与三连音的最小公倍数60超过网格上限时，取能同时表示两者的15步/拍
+    odd = ([{'beat': 1 + step / 5, 'drums': ['ride'], 'accent': step == 0} for step in range(5)]
+           + [{'beat': 2 + step / 3, 'drums': ['snare'], 'accent': False} for step in range(3)])
+    odd_model = MarkovGrooveModel.train([{'pattern': odd, 'style': 'odd'}], variation=0, seed=1)
+    assert odd_model.resolutions[('odd', '4/4')] == 15
+    assert [note['beat'] for note in odd_model.sample_bar('odd')] == [round(note['beat'], 2) for note in odd]
+
+    # 'markov' 变体：可复现，且与原节奏型风格相同
+    generator = DrumSheetGenerator(engine='direct')
+    random.seed(11)
+    first = [generator.create_pattern_variant(RhythmPatterns.shuffle_pattern(), 'markov') for _ in range(10)]
+    random.seed(11)
+    assert first == [generator.create_pattern_variant(RhythmPatterns.shuffle_pattern(), 'markov') for _ in range(10)]
+    assert all(model.style_of(variant) == 'shuffle' for variant in first)
+
+    # 内置模型只有4/4拍的风格：其他拍号下返回原节奏型的副本，而不是报错
+    run_config = dict(DrumSheetGenerator.load_yaml("./configs/run_configs.yaml"), numerator=3, denominator=4)
+    waltz_generator = DrumSheetGenerator(engine='direct', run_config=run_config)
+    ballad = RhythmPatterns.ballad_pattern()
+    variant = waltz_generator.create_pattern_variant(ballad, 'markov')
+    assert variant == ballad and variant is not ballad
+    print("  风格采样、风格判断与保存加载正常")
+
+STARTUP_SCRIPT = """
+import sys
+import time
+start = time.perf_counter()
+from random_drumsheet import DrumSheetGenerator
+from rhythm_patterns import RhythmPatterns
+imported = time.perf_counter()
+assert 'music21' not in sys.modules and 'numpy' not in sys.modules, "导入时不应加载music21和NumPy"
+generator = DrumSheetGenerator(engine='direct')
+variant = generator.create_pattern_variant(RhythmPatterns.funk_pattern(), 'all')
+generator.generate_from_pattern(variant, bars=4)
+generator.to_bytes()
+assert 'music21' not in sys.modules, "direct引擎不应导入music21"
+assert 'numpy' not in sys.modules, "字典节奏型的direct导出路径不应导入NumPy"
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def test_startup_time():
+    """测试启动路径：节奏型、变体和direct导出路径不导入music21和NumPy（耗时由基准测试的 startup/import 跟踪）"""
+    print("\n\n测试启动耗时")
+    print("=" * 50)
+
+    import subprocess
+    import sys
+
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], check=True,
+                            capture_output=True, text=True).stdout
+    import_time, total = (float(value) for value in output.split())
+    print(f"  导入: {import_time * 1000:.0f} ms，导入+生成变体+导出MIDI: {total * 1000:.0f} ms")
+
 def main():
     """主测试函数"""
     print("节奏型变体功能测试")
@@ -115,6 +1122,28 @@ def main():
     test_all_patterns()
     test_specific_variants()
     test_custom_probabilities()
+    test_direct_engine()
+    test_batch_generation()
+    test_pattern_grid()
+    test_variant_engine()
+    test_generator_reuse()
+    test_song_builder()
+    test_in_memory_output()
+    test_beat_grid()
+    test_pattern_library()
+    test_midi_importer()
+    test_similarity_index()
+    test_groove_sampler()
+    test_live_player()
+    test_humanizer()
+    test_instrumentation()
+    test_arrangement()
+    test_render_cache()
+    test_dataset_job()
+    test_musicxml_writer()
+    test_audio_renderer()
+    test_markov_groove()
+    test_startup_time()
     
     print("\n\n所有测试完成！")
     print("请检查 outputs/ 目录中生成的MIDI文件")
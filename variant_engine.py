@@ -0,0 +1,180 @@
+"""向量化的节奏型变体引擎
+
+在 PatternGrid 的数组表示上用 numpy.random.Generator 一次性抽取一个节奏型
+（或一整批节奏型）的全部随机决策，再用数组掩码完成添加/移除，
+语义与 DrumSheetGenerator 的 add_random_snare / add_random_bass /
+random_modify_notes 保持一致：
+- 添加军鼓时该位置设为重音
+- 移除音符时至少保留一个，优先移除bass和snare以外的鼓
+"""
+import numpy as np
+
+from pattern_grid import PatternGrid
+from random_drumsheet import DrumSheetGenerator
+
+# 各变体类型使用的概率，与 DrumSheetGenerator.create_pattern_variant 一致
+VARIANT_MODES = {
+    'snare': {'snare': 0.3},
+    'bass': {'bass': 0.2},
+    'random': {'add': 0.15, 'remove': 0.1},
+    'all': {'snare': 0.2, 'bass': 0.15, 'add': 0.1, 'remove': 0.05},
+}
+
+# 随机决策在抽样数组最后一维中的位置
+_SNARE, _BASS, _ADD, _ADD_CHOICE, _REMOVE, _REMOVE_CHOICE = range(6)
+
+
+def _choose(mask, u):
+    """在每行mask为True的列中，按均匀随机数u选出一列
+
+    Args:
+        mask: 候选掩码，形状 (..., voices)
+        u: [0, 1) 均匀随机数，形状 (...)
+
+    Returns:
+        tuple: (选中的列索引, 是否存在候选)
+    """
+    cumulative = np.cumsum(mask, axis=-1, dtype=np.int8)
+    counts = cumulative[..., -1]
+    target = (u * counts).astype(np.int8)
+    pick = np.argmax(cumulative > target[..., None], axis=-1)
+    return pick, counts > 0
+
+
+def _voice_column(voice_index, name):
+    """返回鼓声部的列索引，与 PatternGrid.voice 一样在缺少该声部时给出明确错误"""
+    try:
+        return voice_index[name]
+    except KeyError:
+        raise KeyError(f"节奏型中没有鼓声部: {name}") from None
+
+
+def _set_columns(hits, rows, pick, value):
+    """把rows为True的每个步进上pick指定的列设为value"""
+    index = np.nonzero(rows)
+    hits[index + (pick[index],)] = value
+
+
+class VariantEngine:
+    """基于NumPy的向量化变体生成器"""
+
+    def __init__(self, seed=None, random_drums=DrumSheetGenerator.RANDOM_DRUMS):
+        """初始化变体引擎
+
+        Args:
+            seed: 随机种子，相同种子生成相同的变体序列
+            random_drums: random_modify_notes 可随机添加的鼓
+        """
+        self.rng = np.random.default_rng(seed)
+        self.random_drums = tuple(random_drums)
+
+    def mutate(self, hits, accents, voices, variant_type='random', probabilities=None):
+        """对一批节奏型数组应用变体
+
+        Args:
+            hits: 布尔数组，形状 (batch, steps, voices)
+            accents: 布尔数组，形状 (batch, steps)
+            voices: hits各列对应的鼓声部名称
+            variant_type: 变体类型 ('snare', 'bass', 'random', 'all')
+            probabilities: 覆盖默认概率的字典，键为 snare/bass/add/remove
+
+        Returns:
+            tuple: 新的 (hits, accents) 数组，不修改输入
+        """
+        hits = np.array(hits, dtype=bool)
+        accents = np.array(accents, dtype=bool)
+        if variant_type not in VARIANT_MODES:
+            return hits, accents
+
+        params = dict(VARIANT_MODES[variant_type])
+        if probabilities:
+            params.update(probabilities)
+
+        # 一次抽取全部随机决策
+        draws = self.rng.random(hits.shape[:-1] + (6,))
+        voice_index = {name: i for i, name in enumerate(voices)}
+
+        if 'snare' in params:
+            column = _voice_column(voice_index, 'snare')
+            added = ~hits[..., column] & (draws[..., _SNARE] < params['snare'])
+            hits[..., column] |= added
+            accents |= added
+
+        if 'bass' in params:
+            column = _voice_column(voice_index, 'bass')
+            hits[..., column] |= draws[..., _BASS] < params['bass']
+
+        if 'add' in params:
+            available = np.zeros(len(voices), dtype=bool)
+            available[[voice_index[d] for d in self.random_drums if d in voice_index]] = True
+
+            # 随机添加一个当前位置没有的鼓
+            candidates = available & ~hits
+            pick, has_candidate = _choose(candidates, draws[..., _ADD_CHOICE])
+            _set_columns(hits, (draws[..., _ADD] < params['add']) & has_candidate, pick, True)
+
+        if 'remove' in params:
+            protected = np.zeros(len(voices), dtype=bool)
+            protected[[voice_index[d] for d in ('bass', 'snare') if d in voice_index]] = True
+
+            # 至少保留一个音符；有其他鼓时只移除其他鼓，否则在bass/snare中随机移除
+            removable = hits & ~protected
+            candidates = np.where(removable.any(axis=-1, keepdims=True), removable, hits)
+            pick, _ = _choose(candidates, draws[..., _REMOVE_CHOICE])
+            rows = (np.count_nonzero(hits, axis=-1) > 1) & (draws[..., _REMOVE] < params['remove'])
+            _set_columns(hits, rows, pick, False)
+
+        return hits, accents
+
+    def create_variants(self, pattern, variant_type='random', count=1):
+        """为同一节奏型批量生成变体
+
+        Args:
+            pattern: 原始节奏型（PatternGrid或字典列表）
+            variant_type: 变体类型
+            count: 生成数量
+
+        Returns:
+            tuple: (hits, accents)，形状分别为 (count, steps, voices) 和 (count, steps)
+        """
+        grid = self._as_grid(pattern)
+        hits = np.broadcast_to(grid.hits, (count,) + grid.hits.shape)
+        accents = np.broadcast_to(grid.accents, (count,) + grid.accents.shape)
+        return self.mutate(hits, accents, grid.voices, variant_type)
+
+    def iter_variants(self, pattern, variant_type='random', count=1):
+        """批量生成变体，逐个返回PatternGrid（共享原节奏型的拍位置）"""
+        grid = self._as_grid(pattern)
+        hits, accents = self.create_variants(grid, variant_type, count)
+        for i in range(count):
+            yield PatternGrid(grid.beats, hits[i], accents[i], grid.voices)
+
+    def create_pattern_variant(self, pattern, variant_type='random'):
+        """创建单个节奏型变体，返回PatternGrid"""
+        return next(self.iter_variants(pattern, variant_type, 1))
+
+    def add_random_snare(self, pattern, probability=0.3):
+        """随机添加军鼓音符，返回PatternGrid"""
+        return self._apply(pattern, 'snare', {'snare': probability})
+
+    def add_random_bass(self, pattern, probability=0.2):
+        """随机添加底鼓音符，返回PatternGrid"""
+        return self._apply(pattern, 'bass', {'bass': probability})
+
+    def random_modify_notes(self, pattern, add_probability=0.15, remove_probability=0.1):
+        """随机增减音符，返回PatternGrid"""
+        return self._apply(pattern, 'random', {'add': add_probability, 'remove': remove_probability})
+
+    def _apply(self, pattern, variant_type, probabilities):
+        """对单个节奏型应用指定概率的变体"""
+        grid = self._as_grid(pattern)
+        hits, accents = self.mutate(grid.hits[None], grid.accents[None], grid.voices,
+                                    variant_type, probabilities)
+        return PatternGrid(grid.beats, hits[0], accents[0], grid.voices)
+
+    @staticmethod
+    def _as_grid(pattern):
+        """把字典列表格式的节奏型转换为PatternGrid"""
+        if isinstance(pattern, PatternGrid):
+            return pattern
+        return PatternGrid.from_dicts(pattern)